@@ -0,0 +1,141 @@
+"""
+发件账号池: 多个账号各自登录、各自限速与计额，发送引擎按权重分配连接，某个账号被服务商限流时由其它账号接手
+
+config.SENDER_POOL 为空时只使用 SENDER_EMAIL / APP_PASSWORD 一个账号 (与旧版一致)。
+每个账号的已用额度从发送日志 (发件账号列) 统计，跨运行累计；被限流暂停的截止时间保存在同一个数据库中。
+每个账号的额度请严格按服务商为该账号规定的上限填写。
+
+    python accounts.py     # 查看各账号最近 24 小时用量与暂停状态
+"""
+import threading
+import time
+from datetime import datetime
+
+from engine import open_smtp
+from journal import JOURNAL_FILE, TIME_FORMAT, Journal
+from ratelimit import HOUR, RateLimiter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS account_state (
+    email TEXT PRIMARY KEY,
+    paused_until REAL NOT NULL,
+    reason TEXT
+);
+"""
+
+
+class SenderAccount:
+    """一个发件账号: 连接参数 + 独立的限速器 + 暂停状态 (线程安全)"""
+
+    def __init__(self, email, password, name="", host=None, port=None, security=None,
+                 weight=1, limiter=None, paused_until=0.0):
+        self.email = email
+        self.password = password
+        self.name = name
+        self.host = host
+        self.port = port
+        self.security = security
+        self.weight = max(0.0, float(weight))
+        self.limiter = limiter
+        self.paused_until = paused_until
+        self.pause_reason = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"SenderAccount({self.email!r})"
+
+    def connect(self):
+        server = open_smtp(self.host, self.port, self.email, self.password, security=self.security)
+        # send 函数据此填写 From
+        server.sender = (self.name, self.email)
+        return server
+
+    @property
+    def paused(self):
+        return time.time() < self.paused_until
+
+    def pause(self, seconds, reason=""):
+        with self._lock:
+            until = time.time() + seconds
+            if until > self.paused_until:
+                self.paused_until = until
+                self.pause_reason = reason
+
+
+def load_accounts(config, journal=None):
+    """
+    按 config 构造账号列表。SENDER_POOL 中每项为 dict:
+        email, password 必填；name / host / port / security 缺省取单账号设置；
+        per_day / per_hour / per_minute 为该账号的额度 (缺省取 RATE_*)；weight 为分配连接的权重。
+    journal 用于恢复各账号最近 24 小时的已用额度与暂停状态。
+    """
+    pool = getattr(config, 'SENDER_POOL', None) or [{
+        "email": config.SENDER_EMAIL,
+        "password": config.APP_PASSWORD,
+    }]
+    paused = load_paused(journal) if journal is not None else {}
+    accounts = []
+    for entry in pool:
+        email = entry["email"]
+        rates = {key: entry[key] for key in ("per_second", "per_minute", "per_hour", "per_day", "burst", "jitter")
+                 if key in entry}
+        recent = journal.recent_send_times(sender=email) if journal is not None else ()
+        accounts.append(SenderAccount(
+            email=email,
+            password=entry["password"],
+            name=entry.get("name", config.SENDER_NAME),
+            host=entry.get("host", config.SMTP_SERVER),
+            port=entry.get("port", config.SMTP_PORT),
+            security=entry.get("security", getattr(config, 'SMTP_SECURITY', None)),
+            weight=entry.get("weight", 1),
+            limiter=RateLimiter.from_config(config, recent_sends=recent, **rates),
+            paused_until=paused.get(email, 0.0),
+        ))
+    return accounts
+
+
+def sender_emails(config):
+    """配置中的全部发件邮箱 (与 load_accounts 的顺序一致)"""
+    pool = getattr(config, 'SENDER_POOL', None)
+    return [entry["email"] for entry in pool] if pool else [config.SENDER_EMAIL]
+
+
+def _ensure_schema(journal):
+    journal.conn.executescript(SCHEMA)
+
+
+def load_paused(journal):
+    """仍在暂停期内的账号 {email: 截止时间戳}"""
+    _ensure_schema(journal)
+    return dict(journal.conn.execute(
+        "SELECT email, paused_until FROM account_state WHERE paused_until > ?", (time.time(),)).fetchall())
+
+
+def save_paused(journal, accounts):
+    """保存本次运行中新被暂停的账号 (在创建 journal 的线程中调用)"""
+    _ensure_schema(journal)
+    with journal.conn:
+        journal.conn.executemany(
+            "INSERT INTO account_state (email, paused_until, reason) VALUES (?, ?, ?) "
+            "ON CONFLICT(email) DO UPDATE SET paused_until = excluded.paused_until, reason = excluded.reason",
+            [(a.email, a.paused_until, a.pause_reason) for a in accounts if a.paused and a.pause_reason],
+        )
+
+
+def main():
+    import config
+    with Journal(getattr(config, 'JOURNAL_FILE', JOURNAL_FILE)) as journal:
+        for account in load_accounts(config, journal):
+            limiter = account.limiter
+            recent = journal.recent_send_times(sender=account.email)
+            hour = sum(1 for t in recent if t > time.time() - HOUR)
+            line = f"{account.email}: 最近 1 小时 {hour} 封 / 24 小时 {len(recent)} 封"
+            if limiter.per_day:
+                line += f" (每日上限 {limiter.per_day}，剩余 {limiter.remaining_today})"
+            if account.paused:
+                line += f"  ⏸️ 暂停至 {datetime.fromtimestamp(account.paused_until).strftime(TIME_FORMAT)}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
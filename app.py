@@ -1,15 +1,16 @@
 import streamlit as st
 import pandas as pd
 import os
-import time
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.utils import formataddr
 from datetime import datetime
-from io import BytesIO
 import config
-import re
+import hashlib
+from journal import JOURNAL_FILE, open_journal
+from checkpoint import Checkpoint
+from templating import Template
+from export import FORMATS, temp_export
+from snapshot import Snapshot, evict as evict_snapshots
+from validation import Preflight
+from jobs import DONE, FAILED, JobManager
 
 # --- 页面配置 ---
 st.set_page_config(
@@ -138,33 +139,136 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 辅助函数 ---
-def smart_str(val):
-    if pd.isna(val): return ""
-    if isinstance(val, float):
-        if val.is_integer(): return str(int(val))
-    return str(val).strip()
+CHECKPOINT_DIR = ".checkpoints"
+PAGE_SIZES = (50, 200, 1000)
+# 内存中缓存的名单份数 / 磁盘上保留的快照份数 (未发完的名单不受限制)
+SNAPSHOT_CACHE_SIZE = 8
+SNAPSHOT_KEEP = 20
 
-def send_one_email(row, template_content, placeholders, subject, s_name, s_email):
-    try:
-        msg_body = template_content
-        for key in placeholders:
-            val = row.get(key)
-            msg_body = msg_body.replace(f"{{{key}}}", smart_str(val))
-            
-        msg = MIMEMultipart()
-        msg['From'] = formataddr((s_name, s_email))
-        
-        recipient = row.get('邮箱') or row.get('Email') or row.get('email')
-        if not recipient or pd.isna(recipient):
-            return False, "缺少邮箱地址", None
-            
-        msg['To'] = str(recipient).strip()
-        msg['Subject'] = subject
-        msg.attach(MIMEText(msg_body, 'plain', 'utf-8'))
-        
-        return True, "就绪", msg
-    except Exception as e:
-        return False, str(e), None
+def get_journal():
+    # 每次运行新建连接 (sqlite 连接不能跨线程复用)
+    return open_journal(getattr(config, 'JOURNAL_FILE', JOURNAL_FILE))
+
+@st.cache_resource(max_entries=SNAPSHOT_CACHE_SIZE)
+def load_snapshot(digest, _uploaded_file):
+    # 按内容哈希缓存: 同一份名单只解析一次，之后的每次重跑直接复用
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    snapshot = Snapshot.open(_uploaded_file, os.path.join(CHECKPOINT_DIR, digest), digest)
+    # 任务列表中的名单 (运行中或可下载报告) 不淘汰
+    listed = {job.digest for job in get_job_manager().list()}
+    evict_snapshots(CHECKPOINT_DIR, SNAPSHOT_KEEP, protect=listed | {digest})
+    return snapshot
+
+@st.cache_data(max_entries=64)
+def load_page(digest, page, page_size, _snapshot):
+    """名单的一页 (服务端分页，表格只接收当前页)"""
+    rows = _snapshot.page(page * page_size, page_size)
+    df = pd.DataFrame([row for _, row in rows], columns=_snapshot.columns)
+    # 序号从 1 开始
+    df.index = [index + 1 for index, _ in rows]
+    return df
+
+@st.cache_data(max_entries=SNAPSHOT_CACHE_SIZE)
+def preflight_summary(digest, _snapshot):
+    """整份名单的地址预检摘要 (结果随快照保存，发送任务直接复用)"""
+    return Preflight.for_snapshot(_snapshot).describe()
+
+@st.cache_resource(max_entries=32)
+def compile_template(content):
+    # 模板按内容缓存，编辑正文时只有改动后的新内容需要重新解析
+    return Template(content)
+
+def upload_digest_of(uploaded_file):
+    """上传文件的内容哈希 (每个文件只计算一次)"""
+    digests = st.session_state.setdefault("upload_digests", {})
+    key = getattr(uploaded_file, "file_id", None)
+    if key is None or key not in digests:
+        digest = hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+        if key is None:
+            return digest
+        digests[key] = digest
+    return digests[key]
+
+@st.cache_resource
+def get_job_manager():
+    # 进程内共享: 页面刷新、多个会话都能看到同一组后台任务
+    return JobManager()
+
+def export_button(label, columns, rows, file_stem, key=None):
+    """
+    下载按钮: 点击时才在独立线程中流式生成文件 (格式取侧边栏的选择)，不阻塞页面，也不在每次刷新时重复生成。
+    rows 为无参函数，返回逐行产出 dict 的迭代器。
+    """
+    fmt = st.session_state.get("export_format", "xlsx")
+    st.download_button(
+        label=label,
+        data=lambda: temp_export(columns, rows(), fmt),
+        file_name=f"{file_stem}_{datetime.now().strftime('%Y%m%d_%H%M')}.{fmt}",
+        mime=FORMATS[fmt],
+        use_container_width=True,
+        key=key,
+    )
+
+def export_history(fmt):
+    # 在下载线程中执行，sqlite 连接不能跨线程，在这里新建
+    with get_journal() as journal:
+        return temp_export(journal.columns(), journal.iter_records(), fmt)
+
+def render_job(job):
+    """任务卡片 (在 fragment 中定时刷新)"""
+    info = job.status()
+    counts = info["counts"]
+    st.markdown(f"#### {info['name']} · {info['state']}")
+    st.progress(min(info["done"] / max(info["total"], 1), 1.0))
+    last = f": <strong>{info['last']}</strong>" if info["last"] else ""
+    st.markdown(f"<span style='color: #666; font-size: 0.9rem;'>已投递 {info['done']}/{info['total']}{last}"
+                f" · {info['rate']:.1f} 封/分钟 · 用时 {int(info['elapsed'])} 秒</span>", unsafe_allow_html=True)
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("成功", counts.get("成功", 0))
+    c2.metric("失败", counts.get("失败", 0))
+    c3.metric("跳过", counts.get("跳过", 0))
+    c4.metric("待重试", counts.get("延迟", 0))
+    if info["errors"]:
+        with st.expander(f"最近的错误 ({len(info['errors'])})"):
+            st.code("\n".join(info["errors"]), language=None)
+
+    if job.active:
+        st.caption(info["message"])
+        if st.button("停止任务", key=f"stop_{job.id}", type="secondary"):
+            job.stop()
+        return
+
+    if info["state"] == FAILED:
+        st.error(info["message"])
+    elif info["state"] == DONE and not (job.engine and (job.engine.exhausted or job.engine.disconnected or job.engine.throttled)):
+        st.success(info["message"])
+    else:
+        st.warning(info["message"])
+    if not job.results:
+        return
+    col_d1, col_d2 = st.columns([1, 1])
+    with col_d1:
+        export_button("下载本次发送报告", job.results.columns(job.snapshot.columns), job.report_rows,
+                      "发送报告", key=f"report_{job.id}")
+    if info["remaining"]:
+        with col_d2:
+            export_button(f"下载剩余名单 ({info['remaining']}人)", job.snapshot.columns, job.remaining_rows,
+                          "剩余名单", key=f"remaining_{job.id}")
+    if job.summary:
+        with st.expander("运行指标"):
+            st.json(job.summary)
+
+@st.fragment(run_every=1.0)
+def job_panel():
+    """后台任务列表: 只有这一块按秒刷新，页面其余部分不受影响"""
+    jobs = get_job_manager().list()
+    if not jobs:
+        return
+    st.markdown("---")
+    st.markdown("## 04. 投递任务")
+    for job in jobs:
+        with st.container(border=True):
+            render_job(job)
 
 # --- 侧边栏 ---
 with st.sidebar:
@@ -183,12 +287,33 @@ with st.sidebar:
     default_limit = getattr(config, 'BATCH_LIMIT', 0)
     batch_limit = st.number_input("单次发送上限 (0为无限)", min_value=0, value=default_limit)
     
-    st.markdown("#### 拟人化设置")
+    st.markdown("#### 速率设置")
     col_s1, col_s2 = st.columns(2)
     with col_s1:
-        sleep_min = st.number_input("最小间隔 (秒)", 1.0, 60.0, 2.0)
+        rate_per_minute = st.number_input("每分钟上限", min_value=0, value=getattr(config, 'RATE_PER_MINUTE', 0))
+        rate_per_day = st.number_input("每日上限", min_value=0, value=getattr(config, 'RATE_PER_DAY', 0))
+        rate_burst = st.number_input("突发数量", min_value=1, value=getattr(config, 'RATE_BURST', 1))
     with col_s2:
-        sleep_max = st.number_input("最大间隔 (秒)", sleep_min, 60.0, 5.0)
+        rate_per_hour = st.number_input("每小时上限", min_value=0, value=getattr(config, 'RATE_PER_HOUR', 0))
+        rate_jitter = st.number_input("间隔抖动 (0~1)", 0.0, 1.0, float(getattr(config, 'RATE_JITTER', 0.0)))
+    st.caption("0 表示不限制，所有连接共享同一额度")
+
+    st.markdown("---")
+    st.markdown("#### 历史记录")
+    st.selectbox("导出格式", tuple(FORMATS), key="export_format",
+                 help="xlsx 可直接用 Excel 打开；名单很大时 csv / parquet 导出更快、文件更小")
+    fmt = st.session_state.get("export_format", "xlsx")
+    st.download_button(
+        label="导出发送历史",
+        data=lambda: export_history(fmt),
+        file_name=f"发送历史_{datetime.now().strftime('%Y%m%d_%H%M')}.{fmt}",
+        mime=FORMATS[fmt],
+        type="secondary",
+        use_container_width=True,
+    )
+    pool_size = st.number_input("并发连接数", min_value=1, max_value=10, value=getattr(config, 'POOL_SIZE', 1))
+    suppress_sent = st.checkbox("跳过已发送过的地址", value=getattr(config, 'SUPPRESS_SENT', True),
+                                help="退信、退订地址及名单内重复地址始终跳过")
 
 # --- 主界面 ---
 st.title("智能投递")
@@ -198,24 +323,36 @@ col1, col_spacer, col2 = st.columns([1, 0.1, 1])
 
 with col1:
     st.markdown("## 01. 导入名单")
-    uploaded_file = st.file_uploader("将 Excel 名单拖拽至此", type=["xlsx"])
+    uploaded_file = st.file_uploader("将 Excel 名单拖拽至此", type=["xlsx", "csv", "jsonl", "parquet"])
     
-    df = None
+    total_rows = 0
     if uploaded_file:
         try:
-            df = pd.read_excel(uploaded_file)
-            if df.empty:
+            # 首次上传时把名单转为快照 (按内容哈希缓存)，之后展示与发送都直接从快照定位读取
+            upload_digest = upload_digest_of(uploaded_file)
+            snapshot = load_snapshot(upload_digest, uploaded_file)
+            if not snapshot.exists():
+                # 上一轮任务发完后快照已清理，重新建立
+                load_snapshot.clear()
+                snapshot = load_snapshot(upload_digest, uploaded_file)
+            columns = snapshot.columns
+            total_rows = len(snapshot)
+            if not total_rows:
                 st.toast("⚠️ 文件是空的", icon="⚠️")
             else:
-                # 序号从 1 开始
-                df.index = df.index + 1
+                col_p1, col_p2 = st.columns([1, 1])
+                page_size = col_p2.selectbox("每页行数", PAGE_SIZES, key="page_size")
+                pages = (total_rows + page_size - 1) // page_size
+                page = col_p1.number_input(f"页码 (共 {pages} 页)", min_value=1, max_value=pages, value=1, key="page") - 1
+                preview_df = load_page(upload_digest, page, page_size, snapshot)
                 
                 # 智能展示：如果数据量大，固定高度以支持滑动；如果数据少，自动适应
                 # height 参数控制容器高度，数据过多时会自动出现滚动条
-                display_height = min(len(df) * 35 + 38, 300) 
+                display_height = min(len(preview_df) * 35 + 38, 300) 
                 
-                st.dataframe(df, height=display_height, use_container_width=True)
-                st.markdown(f"<p style='font-size: 0.9rem; color: #666; margin-top: 0.5rem;'>✓ 已加载 {len(df)} 位收件人 (支持滑动查看)</p>", unsafe_allow_html=True)
+                st.dataframe(preview_df, height=display_height, use_container_width=True)
+                st.markdown(f"<p style='font-size: 0.9rem; color: #666; margin-top: 0.5rem;'>✓ 已加载 {total_rows} 位收件人 (第 {page + 1}/{pages} 页)</p>", unsafe_allow_html=True)
+                st.caption(f"地址预检: {preflight_summary(upload_digest, snapshot)}")
         except Exception as e:
             st.error(f"文件读取错误: {e}")
 
@@ -238,13 +375,13 @@ with col2:
         st.toast("模板已保存")
 
 # --- 操作区域 ---
-if df is not None and not df.empty:
+if total_rows:
     st.markdown("---")
     st.markdown("## 03. 预览与投递")
     
     # 变量提取
-    placeholders = set(re.findall(r'\{(.*?)\}', template_content))
-    missing_cols = [p for p in placeholders if p not in df.columns]
+    template = compile_template(template_content)
+    missing_cols = template.missing_columns(columns)
     
     if missing_cols:
         st.error(f"Excel 缺少对应列: {', '.join(missing_cols)}")
@@ -252,10 +389,8 @@ if df is not None and not df.empty:
         # 预览卡片
         with st.container():
             st.markdown("#### 效果预览")
-            preview_row = df.iloc[0]
-            preview_body = template_content
-            for key in placeholders:
-                preview_body = preview_body.replace(f"{{{key}}}", smart_str(preview_row.get(key)))
+            preview_row = load_page(upload_digest, 0, 1, snapshot).iloc[0]
+            preview_body = template.render(preview_row)
             
             preview_html = f"""
             <div style="background-color: #fafafa; border: 1px solid #eaeaea; padding: 1.5rem; border-radius: 8px; font-family: -apple-system, sans-serif;">
@@ -269,110 +404,38 @@ if df is not None and not df.empty:
             """
             st.markdown(preview_html, unsafe_allow_html=True)
 
+        # 断点检查: 同一份名单上次未发完 (页面刷新/中断)，启动后自动跳过已处理的行
+        progress_path = os.path.join(CHECKPOINT_DIR, f"{upload_digest}.json")
+        checkpoint = Checkpoint.load(progress_path, upload_digest, every=getattr(config, 'CHECKPOINT_EVERY', 20))
+        if checkpoint:
+            st.info(f"检测到该名单的未完成任务，已处理 {len(checkpoint)} 行，启动后将自动跳过。")
+
         st.markdown("<div style='height: 2rem;'></div>", unsafe_allow_html=True)
         
-        # 发送按钮
-        if st.button("启动投递任务", type="primary", use_container_width=True):
+        # 发送按钮: 投递在后台线程中进行，刷新页面或修改控件都不会中断
+        manager = get_job_manager()
+        running = manager.find_active(upload_digest)
+        if running:
+            st.info("该名单的投递任务正在后台运行，进度见下方任务列表。")
+        elif st.button("启动投递任务", type="primary", use_container_width=True):
             if not sender_email or not sender_password:
                 st.error("请先在左侧侧边栏配置发件人信息。")
                 st.stop()
-                
-            # 分批逻辑
-            if batch_limit > 0 and len(df) > batch_limit:
-                task_df = df.iloc[:batch_limit].copy()
-                remaining_df = df.iloc[batch_limit:].copy()
-            else:
-                task_df = df.copy()
-                remaining_df = pd.DataFrame()
-                
-            # 进度界面
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            processed_records = []
-            
-            # SMTP 连接
-            try:
-                with st.spinner(f"正在验证账号 {sender_email}..."):
-                    if config.SMTP_PORT == 465:
-                        server = smtplib.SMTP_SSL(config.SMTP_SERVER, config.SMTP_PORT)
-                    else:
-                        server = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT)
-                        server.starttls()
-                    server.login(sender_email, sender_password)
-            except Exception as e:
-                st.error(f"连接失败: {e}")
-                st.stop()
-                
-            # 发送循环
-            total = len(task_df)
-            success_count = 0
-            
-            for i, (index, row) in enumerate(task_df.iterrows()):
-                name = row.get('账号', row.get('姓名', '未知'))
-                status_text.markdown(f"<span style='color: #666; font-size: 0.9rem;'>正在投递 {i+1}/{total}: <strong>{name}</strong></span>", unsafe_allow_html=True)
-                
-                is_ready, msg_str, msg_obj = send_one_email(row, template_content, placeholders, email_subject, sender_name, sender_email)
-                
-                if is_ready:
-                    try:
-                        server.sendmail(sender_email, msg_obj['To'], msg_obj.as_string())
-                        status, detail = "成功", "OK"
-                        success_count += 1
-                    except Exception as e:
-                        status, detail = "失败", str(e)
-                else:
-                    status, detail = "失败", msg_str
-                    
-                record = row.to_dict()
-                record.update({'发送状态': status, '详情': detail, '发送时间': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
-                processed_records.append(record)
-                
-                progress_bar.progress((i + 1) / total)
-                
-                if i < total - 1:
-                    import random
-                    time.sleep(random.uniform(sleep_min, sleep_max))
-            
-            server.quit()
-            status_text.empty()
-            
-            # 结果处理
-            if processed_records:
-                # 记录归档
-                history_file = "sent_history.xlsx"
-                new_recs = pd.DataFrame(processed_records)
-                try:
-                    if os.path.exists(history_file):
-                        pd.concat([pd.read_excel(history_file), new_recs]).to_excel(history_file, index=False)
-                    else:
-                        new_recs.to_excel(history_file, index=False)
-                except: pass
-                
-                # 成功提示
-                st.success(f"任务完成。成功: {success_count}, 失败: {total-success_count}。")
-                
-                # 下载报告
-                output_log = BytesIO()
-                new_recs.to_excel(output_log, index=False)
-                
-                col_d1, col_d2 = st.columns([1, 1])
-                with col_d1:
-                    st.download_button(
-                        label="下载本次发送报告",
-                        data=output_log.getvalue(),
-                        file_name=f"发送报告_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        use_container_width=True
-                    )
-                
-                if not remaining_df.empty:
-                    with col_d2:
-                        rem_out = BytesIO()
-                        remaining_df.to_excel(rem_out, index=False)
-                        st.download_button(
-                            label=f"下载剩余名单 ({len(remaining_df)}人)",
-                            data=rem_out.getvalue(),
-                            file_name=f"剩余名单_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
+
+            rates = dict(per_minute=rate_per_minute, per_hour=rate_per_hour, per_day=rate_per_day,
+                         burst=rate_burst, jitter=rate_jitter)
+            job = manager.submit(
+                name=getattr(uploaded_file, "name", "名单"),
+                snapshot=snapshot,
+                progress_path=progress_path,
+                digest=upload_digest,
+                template=template,
+                subject=email_subject,
+                sender=(sender_name, sender_email, sender_password),
+                settings=dict(batch_limit=batch_limit, pool_size=pool_size, suppress_sent=suppress_sent),
+                limiter=manager.limiter_for(sender_email, rates),
+            )
+            if job:
+                st.toast("投递任务已在后台启动")
+
+job_panel()
@@ -0,0 +1 @@
+"""性能压测工具: python -m bench"""
@@ -0,0 +1,291 @@
+"""
+压测: 用进程内 SMTP 收信桩驱动 main.py 的真实发送路径，记录吞吐、单封延迟、各阶段耗时与内存峰值
+
+    python -m bench                              # 1k / 100k / 1M，并与 bench/baseline.json 对比
+    python -m bench --sizes 1000 100000 --latency 0.005 --error-rate 0.01
+    python -m bench --save-baseline              # 用本次结果更新基线 (随代码一起提交)
+    python -m bench --check                      # 有指标退化超过容差时返回非 0
+    python -m bench generate 100000 list.csv     # 只生成合成名单 (.csv / .xlsx)
+
+每个规模在独立子进程中运行，内存峰值互不干扰:
+    阶段耗时   在全量名单上流式测量: 模板渲染 / MIME 构造 / 发送日志落盘 (每封微秒)
+    端到端     在前 --e2e-max 行上完整运行 main.main() (快照、引擎、限速、日志、进度全部走真实代码)
+
+改动影响上述指标的提交 (渲染、报文构造、落盘、引擎、启动导入) 应在同一提交中用 --save-baseline 更新基线；
+行为上的回归 (CRLF 换行、重试范围、定时时段截止等) 由 tests/ 下的用例覆盖: python -m pytest tests
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SIZES = (1000, 100000, 1000000)
+COLUMNS = ['账号', 'UID', '密码', '邮箱']
+# 指标: 数值越大越好的为 True
+METRICS = {
+    "mps": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "render_us": False,
+    "mime_us": False,
+    "persist_us": False,
+    "peak_rss_mb": False,
+}
+
+
+def synthetic_records(n):
+    """确定性的合成名单，逐行产出 (行号, dict)"""
+    for i in range(n):
+        yield i, {
+            '账号': f"user{i:07d}",
+            'UID': 100000 + i,
+            '密码': f"{(i * 7919) % 1000000:06d}",
+            '邮箱': f"user{i:07d}@bench.example",
+        }
+
+
+def generate(n, path):
+    from export import write_rows
+    return write_rows(path, COLUMNS, (row for _, row in synthetic_records(n)))
+
+
+class _NullServer:
+    """只构造报文不发送，用于单独测量 MIME 构造耗时"""
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        return {}
+
+
+def measure_phases(n):
+    """全量名单上流式测量各阶段耗时 (秒)"""
+    import main
+    from checkpoint import Checkpoint
+    from engine import make_record
+    from journal import Journal
+    from sources import chunked
+    from templating import Template
+
+    with open(os.path.join(ROOT, "template.txt"), "r", encoding="utf-8") as f:
+        template = Template(f.read())
+    server = _NullServer()
+    timings = {"render": 0.0, "mime": 0.0, "persist": 0.0}
+    clock = time.perf_counter
+    workdir = tempfile.mkdtemp(prefix="bench-phases-")
+    try:
+        journal = Journal(os.path.join(workdir, "journal.db"))
+        checkpoint = Checkpoint(os.path.join(workdir, "progress.json"), "bench", journal=journal)
+        for chunk in chunked(synthetic_records(n)):
+            rows = [row for _, row in chunk]
+            t0 = clock()
+            bodies = template.render_records(rows)
+            t1 = clock()
+            for row, body in zip(rows, bodies):
+                main.send_email(server, row, body)
+            t2 = clock()
+            for (index, row) in chunk:
+                checkpoint.record(index, make_record(row, "成功", "发送成功"))
+            t3 = clock()
+            timings["render"] += t1 - t0
+            timings["mime"] += t2 - t1
+            timings["persist"] += t3 - t2
+        t0 = clock()
+        checkpoint.flush()
+        timings["persist"] += clock() - t0
+        journal.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return timings
+
+
+def measure_send(n, latency, error_rate, drop_rate, pool_size):
+    """在 n 行的临时名单上完整运行 main.main()，返回 (发送窗口秒数, 单封耗时列表, main 总耗时, 收信统计)"""
+    import config
+    import main
+    from bench.sink import SMTPSink
+
+    workdir = tempfile.mkdtemp(prefix="bench-send-")
+    cwd = os.getcwd()
+    spans = []
+    send_email = main.send_email
+
+    def timed_send(server, row, body):
+        t0 = time.perf_counter()
+        try:
+            return send_email(server, row, body)
+        finally:
+            spans.append((t0, time.perf_counter()))
+
+    try:
+        generate(n, os.path.join(workdir, "main.xlsx"))
+        shutil.copy(os.path.join(ROOT, "template.txt"), workdir)
+        os.chdir(workdir)
+        with SMTPSink(latency=latency, error_rate=error_rate, drop_rate=drop_rate, seed=0) as sink:
+            host, port = sink.address
+            overrides = {
+                "SMTP_SERVER": host, "SMTP_PORT": port, "SMTP_SECURITY": "plain",
+                "BATCH_LIMIT": 0, "POOL_SIZE": pool_size, "SUPPRESS_SENT": False,
+                "RATE_PER_SECOND": 0, "RATE_PER_MINUTE": 0, "RATE_PER_HOUR": 0, "RATE_PER_DAY": 0,
+                "RATE_BURST": 1, "RATE_JITTER": 0,
+            }
+            for key, val in overrides.items():
+                setattr(config, key, val)
+            main.send_email = timed_send
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                main.main()
+            total = time.perf_counter() - t0
+            stats = dict(sink.stats)
+    finally:
+        main.send_email = send_email
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    window = max(e for _, e in spans) - min(s for s, _ in spans) if spans else 0.0
+    return window, [e - s for s, e in spans], total, stats
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def run_size(n, args):
+    """子进程中执行: 测量一个规模，返回结果 dict"""
+    phases = measure_phases(n)
+    e2e_rows = min(n, args.e2e_max)
+    window, latencies, total, stats = measure_send(e2e_rows, args.latency, args.error_rate, args.drop_rate, args.pool)
+    return {
+        "rows": n,
+        "e2e_rows": e2e_rows,
+        "sent": stats["messages"],
+        "mps": round(stats["messages"] / window, 1) if window else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "main_s": round(total, 3),
+        "render_us": round(phases["render"] / n * 1e6, 2),
+        "mime_us": round(phases["mime"] / n * 1e6, 2),
+        "persist_us": round(phases["persist"] / n * 1e6, 2),
+        "deferred": stats["deferred"],
+        "dropped": stats["dropped"],
+        # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                             / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+    }
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """与基线对比，返回退化项列表 [(规模, 指标, 基线值, 本次值)]"""
+    regressions = []
+    if not baseline:
+        return regressions
+    for size, result in results.items():
+        base = baseline.get("results", {}).get(size)
+        if not base:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append((size, metric, old, new))
+    return regressions
+
+
+def print_table(results, baseline):
+    base_results = (baseline or {}).get("results", {})
+    header = f"{'规模':>9} {'指标':<12} {'本次':>12} {'基线':>12} {'变化':>8}"
+    print(header)
+    print("-" * len(header))
+    for size, result in results.items():
+        base = base_results.get(size, {})
+        for metric in ("mps", "p50_ms", "p99_ms", "main_s", "render_us", "mime_us", "persist_us", "peak_rss_mb"):
+            new, old = result.get(metric), base.get(metric)
+            change = f"{(new - old) / old:+.1%}" if old else ""
+            print(f"{size:>9} {metric:<12} {new:>12} {old if old is not None else '':>12} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="发送路径压测 (本机 SMTP 收信桩)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="名单规模")
+    parser.add_argument("--e2e-max", type=int, default=20000, help="端到端发送最多使用的行数")
+    parser.add_argument("--pool", type=int, default=3, help="并发连接数")
+    parser.add_argument("--latency", type=float, default=0.0, help="收信桩每封应答延迟 (秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="收信桩 451 临时错误比例")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="收信桩断开连接比例")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="判定退化的相对变化阈值")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写入 bench/baseline.json")
+    parser.add_argument("--check", action="store_true", help="有退化时返回非 0")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("command", nargs="*", help="generate N PATH: 只生成合成名单")
+    args = parser.parse_args()
+
+    if args.command:
+        if args.command[0] != "generate" or len(args.command) != 3:
+            parser.error("用法: python -m bench generate N PATH")
+        count = generate(int(args.command[1]), args.command[2])
+        print(f"✅ 已生成 {count} 行至 '{args.command[2]}'")
+        return 0
+
+    if args.child:
+        print(json.dumps(run_size(args.child, args)))
+        return 0
+
+    passthrough = [f"--e2e-max={args.e2e_max}", f"--pool={args.pool}", f"--latency={args.latency}",
+                   f"--error-rate={args.error_rate}", f"--drop-rate={args.drop_rate}"]
+    results = {}
+    for n in args.sizes:
+        print(f"⏱️ 规模 {n} ...", flush=True)
+        out = subprocess.run([sys.executable, "-m", "bench", f"--child={n}"] + passthrough,
+                             cwd=ROOT, check=True, stdout=subprocess.PIPE, text=True).stdout
+        results[str(n)] = json.loads(out.strip().splitlines()[-1])
+
+    baseline = load_baseline()
+    print()
+    print_table(results, baseline)
+    regressions = compare(results, baseline, args.tolerance)
+    for size, metric, old, new in regressions:
+        print(f"⚠️ 退化: 规模 {size} 的 {metric} 从 {old} 变为 {new}")
+
+    if args.save_baseline:
+        merged = dict((baseline or {}).get("results", {}))
+        merged.update(results)
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": f"{platform.system()} {platform.machine()}",
+                "settings": {"e2e_max": args.e2e_max, "pool": args.pool, "latency": args.latency,
+                             "error_rate": args.error_rate, "drop_rate": args.drop_rate},
+                "results": merged,
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"✅ 基线已更新: {BASELINE_FILE}")
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+本机 SMTP 收信桩: 在进程内起一个最小 SMTP 服务 (明文 + AUTH)，只计数不投递，供压测使用
+
+    latency     每封 DATA 结束后的应答延迟 (秒)，模拟服务器处理耗时
+    error_rate  RCPT 阶段返回 451 临时错误的概率
+    drop_rate   MAIL 阶段直接断开连接的概率
+"""
+import random
+import socketserver
+import threading
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        self.reply("220 sink ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line[:4].upper()
+            if verb in (b"EHLO", b"HELO"):
+                self.wfile.write(b"250-sink\r\n250-AUTH PLAIN LOGIN\r\n250-PIPELINING\r\n250 8BITMIME\r\n")
+            elif verb == b"AUTH":
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb == b"MAIL":
+                if sink.roll(sink.drop_rate):
+                    sink.count("dropped")
+                    return
+                self.reply("250 2.1.0 OK")
+            elif verb == b"RCPT":
+                if sink.roll(sink.error_rate):
+                    sink.count("deferred")
+                    self.reply("451 4.3.0 Injected temporary failure")
+                else:
+                    self.reply("250 2.1.5 OK")
+            elif verb == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data in self.rfile:
+                    if data == b".\r\n":
+                        break
+                    size += len(data)
+                if sink.latency:
+                    sink.wait(sink.latency)
+                sink.count("messages", size)
+                self.reply("250 2.0.0 Queued")
+            elif verb == b"RSET" or verb == b"NOOP":
+                self.reply("250 2.0.0 OK")
+            elif verb == b"QUIT":
+                self.reply("221 2.0.0 Bye")
+                return
+            else:
+                self.reply("502 5.5.2 Command not recognized")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """进程内 SMTP 收信桩，start() 返回 (host, port)"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, drop_rate=0.0, seed=None):
+        self.latency = float(latency)
+        self.error_rate = float(error_rate)
+        self.drop_rate = float(drop_rate)
+        self.stats = {"messages": 0, "bytes": 0, "deferred": 0, "dropped": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._server = _Server((host, port), _Handler)
+        self._server.sink = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def roll(self, rate):
+        if not rate:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def wait(self, seconds):
+        self._idle.wait(seconds)
+
+    def count(self, key, size=0):
+        with self._lock:
+            self.stats[key] += 1
+            if size:
+                self.stats["bytes"] += size
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.address
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
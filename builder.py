@@ -0,0 +1,153 @@
+"""
+报文构造: 各封相同的部分 (附件、头部) 只编码一次，逐封只渲染并编码个性化的正文
+
+    multipart/mixed
+      ├─ text/plain                          (未配置 HTML 模板时)
+      │  或 multipart/alternative
+      │       ├─ text/plain
+      │       └─ text/html
+      └─ 附件 ...                             (创建时已 base64 编码为字节，逐封直接拼接)
+
+几 MB 的附件只在创建 MessageBuilder 时编码一次，每封邮件的 CPU 开销与纯文本邮件基本相同。
+生成的报文不含 From 头时 (spool 预构建)，发送时再按连接所属账号补上。
+报文以字节交给 smtplib (不再转换换行)，因此全程按 RFC 5321 使用 CRLF 换行。
+"""
+import base64
+import hashlib
+import html
+import mimetypes
+import os
+import random
+import sys
+from email.header import Header
+from email.utils import formataddr
+
+from templating import Template
+
+# SMTP 报文的换行 (RFC 5321)
+LINESEP = "\r\n"
+CRLF = LINESEP.encode("ascii")
+
+# 合并投递 (一封多个收件人) 时的 To 头: 收件人只出现在信封 (RCPT TO) 中，互相不可见
+UNDISCLOSED_RECIPIENTS = "undisclosed-recipients:;"
+
+
+def encode_header(value):
+    """非 ASCII 的头部值按 RFC 2047 编码"""
+    value = str(value)
+    return value if value.isascii() else Header(value, 'utf-8').encode(linesep=LINESEP)
+
+
+def attachment_part(path):
+    """把一个附件文件编码为完整的 MIME 子部分字节 (头部 + base64 正文)"""
+    # email.mime 连带加载 email.policy 等模块，没有附件时不必导入
+    from email.mime.application import MIMEApplication
+    from email.mime.audio import MIMEAudio
+    from email.mime.image import MIMEImage
+    from email.mime.text import MIMEText
+    from email.policy import compat32
+
+    ctype, encoding = mimetypes.guess_type(path)
+    if ctype is None or encoding is not None:
+        ctype = "application/octet-stream"
+    maintype, subtype = ctype.split("/", 1)
+    with open(path, "rb") as f:
+        data = f.read()
+    if maintype == "text":
+        part = MIMEText(data.decode("utf-8", "replace"), subtype, "utf-8")
+    elif maintype == "image":
+        part = MIMEImage(data, subtype)
+    elif maintype == "audio":
+        part = MIMEAudio(data, subtype)
+    else:
+        part = MIMEApplication(data, subtype)
+    name = os.path.basename(path)
+    # 中文文件名按 RFC 2231 编码
+    part.add_header("Content-Disposition", "attachment", filename=name if name.isascii() else ("utf-8", "", name))
+    del part["MIME-Version"]
+    return part.as_bytes(policy=compat32.clone(linesep=LINESEP))
+
+
+class MessageBuilder:
+    """
+    subject:      邮件主题 (所有收件人相同，只编码一次)
+    html:         可选的 HTML 模板文本 (占位符与纯文本模板相同，取值会做 HTML 转义)
+    attachments:  附件文件路径列表
+    """
+
+    def __init__(self, subject, html=None, attachments=()):
+        self.subject = subject
+        self.html = Template(html, escape=_escape_html) if html else None
+        self.attachments = [attachment_part(path) for path in attachments]
+        # 与 email.generator 生成分隔符的方式相同 (不导入 uuid，启动更快)
+        self.boundary = f"==============={random.randrange(sys.maxsize):019d}=="
+        self.alt_boundary = f"==============={random.randrange(sys.maxsize):019d}=="
+        self._head = (
+            f"Subject: {encode_header(subject)}\r\n"
+            "MIME-Version: 1.0\r\n"
+            f'Content-Type: multipart/mixed; boundary="{self.boundary}"\r\n\r\n'
+        ).encode("ascii")
+        self._tail = b"".join(b"--%s\r\n%s\r\n" % (self.boundary.encode(), part) for part in self.attachments) \
+            + f"--{self.boundary}--\r\n".encode()
+
+    @classmethod
+    def from_config(cls, config, subject=None):
+        """按 config.py 的 EMAIL_SUBJECT / HTML_TEMPLATE_FILE / ATTACHMENTS 构造"""
+        html_file = getattr(config, 'HTML_TEMPLATE_FILE', "")
+        content = None
+        if html_file:
+            with open(html_file, "r", encoding="utf-8") as f:
+                content = f.read()
+        return cls(subject or getattr(config, 'EMAIL_SUBJECT', "账户通知"), content,
+                   getattr(config, 'ATTACHMENTS', ()))
+
+    @property
+    def digest(self):
+        """主题 / HTML 模板 / 附件内容的摘要 (预构建报文据此判断是否仍然有效)"""
+        h = hashlib.blake2b(digest_size=8)
+        # 换行方式也计入: 旧版本 (LF 换行) 留下的预构建报文不再复用
+        h.update(CRLF)
+        h.update(self.subject.encode("utf-8") + b"\0")
+        h.update((self.html.content if self.html else "").encode("utf-8") + b"\0")
+        for part in self.attachments:
+            h.update(hashlib.blake2b(part, digest_size=16).digest())
+        return h.hexdigest()
+
+    def body_key(self, row, body):
+        """一封邮件正文 (纯文本 + HTML) 的摘要: 摘要相同的收件人可以共用同一个报文"""
+        h = hashlib.blake2b(body.encode("utf-8"), digest_size=16)
+        if self.html:
+            h.update(b"\0" + self.html.render(row).encode("utf-8"))
+        return h.digest()
+
+    @property
+    def placeholders(self):
+        return self.html.placeholders if self.html else set()
+
+    def build(self, row, to, body, sender=None):
+        """
+        拼出一封完整报文 (bytes)。row 用于渲染 HTML 模板，body 为已渲染的纯文本正文；
+        sender 为 (名称, 邮箱)，为 None 时不写 From 头。
+        """
+        head = f"To: {encode_header(to)}\r\n"
+        if sender:
+            head = f"From: {formataddr(sender)}\r\n" + head
+        text = _text_part(body, "plain")
+        if self.html:
+            alt = self.alt_boundary.encode()
+            content = (b'Content-Type: multipart/alternative; boundary="%s"\r\n\r\n--%s\r\n%s\r\n--%s\r\n%s\r\n--%s--\r\n'
+                       % (alt, alt, text, alt, _text_part(self.html.render(row), "html"), alt))
+        else:
+            content = text
+        return b"".join((head.encode("ascii"), self._head,
+                         b"--%s\r\n" % self.boundary.encode(), content, CRLF, self._tail))
+
+
+def _escape_html(value):
+    return html.escape(value, quote=True)
+
+
+def _text_part(body, subtype):
+    """个性化正文部分: UTF-8 + base64 (与 MIMEText(body, subtype, 'utf-8') 等价)"""
+    return (f'Content-Type: text/{subtype}; charset="utf-8"\r\nContent-Transfer-Encoding: base64\r\n\r\n'.encode("ascii")
+            + base64.encodebytes(body.encode("utf-8")).replace(b"\n", CRLF))
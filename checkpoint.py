@@ -0,0 +1,96 @@
+"""
+发送进度: 发送过程中每 N 封把结果写入发送日志，并记录已确认处理的行号
+
+源文件不再被改写，进度文件即名单的游标: 下一批从 cursor 处继续，中断后重跑同样续发。
+
+进度文件为 JSON (原子替换写入):
+    fingerprint  源文件指纹，文件被改动后旧进度自动失效
+    cursor       该行号之前的行均已处理
+    done         cursor 之后零散已处理的行号 (并发发送时的乱序完成)
+"""
+import json
+import os
+
+CHECKPOINT_SUFFIX = ".progress.json"
+
+
+def checkpoint_path(source_path):
+    """CLI 使用: 进度文件与数据源放在一起 (如 main.xlsx.progress.json)"""
+    return source_path + CHECKPOINT_SUFFIX
+
+
+def file_fingerprint(path):
+    """源文件指纹 (大小 + 修改时间)，不需要读取文件内容"""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+class Checkpoint:
+    """已处理行号 + 待落盘记录缓冲"""
+
+    def __init__(self, path, fingerprint, journal=None, every=20, cursor=0, done=()):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.journal = journal
+        self.suppression = None  # 屏蔽索引: 与发送日志一起在进度之前落盘
+        self.every = max(1, int(every))
+        self.cursor = cursor
+        self.done = set(done)
+        self._pending = []
+
+    @classmethod
+    def load(cls, path, fingerprint, **kwargs):
+        """读取进度文件；不存在或指纹不一致时返回 None"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if state.get("fingerprint") != fingerprint:
+            return None
+        return cls(path, fingerprint, cursor=state.get("cursor", 0), done=state.get("done", ()), **kwargs)
+
+    def __contains__(self, index):
+        return index < self.cursor or index in self.done
+
+    def __len__(self):
+        return self.cursor + len(self.done)
+
+    def mark(self, index):
+        self.done.add(int(index))
+        while self.cursor in self.done:
+            self.done.discard(self.cursor)
+            self.cursor += 1
+
+    def record(self, index, record):
+        """登记一条已处理结果，每满 every 条落盘一次 (index 为 None 表示不属于名单的记录，如重试)"""
+        if index is not None:
+            self.mark(index)
+        self._pending.append(record)
+        if len(self._pending) >= self.every:
+            self.flush()
+
+    def flush(self):
+        """先写发送日志与屏蔽索引，再写进度文件 (崩溃时最多重复最后不足 every 条)"""
+        if self._pending and self.journal is not None:
+            self.journal.append(self._pending)
+        self._pending = []
+        if self.suppression is not None:
+            self.suppression.flush()
+        self.save()
+
+    def save(self):
+        state = {"fingerprint": self.fingerprint, "cursor": self.cursor, "done": sorted(self.done)}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        """名单清理 (compact) 或任务全部结束后删除进度文件"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -4,6 +4,8 @@
 # SMTP服务器地址 (Gmail企业版/个人版默认通用)
 SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 465
+# 加密方式: None 按端口自动选择 (465 为 SSL，其余为 STARTTLS)；"plain" 仅用于本机测试服务器
+SMTP_SECURITY = None
 
 # 你的发送账号
 SENDER_EMAIL = "your_email@gmail.com"
@@ -19,6 +21,81 @@ SENDER_NAME = "IT Support"
 # 邮件标题
 EMAIL_SUBJECT = "Notification"
 
+# 可选的 HTML 正文模板 (如 "template.html"，占位符与 template.txt 相同)，留空则只发纯文本
+HTML_TEMPLATE_FILE = ""
+# 附件文件路径列表 (如 ["说明.pdf", "logo.png"])，所有收件人相同，发送前只编码一次
+ATTACHMENTS = []
+
+# 命令行名单文件: .xlsx / .csv / .jsonl / .parquet
+# 频繁运行的小批量定时任务建议用 .csv 或 .jsonl (只用标准库读取，启动更快)
+SOURCE_FILE = "main.xlsx"
+
 # 单次任务发送数量限制
 # 设为 0 表示不限制（一次性发完所有）
 BATCH_LIMIT = 50
+
+# 并发连接数 (同时保持登录的 SMTP 连接数量，每个连接独立节流)
+POOL_SIZE = 3
+# 连接空闲 (等待任务) 超过多少秒发一次 NOOP 保持登录 (定时任务在时段内匀速发送时连接不会被服务器断开)，0 为不发送
+SMTP_KEEPALIVE = 60
+
+# 多发件账号 (留空则只使用上面的 SENDER_EMAIL)，POOL_SIZE 个连接按 weight 分给各账号。
+# 每个账号单独计额: per_day / per_hour / per_minute 缺省取下面的 RATE_*，请按服务商对该账号的限制填写；
+# 某个账号被限流 (如 421 4.7.0) 时暂停该账号，其余账号继续，暂停状态可用 python accounts.py 查看。
+# 例: {"email": "a@example.com", "password": "xxxx", "name": "IT Support", "per_day": 500, "weight": 2}
+#     (host / port / security 缺省取 SMTP_SERVER / SMTP_PORT / SMTP_SECURITY)
+SENDER_POOL = []
+
+# 发送速率 (0 表示不限制)，同一账号的所有连接共享同一额度
+# 每日上限请按服务商限制填写 (Gmail 个人版约 500，企业版约 2000)
+RATE_PER_SECOND = 0
+RATE_PER_MINUTE = 15
+RATE_PER_HOUR = 0
+RATE_PER_DAY = 0
+# 允许的突发数量 (连续无间隔发送的封数)
+RATE_BURST = 1
+# 间隔随机抖动比例 (0~1)，只推迟发送时刻，不降低平均速率
+RATE_JITTER = 0.5
+
+# 自适应发送控制 (AIMD，见 control.py): 出现 4xx / 421 / 断线或往返耗时明显变长时，自动把各账号的发送速率与
+# 活动连接数减半，之后随健康的发送逐步恢复。上面的速率与 POOL_SIZE 是上限，控制器只在上限以内调整
+ADAPTIVE_CONTROL = True
+
+# 发送日志 (只追加)，历史报表通过 python journal.py export 按需导出
+JOURNAL_FILE = "sent_journal.db"
+
+# 报文预构建 (spool): 构建报文的进程数。大于 0 时先用多进程把邮件渲染成 .eml 文件，发送线程只负责传输；
+# 0 表示在发送线程中边构造边发送。python main.py --dry-run 只构建不发送 (之后的运行会直接复用这些报文)
+SPOOL_WORKERS = 0
+SPOOL_DIR = "spool"
+
+# 分片发送 (python main.py --shard / python shards.py work): 每个分片的行数，认领租约的秒数
+# 多个 worker 共用 JOURNAL_FILE 协调分片；每个发件账号同一时刻只由一个 worker 使用，
+# 每个 worker 最多使用 SHARD_ACCOUNTS 个账号 (0 为不限)，因此同时发送的 worker 数不超过发件账号数
+SHARD_SIZE = 1000
+SHARD_LEASE = 300
+SHARD_ACCOUNTS = 1
+# 多台机器通过网络共享目录使用同一个发送日志库时设为 False (WAL 模式只能在同一台机器的进程间共享)
+JOURNAL_WAL = True
+
+# 合并投递: 正文 (含 HTML) 完全相同的收件人每 GROUP_RECIPIENTS 个合为一封 (一次 SMTP 事务、多个 RCPT TO，
+# To 头为 "undisclosed-recipients:;"，收件人互相不可见)。每个收件人仍各占一个发送额度，逐行记录结果。
+# 0 或 1 为逐封发送；不要超过服务商的单封收件人上限 (Gmail 为 100)。启用后不使用预构建报文 (spool)
+GROUP_RECIPIENTS = 0
+
+# 断点保存间隔: 每发送多少封写一次发送日志与进度文件 (进程被强杀时最多重复这么多封)
+CHECKPOINT_EVERY = 20
+
+# 去重 / 屏蔽索引目录 (已发送、退信、退订的地址)，管理命令见 python suppression.py -h
+SUPPRESSION_DIR = "suppression"
+# 是否跳过以前已成功发送过的地址 (新一轮通知需要再发给同一批人时设为 False)
+SUPPRESS_SENT = True
+
+# 临时失败 (4xx / 连接中断) 的重试: 最多尝试次数，首次重试等待秒数 (之后每次翻倍)
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 300
+
+# 运行指标目录: 各阶段耗时与 SMTP 应答码 (Prometheus 文本文件 + 每次运行的 JSON 摘要)
+METRICS_DIR = "metrics"
+# cProfile 抽样比例 (0~1)，例如 0.01 表示剖析约 1% 的发送，结果写入指标目录的 .prof 文件
+PROFILE_SAMPLE_RATE = 0
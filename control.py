@@ -0,0 +1,155 @@
+"""
+自适应发送控制 (AIMD): 按 SMTP 应答码与往返耗时实时调整各发件账号的发送速率与活动连接数
+
+每个账号一个窗口 w (FLOOR ~ 1)，同时作用于:
+    速率       限速器的每秒 / 每分钟间隔 = 配置间隔 / w (每小时 / 每日上限不变)
+    连接数     该账号的活动连接数 = ceil(分到的连接数 × w)，其余连接空闲等待，不领取任务
+
+    乘性减   421 / 断线重连 / 发件方被限流 (速率、额度类应答)，或往返耗时 (EWMA) 超过基线的
+             LATENCY_FACTOR 倍 → w × BETA，之后 HOLD 秒内不再调整 (同一次拥塞的连串错误只减一次)。
+             单个收件人的 4xx (如灰名单) 不是拥塞，不影响窗口
+    加性增   持续 HOLD 秒没有拥塞信号则 w + STEP (按时间而不是按封数增加，速率再低也不会恢复过快)，直到回到 1
+
+config.py 中的 RATE_* / POOL_SIZE / 各账号额度是上限: 控制器只在上限以内收放，绝不超出。
+未设置每秒 / 每分钟速率的账号只调整连接数。每次调整记入运行指标 (JSON 摘要的 control 项)。
+窗口按限速器划分: 共用一个限速器的账号 (如网页端同一发件账号的并发任务) 共用一个窗口，
+因此这些任务应共用同一个控制器 (jobs.JobManager 为此只建一个)。
+"""
+import math
+import threading
+import time
+
+STEP = 0.1
+BETA = 0.5
+FLOOR = 0.1
+HOLD = 30.0
+LATENCY_FACTOR = 3.0
+LATENCY_MIN = 0.5   # 往返耗时低于该秒数时不视为变慢 (本机 / 局域网服务器的抖动)
+EWMA_ALPHA = 0.2
+WARMUP = 5          # 取基线前至少观察的发送数
+
+
+class _State:
+    def __init__(self, account, metrics):
+        self.account = account
+        self.connections = {}  # 账号 -> 分到的连接数 (共用窗口的各个任务各自登记)
+        self.metrics = metrics
+        self.window = 1.0
+        self.ewma = None
+        self.baseline = None
+        self.samples = 0
+        self.hold_until = 0.0      # 此前不再减 (同一次拥塞)
+        self.next_increase = 0.0   # 此前不再增
+
+    def active(self, account):
+        return max(1, math.ceil(self.connections.get(account, 1) * self.window - 1e-9))
+
+
+class AIMDController:
+    """线程安全；metrics 为可选的 metrics.Metrics，调整记录写入其中"""
+
+    def __init__(self, metrics=None, step=STEP, beta=BETA, floor=FLOOR, hold=HOLD,
+                 latency_factor=LATENCY_FACTOR, clock=time.monotonic):
+        self.metrics = metrics
+        self.step = step
+        self.beta = beta
+        self.floor = floor
+        self.hold = hold
+        self.latency_factor = latency_factor
+        self.clock = clock
+        self._states = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, metrics=None):
+        """config.ADAPTIVE_CONTROL 关闭时返回 None"""
+        if not getattr(config, 'ADAPTIVE_CONTROL', True):
+            return None
+        return cls(metrics)
+
+    def register(self, account, connections, metrics=None):
+        """
+        登记账号分到的连接数 (同一账号重复登记时保留窗口)。
+        metrics 为本次运行的指标 (缺省用创建控制器时的)，之后的调整记入其中
+        """
+        with self._lock:
+            state = self._states.get(_key(account))
+            if state is None:
+                state = self._states[_key(account)] = _State(account, metrics or self.metrics)
+            state.connections[account] = connections
+            state.metrics = metrics or state.metrics
+
+    def admit(self, account, rank):
+        """该账号的第 rank 个连接 (从 0 开始) 当前是否可以领取任务"""
+        with self._lock:
+            state = self._states.get(_key(account))
+            return state is None or rank < state.active(account)
+
+    def success(self, account, seconds):
+        """一次正常完成的 SMTP 事务 (含永久失败: 那是收件人的问题，不是拥塞)"""
+        with self._lock:
+            state = self._states.get(_key(account))
+            if state is None:
+                return
+            state.samples += 1
+            state.ewma = seconds if state.ewma is None else \
+                EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * state.ewma
+            if state.samples >= WARMUP:
+                state.baseline = state.ewma if state.baseline is None else min(state.baseline, state.ewma)
+            now = self.clock()
+            if state.baseline is not None and state.ewma > max(LATENCY_MIN, state.baseline * self.latency_factor):
+                if now >= state.hold_until:
+                    self._decrease(account, state, now, f"往返耗时 {state.ewma:.2f}s (基线 {state.baseline:.2f}s)")
+            elif state.window < 1.0 and now >= state.next_increase:
+                state.window = min(1.0, state.window + self.step)
+                state.next_increase = now + self.hold
+                self._apply(account, state)
+                if state.window >= 1.0:
+                    self._event(account, state, "recover", "已恢复到配置上限")
+
+    def congestion(self, account, reason):
+        """拥塞信号: 421 / 断线 / 限流 (单个收件人的 4xx，如灰名单，不是拥塞，由调用方过滤)"""
+        with self._lock:
+            state = self._states.get(_key(account))
+            if state is None:
+                return
+            now = self.clock()
+            if now >= state.hold_until:
+                self._decrease(account, state, now, reason)
+
+    def _decrease(self, account, state, now, reason):
+        state.window = max(self.floor, state.window * self.beta)
+        state.hold_until = state.next_increase = now + self.hold
+        # 变慢之后的耗时不再作为比较对象，重新取基线
+        state.baseline = None
+        state.samples = 0
+        self._apply(account, state)
+        self._event(account, state, "decrease", reason)
+
+    def _apply(self, account, state):
+        if account.limiter is not None:
+            account.limiter.set_scale(state.window)
+        if state.metrics:
+            state.metrics.gauge("control_window", account.email or "", state.window)
+
+    def _event(self, account, state, action, reason):
+        if state.metrics:
+            limiter = account.limiter
+            state.metrics.event(
+                "control", action=action, account=account.email, reason=str(reason)[:200],
+                window=round(state.window, 3), connections=state.active(account),
+                per_minute=round(60 / limiter.interval, 2) if limiter is not None and limiter.interval else None,
+            )
+
+    def describe(self):
+        """各账号当前窗口的一行中文摘要 (都在上限时返回 None)"""
+        with self._lock:
+            low = [s for s in self._states.values() if s.window < 1.0]
+        if not low:
+            return None
+        return "，".join(f"{s.account.email or '默认账号'} {s.window:.0%} ({s.active(s.account)} 个连接)" for s in low)
+
+
+def _key(account):
+    # 有限速器时按限速器区分 (窗口作用在限速器上)，否则按账号
+    return account.limiter if account.limiter is not None else account
@@ -0,0 +1,708 @@
+"""并发发送引擎: 维护一组已登录的 SMTP 连接，把任务行分摊到各个连接上并行投递"""
+import queue
+import re
+import smtplib
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from templating import get_recipient
+
+_END = object()
+
+RECONNECT_ATTEMPTS = 5
+RECONNECT_DELAY = 2.0
+RECONNECT_MAX_DELAY = 60.0
+KEEPALIVE = 60.0
+
+GROUP_BUFFER = 1000
+
+THROTTLE_COOLDOWN = 15 * 60
+QUOTA_COOLDOWN = 24 * 3600
+# 发件方被限流的 4xx 应答特征 (如 "451 4.7.1 Rate limit exceeded"、"421 4.7.0 Try again later")
+THROTTLE_PATTERN = re.compile(r"rate|quota|limit|too many|frequen", re.IGNORECASE)
+THROTTLE_CODES = (421, 450, 451)
+# 服务商明确的发件额度用尽 (如 Gmail "550 5.4.5 Daily user sending quota exceeded"、
+# Outlook "554 5.2.0 ...SubmissionQuotaExceededException")
+QUOTA_PATTERN = re.compile(r"\b5\.4\.5\b|SubmissionQuotaExceeded|sending (?:quota|limit)", re.IGNORECASE)
+# 增强状态码 (RFC 3463) 的 x.2.x / x.3.x 是收件邮箱 / 收件系统的问题 (邮箱已满、报文过大、收件方限速)，
+# 与发件账号无关 (如 "552 5.3.4 Message size exceeds fixed limit"、"550 5.2.2 mailbox over quota")
+ENHANCED_STATUS = re.compile(r"\b[245]\.(\d{1,3})\.\d{1,3}\b")
+
+
+def open_smtp(host, port, user, password, timeout=60, security=None):
+    """
+    建立并登录一个 SMTP 连接。
+    security: "ssl" / "starttls" / "plain" (明文，仅用于本机测试服务器)；
+    默认按端口判断: 465 端口走 SSL，其余端口走 STARTTLS
+    """
+    security = security or ("ssl" if port == 465 else "starttls")
+    if security == "ssl":
+        server = smtplib.SMTP_SSL(host, port, timeout=timeout)
+    else:
+        server = smtplib.SMTP(host, port, timeout=timeout)
+        if security == "starttls":
+            server.starttls()
+    server.login(user, password)
+    return server
+
+
+def classify_error(exc):
+    """
+    发送异常分类:
+        "connection"  连接已断开 (断线 / 421 / 网络错误)，重连后可重发同一封
+        "transient"   临时拒绝 (4xx)，稍后重试
+        "permanent"   永久失败 (5xx 或其它错误)
+    """
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in exc.recipients.values()]
+        return "transient" if codes and all(400 <= code < 500 for code in codes) else "permanent"
+    if isinstance(exc, smtplib.SMTPResponseException):
+        if exc.smtp_code == 421:
+            return "connection"
+        return "transient" if 400 <= exc.smtp_code < 500 else "permanent"
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return "connection"
+    if isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException):
+        return "connection"  # 网络错误 / 超时
+    return "permanent"
+
+
+def throttle_cooldown(exc):
+    """
+    异常是发件方被服务商限流 / 超额时返回发件账号应暂停的秒数，否则返回 None。
+    只认发件方的信号: 421 / 450 / 451 / 4.7.x 且带速率或额度字样的应答暂停 THROTTLE_COOLDOWN，
+    服务商已知的每日额度用尽应答暂停 QUOTA_COOLDOWN；报文过大、收件邮箱已满等按单封失败处理
+    """
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        replies = list(exc.recipients.values())
+    elif isinstance(exc, smtplib.SMTPResponseException):
+        replies = [(exc.smtp_code, exc.smtp_error)]
+    else:
+        return None
+    for code, text in replies:
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", "replace")
+        text = str(text)
+        if code >= 500:
+            if QUOTA_PATTERN.search(text):
+                return QUOTA_COOLDOWN
+            continue
+        if code < 400:
+            continue
+        status = ENHANCED_STATUS.search(text)
+        subject = status.group(1) if status else None
+        if subject in ("2", "3"):
+            continue
+        if (code in THROTTLE_CODES or subject == "7") and THROTTLE_PATTERN.search(text):
+            return THROTTLE_COOLDOWN
+        if code == 421 and "try again later" in text.lower():
+            return THROTTLE_COOLDOWN
+    return None
+
+
+def make_record(row, status, detail, sender=None):
+    """构造归档记录 (复制原行数据 + 状态)"""
+    record = dict(row)
+    record['发送状态'] = status
+    record['详情'] = detail
+    record['发送时间'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if sender:
+        record['发件账号'] = sender
+    return record
+
+
+def plan_connections(accounts, pool_size):
+    """按权重把 pool_size 个连接分给各账号 (最大余数法，每个可用账号至少 1 个)，返回每个连接所属的账号"""
+    usable = [a for a in accounts if a.weight > 0 and not a.paused]
+    if not usable:
+        return []
+    total = max(int(pool_size), len(usable))
+    weight_sum = sum(a.weight for a in usable)
+    shares = [(total - len(usable)) * a.weight / weight_sum for a in usable]
+    counts = [1 + int(share) for share in shares]
+    leftover = total - sum(counts)
+    for i in sorted(range(len(usable)), key=lambda i: shares[i] - int(shares[i]), reverse=True)[:leftover]:
+        counts[i] += 1
+    return [account for account, n in zip(usable, counts) for _ in range(n)]
+
+
+class _Lane:
+    """单账号模式: 把 connect / limiter 包装成与 accounts.SenderAccount 相同的接口"""
+
+    email = None
+    weight = 1
+
+    def __init__(self, connect, limiter):
+        self.connect = connect
+        self.limiter = limiter
+        self.paused_until = 0.0
+        self.pause_reason = None
+
+    @property
+    def paused(self):
+        return time.time() < self.paused_until
+
+    def pause(self, seconds, reason=""):
+        self.paused_until = max(self.paused_until, time.time() + seconds)
+        self.pause_reason = reason
+
+
+class _Group:
+    """正文完全相同、合并为一次 SMTP 事务投递的若干行: members 为 [(index, row), ...]"""
+
+    __slots__ = ("members",)
+
+    def __init__(self, members):
+        self.members = members
+
+
+class _Grouper:
+    """
+    按 key(row, body) 把发送任务攒成组: 某组满 size 行时交出；所有组合计超过 buffer 行时全部交出，
+    只攒到 1 行的组仍按单封任务发送。key 返回 None 的行不参与合并。
+    """
+
+    def __init__(self, key, size, buffer):
+        self.key = key
+        self.size = size
+        self.buffer = buffer
+        self.groups = {}  # key -> [首行 seq, body, members]
+        self.count = 0
+
+    def add(self, seq, index, row, body):
+        """加入一行，返回可以派发的任务列表"""
+        key = self.key(row, body)
+        if key is None:
+            return [(seq, index, row, body, frozenset())]
+        group = self.groups.setdefault(key, [seq, body, []])
+        group[2].append((index, row))
+        self.count += 1
+        if len(group[2]) >= self.size:
+            del self.groups[key]
+            self.count -= len(group[2])
+            return [self._job(group)]
+        if self.count >= self.buffer:
+            return self.drain()
+        return []
+
+    def drain(self):
+        jobs = [self._job(group) for group in self.groups.values()]
+        self.groups = {}
+        self.count = 0
+        return jobs
+
+    @staticmethod
+    def _job(group):
+        seq, body, members = group
+        if len(members) == 1:
+            index, row = members[0]
+            return seq, index, row, body, frozenset()
+        return seq, None, _Group(members), body, frozenset()
+
+
+
+class SendEngine:
+    """
+    连接池发送引擎
+
+    connect():          返回一个已登录的 SMTP 连接
+    send(server, row, body): 投递一行 (body 为预先渲染好的正文)，返回 (是否成功, 详情)；
+                        SMTP 异常直接抛出，由引擎按 classify_error 处理:
+                        断线自动重连 (指数退避) 后重发同一封，4xx 临时错误记为 "延迟" 交给重试队列
+    limiter:            共享的 RateLimiter，每封发送前预约时刻；额度用尽时整体停止
+    accounts:           多账号模式 (accounts.SenderAccount 列表)，代替 connect / limiter:
+                        按权重分配 pool_size 个连接，每个账号用自己的限速器计额；
+                        连接带 sender 属性 (发件人名称, 邮箱)，send 据此填写 From。
+                        某个账号额度用尽或被服务商限流 (暂停) 时，手上的那封转给其它账号发送，
+                        所有账号都不可用时整体停止，未发送的行留给下一次运行
+    screen(index, row): 发送前筛查，返回跳过原因 (如已发送过/退订) 则直接记为 "跳过"；
+                        返回 (状态, 详情) 则按该状态记录 (如预检出的无效地址记为 "失败")。都不连接服务器、不占用发送额度
+    hold(index, row):   发送前 (领取任务后、预约发送额度前) 再检查一次，返回 True 时这一行不发送、不出结果，
+                        留给下一次运行 (如定时任务的时段已结束)
+    on_result(index, record): 每出一条结果回调一次 (在调用 run 的线程中执行，可安全刷新界面)
+    metrics:            可选的 metrics.Metrics，记录限速等待 / 报文构造 / SMTP 往返 / 重连耗时与应答码
+    send_group(server, rows, body): 合并投递 (group_size > 1 时启用): group_key(row, body) 相同的行
+                        (正文完全相同) 每 group_size 行合为一次 SMTP 事务 (一个报文、多个 RCPT TO)，
+                        返回被拒收的 {地址: (应答码, 信息)} (与 sendmail 相同)；group_key 返回 None 的行单独发送。
+                        每个收件人各占一个发送额度，结果仍按行逐条交给 on_result
+    keepalive:          连接空闲 (等待任务) 超过该秒数时发一次 NOOP 保持会话，失败则重连；0 为不发送。
+                        任务来得很慢时 (如定时任务在时段内匀速发送) 连接不会因空闲被服务器断开
+    control:            可选的 control.AIMDController: 每次 SMTP 事务后反馈应答与往返耗时，
+                        由它在配置的速率 / 连接数以内收放各账号的发送速率与活动连接数
+    """
+
+    def __init__(self, connect=None, send=None, pool_size=1, limiter=None, on_result=None, screen=None,
+                 metrics=None, accounts=None, send_group=None, group_key=None, group_size=0, group_buffer=None,
+                 control=None, keepalive=KEEPALIVE, hold=None):
+        self.send = send
+        self.hold = hold
+        self.keepalive = float(keepalive or 0)
+        self.control = control
+        self.send_group = send_group
+        self.group_key = group_key
+        self.group_size = int(group_size or 0)
+        # 正文各不相同时最多攒这么多行再派发，避免发送线程长时间空等
+        self.group_buffer = group_buffer or max(GROUP_BUFFER, self.group_size * 4)
+        self.pool_size = max(1, int(pool_size))
+        self.accounts = list(accounts) if accounts else [_Lane(connect, limiter)]
+        self.exhausted = False
+        self.disconnected = False
+        self.throttled = False
+        self.on_result = on_result
+        self.screen = screen
+        self.metrics = metrics
+        self.servers = []
+        self.slots = []
+        self.login_errors = {}
+        self._seq = 0
+        self._stop = threading.Event()
+
+    def open(self):
+        """
+        预先登录全部连接。单账号时任一失败即关闭已建立的连接并抛出异常；
+        多账号时跳过登录失败的账号 (记入 login_errors)，全部失败才抛出。
+        """
+        single = len(self.accounts) == 1
+        failed = set()
+        try:
+            for account in plan_connections(self.accounts, self.pool_size):
+                if account in failed:
+                    continue
+                try:
+                    server = account.connect()
+                except Exception as e:
+                    if single:
+                        raise
+                    failed.add(account)
+                    self.login_errors[account.email] = e
+                    continue
+                self.slots.append(account)
+                self.servers.append(server)
+            if not self.servers:
+                if self.login_errors:
+                    raise next(iter(self.login_errors.values()))
+                raise RuntimeError("没有可用的发件账号 (均处于暂停期)")
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        for server in self.servers:
+            try:
+                server.quit()
+            except Exception:
+                pass
+        self.servers = []
+        self.slots = []
+
+    def stop(self):
+        self._stop.set()
+
+    def _halted(self):
+        return self._stop.is_set() or self.exhausted or self.disconnected or self.throttled
+
+    def _reconnect(self, slot, congested=True):
+        """
+        重建第 slot 个连接 (指数退避)，成功返回新连接，放弃或被停止时返回 None。
+        congested 为 False 时 (空闲连接失效) 不作为拥塞信号反馈给自适应控制
+        """
+        try:
+            self.servers[slot].close()
+        except Exception:
+            pass
+        if self.control and congested:
+            self.control.congestion(self.slots[slot], "连接断开，重连")
+        start = time.perf_counter()
+        try:
+            return self._connect_with_backoff(slot)
+        finally:
+            if self.metrics:
+                self.metrics.observe("reconnect", time.perf_counter() - start)
+
+    def _connect_with_backoff(self, slot):
+        delay = RECONNECT_DELAY
+        for _ in range(RECONNECT_ATTEMPTS):
+            if self._stop.wait(delay):
+                return None
+            try:
+                server = self.slots[slot].connect()
+            except Exception:
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+            self.servers[slot] = server
+            return server
+        return None
+
+    def _keep_warm(self, slot):
+        """空闲连接发 NOOP；会话已失效时重连，重连失败返回 False"""
+        try:
+            code, _ = self.servers[slot].noop()
+            if code == 250:
+                return True
+        except Exception:
+            pass
+        return self._reconnect(slot, congested=False) is not None
+
+    def _congested(self, slot, detail, per_recipient):
+        """
+        临时拒绝 (4xx) 的拥塞反馈: 整个事务被拒 (MAIL / DATA 阶段，如服务器繁忙) 算拥塞；
+        个别收件人在 RCPT 阶段被拒 (如灰名单) 是收件方的问题，不影响发送窗口
+        """
+        if self.control and not per_recipient:
+            self.control.congestion(self.slots[slot], detail)
+
+    def _deliver(self, slot, row, body):
+        """
+        投递一封，断线时重连后重发；返回 (状态, 详情, 连接是否仍可用, 限流暂停秒数)。
+        限流暂停秒数不为 None 时这一封没有发出，应换账号或留待下次。
+        """
+        server = self.servers[slot]
+        for attempt in range(2):
+            try:
+                if self.metrics:
+                    ok, detail = self.metrics.send(self.send, server, row, body)
+                else:
+                    ok, detail = self.send(server, row, body)
+                return ("成功" if ok else "失败"), detail, True, None
+            except Exception as e:
+                kind = classify_error(e)
+                detail = str(e) or type(e).__name__
+                cooldown = throttle_cooldown(e)
+                refused = isinstance(e, smtplib.SMTPRecipientsRefused)
+            if cooldown:
+                return "延迟", detail, True, cooldown
+            if kind == "transient":
+                self._congested(slot, detail, refused)
+                return "延迟", detail, True, None
+            if kind == "permanent":
+                return "失败", detail, True, None
+            server = self._reconnect(slot)
+            if server is None:
+                return "延迟", f"连接中断: {detail}", False, None
+        # 重连后仍然断开: 这一封交给重试队列，连接继续服务后续任务
+        return "延迟", f"连接中断: {detail}", True, None
+
+    def _deliver_group(self, slot, rows, body):
+        """
+        合并投递一组 (一次 SMTP 事务)，返回 (各行的 (状态, 详情) 列表, 连接是否仍可用, 限流暂停秒数, 限流应答)。
+        整组因限流未发出时列表为 None，应换账号或留待下次；部分收件人被限流拒收时这些行记为 "延迟"，
+        其余行照常记录，同时返回暂停秒数。
+        """
+        server = self.servers[slot]
+        for attempt in range(2):
+            try:
+                if self.metrics:
+                    refused = self.metrics.send(self.send_group, server, rows, body)
+                else:
+                    refused = self.send_group(server, rows, body)
+                break
+            except smtplib.SMTPRecipientsRefused as e:
+                # 全部收件人被拒: 逐个按应答码记录
+                refused = e.recipients
+                break
+            except Exception as e:
+                kind = classify_error(e)
+                detail = str(e) or type(e).__name__
+                cooldown = throttle_cooldown(e)
+            if cooldown:
+                return None, True, cooldown, detail
+            if kind == "transient":
+                self._congested(slot, detail, False)
+            if kind != "connection":
+                return [("延迟" if kind == "transient" else "失败", detail)] * len(rows), True, None, None
+            server = self._reconnect(slot)
+            if server is None:
+                return [("延迟", f"连接中断: {detail}")] * len(rows), False, None, None
+        else:
+            return [("延迟", f"连接中断: {detail}")] * len(rows), True, None, None
+
+        refused = refused or {}
+        detail = str(refused) if refused else None
+        cooldown = throttle_cooldown(smtplib.SMTPRecipientsRefused(refused)) if refused else None
+        if cooldown and len(refused) == len(rows):
+            return None, True, cooldown, detail
+        outcomes = []
+        for row in rows:
+            reply = refused.get(str(get_recipient(row)).strip())
+            if reply is None:
+                outcomes.append(("成功", f"发送成功 (合并投递 {len(rows)} 人)"))
+                continue
+            code, text = reply
+            if isinstance(text, bytes):
+                text = text.decode("utf-8", "replace")
+            status = "延迟" if 400 <= code < 500 or cooldown else "失败"
+            outcomes.append((status, f"{code} {text}"))
+        return outcomes, True, cooldown, detail
+
+    def run(self, jobs):
+        """
+        jobs 为可迭代的 (index, row, body)，row 需支持 dict(row)。结果只通过 on_result 交给调用方，引擎不保留记录
+        (调用方用 results.ResultTable 按行号记录)。启用合并投递时结果的顺序可能与 jobs 不同。
+        中断 (KeyboardInterrupt) 时等待各连接发完手上这一封再抛出，已出结果不会丢失。
+        """
+        if not self.servers:
+            self.open()
+
+        job_q = queue.Queue(maxsize=len(self.servers) * 2)
+        failover_q = queue.Queue()  # 额度用尽 / 被限流的账号转给其它账号的任务
+        result_q = queue.Queue()
+        self._stop.clear()
+        first_seq = self._seq  # 同一引擎可多次 run (如先跑重试队列)
+        live = Counter(self.slots)  # 各账号仍在工作的连接数
+        exits = Counter()           # 连接提前退出的原因
+        exhausted = set()
+        lock = threading.Lock()
+        fed = threading.Event()     # 名单已全部派发
+        running = set(range(len(self.slots)))  # 仍在工作的连接 (自适应控制按其中的序号收放连接)
+        if self.control:
+            for account, n in live.items():
+                self.control.register(account, n, self.metrics)
+
+        def working():
+            with lock:
+                return sum(live.values()) > 0
+
+        def admitted(slot, account):
+            """该连接在所属账号仍在工作的连接中的序号是否在自适应控制允许的活动连接数以内"""
+            with lock:
+                rank = sum(1 for s in running if s < slot and self.slots[s] is account)
+            return self.control.admit(account, rank)
+
+        grouper = None
+        if self.send_group and self.group_key and self.group_size > 1:
+            grouper = _Grouper(self.group_key, self.group_size, self.group_buffer)
+
+        def dispatch(job):
+            while not self._halted() and working():
+                try:
+                    job_q.put(job, timeout=0.2)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def feed():
+            try:
+                for seq, (index, row, body) in enumerate(jobs, first_seq):
+                    verdict = self.screen(index, row) if self.screen else None
+                    if verdict:
+                        status, detail = verdict if isinstance(verdict, tuple) else ("跳过", verdict)
+                        result_q.put((seq, index, make_record(row, status, detail)))
+                        continue
+                    ready = grouper.add(seq, index, row, body) if grouper else \
+                        [(seq, index, row, body, frozenset())]
+                    if not all(dispatch(job) for job in ready):
+                        break
+                else:
+                    if grouper:
+                        # 中途停止时尚未派发的行不出结果，留给下一次运行
+                        all(dispatch(job) for job in grouper.drain())
+            except Exception as e:
+                result_q.put(e)
+                self._stop.set()
+            finally:
+                fed.set()
+                for _ in self.servers:
+                    while working():
+                        try:
+                            job_q.put(_END, timeout=0.2)
+                            break
+                        except queue.Full:
+                            continue
+
+        def failover(job, account):
+            """把手上的任务转给其它仍可用的账号；没有可用账号时放弃 (该行不出结果，留给下一次运行)"""
+            seq, index, row, body, tried = job
+            tried = tried | {account}
+            with lock:
+                others = [a for a, n in live.items()
+                          if n > 0 and a not in tried and a not in exhausted and not a.paused]
+            if others:
+                failover_q.put((seq, index, row, body, tried))
+
+        def deliver_group(slot, account, job):
+            """
+            合并投递一个组任务，返回 (连接能否继续领取任务, 停止原因)。每个收件人各预约一次发送额度；
+            额度只够前几个收件人时先发这几个，其余转给其它账号 (该账号随即停止)。
+            """
+            seq, _, group, body, tried = job
+            members = group.members
+            if self.hold:
+                members = [(index, row) for index, row in members if not self.hold(index, row)]
+                if not members:
+                    return True, None
+            granted = len(members)
+            if account.limiter:
+                start = time.perf_counter()
+                granted = 0
+                while granted < len(members) and account.limiter.acquire(self._stop):
+                    granted += 1
+                if self.metrics:
+                    self.metrics.observe("throttle", time.perf_counter() - start)
+                if granted < len(members):
+                    if self._stop.is_set():
+                        return False, None
+                    with lock:
+                        exhausted.add(account)
+                    rest = members[granted:]
+                    failover((seq, None, _Group(rest), body, tried) if len(rest) > 1
+                             else (seq, rest[0][0], rest[0][1], body, tried), account)
+                    if not granted:
+                        return False, "exhausted"
+                    members = members[:granted]
+            start = time.perf_counter()
+            outcomes, alive, cooldown, detail = self._deliver_group(slot, [row for _, row in members], body)
+            if self.control:
+                # 发件方被限流算拥塞 (断线 / 421 在重连时、整组 4xx 在 _deliver_group 中已反馈)；
+                # 个别收件人的 4xx 不算，延迟的事务也不计入往返耗时
+                if outcomes is None or cooldown:
+                    self.control.congestion(account, detail)
+                elif any(status != "延迟" for status, _ in outcomes):
+                    self.control.success(account, time.perf_counter() - start)
+            if outcomes is None:
+                # 整组被服务商限流: 暂停该账号，整组换账号重发
+                account.pause(cooldown, detail)
+                failover((seq, None, _Group(members), body, tried) if len(members) > 1
+                         else (seq, members[0][0], members[0][1], body, tried), account)
+                return False, "throttled"
+            for (index, row), (status, text) in zip(members, outcomes):
+                result_q.put((seq, index, make_record(row, status, text, account.email)))
+            if cooldown:
+                # 部分收件人被限流拒收 (已记为 "延迟"): 暂停该账号
+                account.pause(cooldown, detail)
+                return False, "throttled"
+            if account in exhausted:
+                return False, "exhausted"
+            return alive, None if alive else "dead"
+
+        def work(slot):
+            account = self.slots[slot]
+            ended = False
+            reason = None
+            idle_since = time.monotonic()
+            try:
+                while True:
+                    if self.control and not admitted(slot, account):
+                        # 被自适应控制收缩掉的连接: 暂不领取任务，名单派发完后直接退出
+                        if ended or fed.is_set() or self._halted():
+                            break
+                        self._stop.wait(0.2)
+                        continue
+                    try:
+                        job = failover_q.get_nowait()
+                    except queue.Empty:
+                        if ended or self._halted():
+                            break
+                        try:
+                            job = job_q.get(timeout=0.2)
+                        except queue.Empty:
+                            if self.keepalive and time.monotonic() - idle_since >= self.keepalive:
+                                idle_since = time.monotonic()
+                                if not self._keep_warm(slot):
+                                    reason = "dead"
+                                    break
+                            continue
+                        if job is _END:
+                            # 名单已派发完: 处理完其它账号转来的任务再退出
+                            ended = True
+                            continue
+                    if self._halted():
+                        break
+                    idle_since = time.monotonic()
+                    if account.paused or account in exhausted:
+                        failover(job, account)
+                        reason = "throttled" if account.paused else "exhausted"
+                        break
+                    seq, index, row, body, tried = job
+                    if isinstance(row, _Group):
+                        going, reason = deliver_group(slot, account, job)
+                        if not going:
+                            break
+                        continue
+                    if self.hold and self.hold(index, row):
+                        continue
+                    if account.limiter:
+                        start = time.perf_counter()
+                        acquired = account.limiter.acquire(self._stop)
+                        if self.metrics:
+                            self.metrics.observe("throttle", time.perf_counter() - start)
+                        if not acquired:
+                            if self._stop.is_set():
+                                break
+                            # 该账号当日额度用尽: 不再领取新任务，手上这封转给其它账号
+                            with lock:
+                                exhausted.add(account)
+                            failover(job, account)
+                            reason = "exhausted"
+                            break
+                    start = time.perf_counter()
+                    status, detail, alive, cooldown = self._deliver(slot, row, body)
+                    if self.control:
+                        # 发件方被限流算拥塞 (断线 / 421 在重连时、整个事务的 4xx 在 _deliver 中已反馈)；
+                        # 延迟的事务不计入往返耗时
+                        if cooldown:
+                            self.control.congestion(account, detail)
+                        elif status != "延迟":
+                            self.control.success(account, time.perf_counter() - start)
+                    if cooldown:
+                        # 被服务商限流: 暂停该账号，这一封换账号重发
+                        account.pause(cooldown, detail)
+                        failover(job, account)
+                        reason = "throttled"
+                        break
+                    result_q.put((seq, index, make_record(row, status, detail, account.email)))
+                    if not alive:
+                        reason = "dead"
+                        break
+            finally:
+                with lock:
+                    live[account] -= 1
+                    running.discard(slot)
+                    if reason:
+                        exits[reason] += 1
+                    if reason and not sum(live.values()):
+                        # 所有连接都已退出且名单未发完: 按原因停止，未发送的行留给下一次运行
+                        if exits["dead"]:
+                            self.disconnected = True
+                        elif exits["throttled"]:
+                            self.throttled = True
+                        else:
+                            self.exhausted = True
+                result_q.put(_END)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        workers = [threading.Thread(target=work, args=(slot,), daemon=True) for slot in range(len(self.servers))]
+        feeder.start()
+        for t in workers:
+            t.start()
+
+        error = None
+        interrupted = None
+        alive = len(workers)
+        while alive:
+            try:
+                item = result_q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            except KeyboardInterrupt as e:
+                interrupted = e
+                self._stop.set()
+                continue
+            if item is _END:
+                alive -= 1
+            elif isinstance(item, Exception):
+                error = item
+            else:
+                seq, index, record = item
+                self._seq = max(self._seq, seq + 1)
+                if self.metrics:
+                    self.metrics.result(record['发送状态'])
+                if self.on_result:
+                    self.on_result(index, record)
+
+        if interrupted is not None:
+            raise interrupted
+        if error is not None:
+            raise error
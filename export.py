@@ -0,0 +1,136 @@
+"""
+流式导出: 逐行写出 xlsx / csv / jsonl / parquet，不构造 DataFrame，也不在内存中保留整张表
+
+    xlsx     已安装 xlsxwriter 时用它的 constant_memory 模式 (快数倍)，否则用 openpyxl 只写模式
+    csv      UTF-8 BOM (Excel 可直接打开)
+    jsonl    每行一个 JSON 对象 (UTF-8)，可直接作为名单再次读取
+    parquet  需要 pyarrow，每 PARQUET_BATCH 行写出一个行组，所有列存为字符串 (名单各列类型不固定)
+
+dst 可以是文件路径，也可以是文件对象 (此时用 fmt 指定格式，或给文件对象设置 name 属性)。
+网页下载用 temp_export(): 写入临时文件 (超过 SPOOL_MAX 自动落盘)，下载时只有输出文件本身这一份数据。
+"""
+import csv
+import io
+import json
+import tempfile
+
+from sources import source_format
+
+FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+PARQUET_BATCH = 10000
+SPOOL_MAX = 32 * 1024 * 1024
+
+
+def write_rows(dst, columns, rows, fmt=None):
+    """流式写出 dict 行，返回写出的行数"""
+    fmt = fmt or source_format(dst)
+    writer = _WRITERS.get(fmt)
+    if writer is None:
+        raise ValueError(f"不支持写出该格式: {fmt}")
+    return writer(dst, list(columns), rows)
+
+
+def temp_export(columns, rows, fmt):
+    """导出到临时文件，返回已回到开头的文件对象 (关闭即删除)"""
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX, suffix=f".{fmt}")
+    write_rows(f, columns, rows, fmt)
+    f.seek(0)
+    return f
+
+
+def _write_csv(dst, columns, rows):
+    f = open(dst, "w", encoding="utf-8-sig", newline="") if isinstance(dst, str) \
+        else io.TextIOWrapper(dst, encoding="utf-8-sig", newline="")
+    count = 0
+    try:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(["" if row.get(c) is None else row.get(c) for c in columns])
+            count += 1
+    finally:
+        if isinstance(dst, str):
+            f.close()
+        else:
+            f.flush()
+            f.detach()
+    return count
+
+
+def _write_jsonl(dst, columns, rows):
+    f = open(dst, "w", encoding="utf-8", newline="\n") if isinstance(dst, str) \
+        else io.TextIOWrapper(dst, encoding="utf-8", newline="\n")
+    count = 0
+    try:
+        for row in rows:
+            # 日期等非 JSON 类型按字符串写出
+            f.write(json.dumps({c: row.get(c) for c in columns}, ensure_ascii=False, default=str) + "\n")
+            count += 1
+    finally:
+        if isinstance(dst, str):
+            f.close()
+        else:
+            f.flush()
+            f.detach()
+    return count
+
+
+def _write_xlsx(dst, columns, rows):
+    try:
+        import xlsxwriter
+    except ImportError:
+        return _write_xlsx_openpyxl(dst, columns, rows)
+    # 不做字符串到公式 / 链接 / 数字的自动转换，原样写出
+    wb = xlsxwriter.Workbook(dst, {"constant_memory": True, "strings_to_formulas": False,
+                                   "strings_to_urls": False, "strings_to_numbers": False})
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, columns)
+    count = 0
+    for count, row in enumerate(rows, 1):
+        ws.write_row(count, 0, [row.get(c) for c in columns])
+    wb.close()
+    return count
+
+
+def _write_xlsx_openpyxl(dst, columns, rows):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(columns)
+    count = 0
+    for row in rows:
+        ws.append([row.get(c) for c in columns])
+        count += 1
+    wb.save(dst)
+    return count
+
+
+def _write_parquet(dst, columns, rows):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("导出 Parquet 需要安装 pyarrow: pip install pyarrow")
+    schema = pa.schema([(c, pa.string()) for c in columns])
+    count = 0
+    with pq.ParquetWriter(dst, schema) as writer:
+        batch = {c: [] for c in columns}
+        for row in rows:
+            for c in columns:
+                value = row.get(c)
+                batch[c].append(None if value is None else str(value))
+            count += 1
+            if count % PARQUET_BATCH == 0:
+                writer.write_table(pa.table(batch, schema=schema))
+                batch = {c: [] for c in columns}
+        if count % PARQUET_BATCH or not count:
+            writer.write_table(pa.table(batch, schema=schema))
+    return count
+
+
+_WRITERS = {"xlsx": _write_xlsx, "csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
@@ -0,0 +1,349 @@
+"""
+后台发送任务: 网页端的投递在独立线程中运行，页面刷新或控件交互不会中断发送
+
+JobManager 由 app.py 通过 st.cache_resource 在进程内共享，多个会话 / 多份名单可以同时发送；
+页面只轮询 SendJob.status() 展示进度。同一发件账号的任务共用一个 RateLimiter 与自适应控制窗口，
+并发任务不会突破速率上限；各任务的运行指标写入各自的文件 (带任务编号)。
+"""
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+import config
+from builder import UNDISCLOSED_RECIPIENTS, MessageBuilder
+from checkpoint import Checkpoint
+from engine import KEEPALIVE, SendEngine, open_smtp
+from journal import JOURNAL_FILE, open_journal
+from metrics import METRICS_DIR, Metrics, MetricsWriter
+from control import AIMDController
+from ratelimit import RateLimiter
+from retries import RetryQueue, campaign_key
+from results import ResultTable
+from sources import chunked
+from suppression import KINDS, SUPPRESSION_DIR, Suppression, open_suppression
+from templating import get_recipient, is_missing
+from validation import Preflight
+
+RUNNING, DONE, STOPPED, FAILED = "运行中", "已完成", "已停止", "失败"
+MAX_ERRORS = 20
+MAX_FINISHED = 20
+
+
+class SendJob:
+    """
+    一次投递任务 (一份名单的一批)。
+
+    snapshot / progress_path / digest: 名单快照与断点文件 (与页面上的断点检查共用)
+    sender:   (发件人名称, 发件邮箱, 应用专用密码)
+    settings: batch_limit / pool_size / suppress_sent
+    limiter / control: 同一发件账号的任务共用的 RateLimiter 与 control.AIMDController (可为 None)
+    on_finish: 任务结束 (无论成败) 后调用 on_finish(job)
+    """
+
+    def __init__(self, name, snapshot, progress_path, digest, template, subject, sender, settings, limiter,
+                 control=None, on_finish=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.snapshot = snapshot
+        self.progress_path = progress_path
+        self.digest = digest
+        self.template = template
+        self.subject = subject
+        self.sender_name, self.sender_email, self.password = sender
+        self.settings = settings
+        self.limiter = limiter
+        self.control = control
+        self.on_finish = on_finish
+        self.metrics_path = None
+        self.state = RUNNING
+        self.message = "正在连接..."
+        self.total = 0
+        self.done = 0
+        self.counts = {}
+        self.errors = deque(maxlen=MAX_ERRORS)
+        self.last = ""
+        self.results = None
+        self.remaining = None
+        self.summary = None
+        self.started = time.time()
+        self.finished = None
+        self.engine = None
+        self.builder = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"send-job-{self.id}", daemon=True)
+
+    @property
+    def active(self):
+        return self.state == RUNNING
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止领取新任务，已在发送的几封发完后结束 (进度照常保存)"""
+        self._stop.set()
+        if self.engine:
+            self.engine.stop()
+
+    def status(self):
+        """供页面轮询的状态快照"""
+        with self._lock:
+            elapsed = (self.finished or time.time()) - self.started
+            return {
+                "id": self.id,
+                "name": self.name,
+                "state": self.state,
+                "message": self.message,
+                "total": self.total,
+                "done": self.done,
+                "counts": dict(self.counts),
+                "rate": self.counts.get("成功", 0) / elapsed * 60 if elapsed > 0 else 0.0,
+                "elapsed": elapsed,
+                "last": self.last,
+                "errors": list(self.errors),
+                "remaining": self.remaining,
+            }
+
+    def _on_result(self, record):
+        status = record['发送状态']
+        with self._lock:
+            self.done += 1
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self.last = record.get('账号', record.get('姓名', get_recipient(record) or '未知'))
+            if status in ("失败", "延迟"):
+                self.errors.append(f"{get_recipient(record)}: {status} {record.get('详情')}")
+
+    def _deliver(self, server, row, body):
+        recipient = get_recipient(row)
+        if not recipient or is_missing(recipient):
+            return False, "缺少邮箱地址"
+        recipient = str(recipient).strip()
+        try:
+            data = self.builder.build(row, recipient, body, (self.sender_name, self.sender_email))
+        except Exception as e:
+            return False, str(e)
+        server.sendmail(self.sender_email, recipient, data)
+        return True, "OK"
+
+    def _deliver_group(self, server, rows, body):
+        data = self.builder.build(rows[0], UNDISCLOSED_RECIPIENTS, body, (self.sender_name, self.sender_email))
+        return server.sendmail(self.sender_email, [str(get_recipient(row)).strip() for row in rows], data)
+
+    def _group_key(self, row, body):
+        recipient = get_recipient(row)
+        if not recipient or is_missing(recipient):
+            return None
+        return self.builder.body_key(row, body)
+
+    def _run(self):
+        try:
+            self._send()
+        except Exception as e:
+            with self._lock:
+                self.state = FAILED
+                self.message = f"任务异常: {e}"
+        finally:
+            self.finished = time.time()
+            if self.on_finish:
+                self.on_finish(self)
+
+    def _send(self):
+        # 附件 / HTML 模板按 config.py 设置，只编码一次供整个任务复用
+        self.builder = MessageBuilder.from_config(config, subject=self.subject)
+        preflight = Preflight.for_snapshot(self.snapshot)
+        every = getattr(config, 'CHECKPOINT_EVERY', 20)
+        checkpoint = Checkpoint.load(self.progress_path, self.digest, every=every) \
+            or Checkpoint(self.progress_path, self.digest, every=every)
+        journal = open_journal(getattr(config, 'JOURNAL_FILE', JOURNAL_FILE))
+        checkpoint.journal = journal
+        retries = RetryQueue.from_config(journal, config)
+        suppression = open_suppression(
+            getattr(config, 'SUPPRESSION_DIR', SUPPRESSION_DIR),
+            KINDS if self.settings["suppress_sent"] else ("bounce", "unsubscribe"),
+            journal,
+        )
+        checkpoint.suppression = suppression
+        metrics = Metrics(profile_rate=getattr(config, 'PROFILE_SAMPLE_RATE', 0), job=self.id)
+        metrics_writer = MetricsWriter(metrics, getattr(config, 'METRICS_DIR', METRICS_DIR))
+        self.metrics_path = metrics_writer.prometheus_path
+        try:
+            # 到期的重试 (临时失败的邮件) 优先发送，并计入本批数量；
+            # 只取报文相同 (模板 / 主题 / 附件) 且由本任务的发件账号登记的重试
+            batch_limit = self.settings["batch_limit"]
+            message_key = campaign_key(self.template, self.builder)
+            due = retries.due(batch_limit or None, campaign=message_key, senders=[self.sender_email])
+            pending = len(self.snapshot) - len(checkpoint)
+            room = batch_limit - len(due) if batch_limit > 0 else pending
+            batch_size = min(room, pending)
+            chunks = chunked(self.snapshot.iter_records(checkpoint.cursor, skip=checkpoint), limit=batch_size)
+            self.total = len(due) + batch_size
+
+            # 本次结果按行号记入列式数组，下载报表时再与快照拼接
+            self.results = results = ResultTable(len(self.snapshot))
+
+            def on_result(index, record):
+                # 单账号连接的记录不带发件账号: 补上，之后按账号恢复限速额度时据此区分
+                record.setdefault('发件账号', self.sender_email)
+                with metrics.phase("persist"):
+                    if index is not None and record['发送状态'] == "延迟":
+                        retries.push(record, self.template.render(record), message_key, self.sender_email)
+                    if record['发送状态'] == "成功":
+                        suppression.add("sent", get_recipient(record))
+                    checkpoint.record(index, record)
+                results.add(index, record)
+                metrics_writer.tick()
+                self._on_result(record)
+
+            def on_retry(retry_id, record):
+                on_result(None, retries.resolve(retry_id, record))
+
+            self.engine = engine = SendEngine(
+                connect=lambda: open_smtp(config.SMTP_SERVER, config.SMTP_PORT, self.sender_email, self.password,
+                                          security=getattr(config, 'SMTP_SECURITY', None)),
+                send=self._deliver,
+                pool_size=self.settings["pool_size"],
+                limiter=self.limiter,
+                screen=lambda index, row: suppression.check(get_recipient(row)),
+                metrics=metrics,
+                send_group=self._deliver_group,
+                group_key=self._group_key,
+                group_size=getattr(config, 'GROUP_RECIPIENTS', 0),
+                control=self.control,
+                keepalive=getattr(config, 'SMTP_KEEPALIVE', KEEPALIVE),
+            )
+            try:
+                engine.open()
+            except Exception as e:
+                with self._lock:
+                    self.state = FAILED
+                    self.message = f"连接失败: {e}"
+                return
+            if self._stop.is_set():
+                engine.stop()
+            self.message = "正在投递..."
+            try:
+                if due:
+                    engine.on_result = on_retry
+                    engine.run(due)
+                engine.on_result = on_result
+                engine.screen = lambda index, row: preflight.verdict(index) or suppression.check(get_recipient(row))
+                if not self._stop.is_set():
+                    engine.run(self.template.iter_render_chunks(metrics.timed(chunks, "read"), metrics))
+            finally:
+                engine.close()
+
+            with metrics.phase("persist"):
+                checkpoint.flush()
+            remaining = len(self.snapshot) - len(checkpoint)
+            if not remaining:
+                # 快照留给发送报告使用，任务从列表中移除时再清理
+                checkpoint.clear()
+            if results:
+                metrics_writer.finish()
+                self.summary = metrics.summary()
+            with self._lock:
+                self.remaining = remaining
+                if engine.exhausted:
+                    self.message = "已达到每日发送上限，未发送的记录已计入剩余名单。"
+                elif engine.disconnected:
+                    self.message = "连接中断且多次重连失败，未发送的记录已计入剩余名单。"
+                elif engine.throttled:
+                    self.message = "发件账号被服务商限流，未发送的记录已计入剩余名单，请稍后再发。"
+                elif self._stop.is_set():
+                    self.message = "任务已手动停止，进度已保存。"
+                else:
+                    self.message = "任务完成。"
+                self.state = STOPPED if self._stop.is_set() else DONE
+        finally:
+            # 同一进程中可能还有其它任务在追加屏蔽日志，合并由 JobManager 在所有任务结束后进行
+            suppression.close(compact=False)
+            journal.close()
+
+    def report_rows(self):
+        """本次发送报告的记录 (结果与快照按行号拼接，逐条产出)，任务结束后调用"""
+        return self.results.iter_records(self.snapshot)
+
+    def remaining_rows(self):
+        """未处理的名单行 (用于下载剩余名单)，任务结束后调用"""
+        checkpoint = Checkpoint.load(self.progress_path, self.digest)
+        if checkpoint is None:
+            return iter(())
+        return (row for _, row in self.snapshot.iter_records(checkpoint.cursor, skip=checkpoint))
+
+
+class JobManager:
+    """进程内的任务表 (线程安全)"""
+
+    def __init__(self):
+        self.jobs = {}
+        self._limiters = {}
+        # 窗口按限速器划分，所有任务共用一个控制器: 同一发件账号的并发任务共用一个窗口
+        self.control = AIMDController.from_config(config)
+        self._lock = threading.Lock()
+
+    def limiter_for(self, sender_email, rates):
+        """同一发件账号共用一个限速器；没有运行中的任务时才按新设置重建"""
+        key = sender_email.strip().lower()
+        with self._lock:
+            current = self._limiters.get(key)
+            busy = any(job.active and job.sender_email.strip().lower() == key for job in self.jobs.values())
+            if current is not None and (busy or current[0] == rates):
+                return current[1]
+            with open_journal(getattr(config, 'JOURNAL_FILE', JOURNAL_FILE)) as journal:
+                recent = journal.recent_send_times(sender=sender_email.strip())
+            limiter = RateLimiter.from_config(config, recent_sends=recent, **rates)
+            self._limiters[key] = (rates, limiter)
+            return limiter
+
+    def find_active(self, digest):
+        with self._lock:
+            return self._find_active(digest)
+
+    def _find_active(self, digest):
+        return next((job for job in self.jobs.values() if job.active and job.digest == digest), None)
+
+    def submit(self, **kwargs):
+        """创建并启动任务；同一份名单已有运行中的任务时返回 None"""
+        kwargs.setdefault("control", self.control)
+        kwargs.setdefault("on_finish", self._finished)
+        with self._lock:
+            # 检查与登记在同一把锁内: 两个会话同时提交同一份名单时只会启动一个任务
+            if self._find_active(kwargs["digest"]):
+                return None
+            job = SendJob(**kwargs)
+            self.jobs[job.id] = job
+            # 只保留最近的已结束任务
+            finished = [j for j in self.jobs.values() if not j.active]
+            for old in itertools.islice(sorted(finished, key=lambda j: j.started), max(0, len(finished) - MAX_FINISHED)):
+                del self.jobs[old.id]
+                if old.metrics_path:
+                    try:
+                        os.remove(old.metrics_path)
+                    except OSError:
+                        pass
+                # 已发完的名单不再需要快照 (同一名单还有其它任务时保留)
+                if old.remaining == 0 and not any(j.digest == old.digest for j in self.jobs.values()):
+                    old.snapshot.remove()
+        return job.start()
+
+    def _finished(self, job):
+        """任务结束: 没有其它运行中的任务时才合并屏蔽索引 (合并会改写其它任务正在追加的日志)"""
+        with self._lock:
+            if any(j.active for j in self.jobs.values() if j is not job):
+                return
+            # 重新打开以读入各任务追加的全部日志，超过阈值时再合并
+            Suppression(getattr(config, 'SUPPRESSION_DIR', SUPPRESSION_DIR)).close()
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        """按启动时间倒序"""
+        with self._lock:
+            return sorted(self.jobs.values(), key=lambda j: j.started, reverse=True)
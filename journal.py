@@ -0,0 +1,187 @@
+"""
+发送日志: 只追加的 SQLite 记录，替代每次整表重写 sent_history.xlsx
+
+每批追加只写入新记录 (一次事务)，耗时与历史总量无关；
+Excel / CSV 报表按需导出:
+    python journal.py export sent_history.xlsx
+    python journal.py export history.csv --since "2026-01-01"
+    python journal.py import sent_history.xlsx   # 导入旧版历史文件
+"""
+import json
+import math
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+JOURNAL_FILE = "sent_journal.db"
+LEGACY_HISTORY_FILE = "sent_history.xlsx"
+STATUS_FIELDS = ('发送状态', '详情', '发送时间', '发件账号')
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    sent_at TEXT,
+    status TEXT,
+    detail TEXT,
+    recipient TEXT,
+    data TEXT,
+    sender TEXT
+);
+CREATE INDEX IF NOT EXISTS sends_ts ON sends (ts);
+"""
+
+
+def _jsonable(val):
+    if val is None or isinstance(val, (str, bool, int)):
+        return val
+    if isinstance(val, float):
+        return None if math.isnan(val) else val
+    try:
+        if val != val:  # NaT / NA
+            return None
+    except TypeError:
+        return None
+    return str(val)
+
+
+def _recipient(record):
+    val = record.get('邮箱') or record.get('Email') or record.get('email')
+    return str(val).strip() if _jsonable(val) else None
+
+
+class Journal:
+    """只追加的发送日志"""
+
+    def __init__(self, path=JOURNAL_FILE, wal=True):
+        """wal=False: 数据库放在网络共享目录、被多台机器同时打开时使用 (WAL 只能在同一台机器的进程间共享)"""
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL" if wal else "PRAGMA journal_mode=DELETE")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sends)")}
+        if "sender" not in columns:
+            # 旧版日志没有发件账号列
+            self.conn.execute("ALTER TABLE sends ADD COLUMN sender TEXT")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM sends").fetchone()[0]
+
+    def append(self, records):
+        """追加一批记录 (与 processed_records 结构一致)，一次事务提交"""
+        rows = []
+        for record in records:
+            sent_at = record.get('发送时间') or datetime.now().strftime(TIME_FORMAT)
+            try:
+                ts = datetime.strptime(str(sent_at), TIME_FORMAT).timestamp()
+            except ValueError:
+                ts = time.time()
+            data = {k: _jsonable(v) for k, v in record.items() if k not in STATUS_FIELDS}
+            rows.append((ts, str(sent_at), record.get('发送状态'), _jsonable(record.get('详情')),
+                         _recipient(record), json.dumps(data, ensure_ascii=False), _jsonable(record.get('发件账号'))))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO sends (ts, sent_at, status, detail, recipient, data, sender) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def iter_records(self, since=None):
+        """按写入顺序逐条产出记录 dict (原行数据 + 发送状态/详情/发送时间)"""
+        sql = "SELECT sent_at, status, detail, data, sender FROM sends"
+        args = ()
+        if since is not None:
+            sql += " WHERE ts >= ?"
+            args = (since,)
+        for sent_at, status, detail, data, sender in self.conn.execute(sql + " ORDER BY id", args):
+            record = json.loads(data) if data else {}
+            record['发送状态'] = status
+            record['详情'] = detail
+            record['发送时间'] = sent_at
+            if sender:
+                record['发件账号'] = sender
+            yield record
+
+    def recent_send_times(self, seconds=86400, sender=None):
+        """
+        最近一段时间内成功发送的时间戳，供 RateLimiter 累计每日额度。
+        指定 sender 时只统计该发件账号 (未记录账号的旧记录也计入，宁可少发不超额)。
+        """
+        cutoff = time.time() - seconds
+        if sender is None:
+            return [ts for (ts,) in self.conn.execute(
+                "SELECT ts FROM sends WHERE status = '成功' AND ts > ? ORDER BY ts", (cutoff,))]
+        return [ts for (ts,) in self.conn.execute(
+            "SELECT ts FROM sends WHERE status = '成功' AND ts > ? AND (sender = ? OR sender IS NULL) ORDER BY ts",
+            (cutoff, sender))]
+
+    def columns(self, since=None):
+        """记录中出现过的全部列 (按首次出现的顺序)，用作导出表头"""
+        seen = {}
+        for record in self.iter_records(since):
+            seen.update(dict.fromkeys(record))
+        return list(seen)
+
+    def export(self, path, since=None, fmt=None):
+        """流式导出报表 (.xlsx / .csv / .parquet，path 也可以是文件对象)，返回导出的记录数"""
+        from export import write_rows
+        return write_rows(path, self.columns(since), self.iter_records(since), fmt)
+
+    def import_excel(self, path):
+        """导入旧版 sent_history.xlsx，返回导入的记录数"""
+        import pandas as pd
+        df = pd.read_excel(path)
+        if '发送时间' in df.columns:
+            df['发送时间'] = df['发送时间'].astype(str)
+        return self.append(df.to_dict('records'))
+
+
+def open_journal(path=JOURNAL_FILE, legacy_path=LEGACY_HISTORY_FILE, wal=True):
+    """打开日志；首次创建时自动导入旧版 Excel 历史"""
+    fresh = not os.path.exists(path)
+    journal = Journal(path, wal)
+    if fresh and legacy_path and os.path.exists(legacy_path):
+        count = journal.import_excel(legacy_path)
+        print(f"✅ 已从 '{legacy_path}' 导入 {count} 条历史记录至 '{path}'")
+    return journal
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="发送日志工具")
+    parser.add_argument("--db", default=JOURNAL_FILE, help="日志文件路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="导出报表 (.xlsx / .csv / .parquet)")
+    p_export.add_argument("path", nargs="?", default=LEGACY_HISTORY_FILE)
+    p_export.add_argument("--since", help="只导出此时间之后的记录，如 2026-01-01")
+    p_import = sub.add_parser("import", help="导入旧版 Excel 历史")
+    p_import.add_argument("path", nargs="?", default=LEGACY_HISTORY_FILE)
+    sub.add_parser("stats", help="统计记录数")
+    args = parser.parse_args()
+
+    with Journal(args.db) as journal:
+        if args.command == "export":
+            since = datetime.fromisoformat(args.since).timestamp() if args.since else None
+            count = journal.export(args.path, since)
+            print(f"✅ 已导出 {count} 条记录至 '{args.path}'")
+        elif args.command == "import":
+            count = journal.import_excel(args.path)
+            print(f"✅ 已导入 {count} 条记录")
+        else:
+            print(f"共 {len(journal)} 条记录")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,212 +1,529 @@
 import os
-import glob
-import time
-import smtplib
-import pandas as pd
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.utils import formataddr
-from tqdm import tqdm
+import sys
 import config
-from datetime import datetime
+from templating import Template, get_recipient, is_missing
 
-def find_excel_file():
-    """锁定查找 main.xlsx 文件"""
-    target_file = "main.xlsx"
+# 其余模块只在用到的路径中导入 (引擎 / smtplib / ssl、sqlite3 日志库、账号、分片、报文目录等)，
+# --help 不必为它们付出启动时间；逐封调用的函数只依赖 templating (仅用到 re)
+
+SOURCE_FILE = "main.xlsx"
+
+def find_excel_file(source=None):
+    """锁定查找数据源文件 (默认 main.xlsx，也可以是 .csv / .jsonl / .parquet)"""
+    target_file = source or getattr(config, 'SOURCE_FILE', SOURCE_FILE)
     
     if not os.path.exists(target_file):
         print(f"❌ 错误: 未找到数据源文件 '{target_file}'。")
-        print("👉 请确保Excel文件名为 main.xlsx 并放入此文件夹。")
+        print(f"👉 请确保名单文件名为 {target_file} 并放入此文件夹 (或用 --source 指定)。")
         return None
     
     print(f"✅ 锁定数据源: {target_file}")
     return target_file
 
+class QuietProgress:
+    """非终端 (定时任务) 下代替 tqdm 的空进度条，省去加载 tqdm 的时间"""
+
+    def update(self, n=1):
+        pass
+
+    def close(self):
+        pass
+
+def progress_bar(total):
+    if not sys.stderr.isatty():
+        return QuietProgress()
+    from tqdm import tqdm
+    return tqdm(total=total, unit="封")
+
 def load_template():
-    """读取模板并分析需要的列名"""
+    """读取模板并预编译 (只解析一次)"""
     try:
         with open("template.txt", "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        import re
-        placeholders = set(re.findall(r'\{(.*?)\}', content))
-        print(f"✅ 读取模板成功，检测到变量: {placeholders}")
-        return content, placeholders
+            template = Template(f.read())
+        print(f"✅ 读取模板成功，检测到变量: {template.placeholders}")
+        return template
     except FileNotFoundError:
         print("❌ 错误: 未找到 template.txt 邮件模板。")
-        return None, None
-
-def smart_str(val):
-    """智能转换字符串，处理 123.0 这种情况"""
-    if pd.isna(val):
-        return ""
-    if isinstance(val, float):
-        # 如果是整数浮点数 (如 123.0)，转为整数
-        if val.is_integer():
-            return str(int(val))
-    return str(val).strip()
-
-def send_email(server, row, template_content, placeholders):
-    """发送单封邮件"""
+        return None
+
+_builder = None
+
+def load_builder():
+    """按配置构造报文生成器: 主题 / HTML 模板 / 附件只编码一次，之后每封直接复用"""
+    global _builder
+    from builder import MessageBuilder
     try:
-        msg_body = template_content
-        for key in placeholders:
-            val = row.get(key)
-            # 使用智能转换
-            msg_body = msg_body.replace(f"{{{key}}}", smart_str(val))
-            
-        msg = MIMEMultipart()
-        msg['From'] = formataddr((config.SENDER_NAME, config.SENDER_EMAIL))
-        
-        recipient = row.get('邮箱') or row.get('Email') or row.get('email')
-        if not recipient or pd.isna(recipient):
-            return False, "无有效邮箱地址"
-            
-        msg['To'] = str(recipient).strip()
-        # 从配置读取主题
-        msg['Subject'] = getattr(config, 'EMAIL_SUBJECT', "账户通知")
-        
-        msg.attach(MIMEText(msg_body, 'plain', 'utf-8'))
-        
-        server.sendmail(config.SENDER_EMAIL, msg['To'], msg.as_string())
-        return True, "发送成功"
-        
+        _builder = MessageBuilder.from_config(config)
+    except OSError as e:
+        print(f"❌ 读取 HTML 模板或附件失败: {e}")
+        return None
+    if _builder.html:
+        print(f"✅ 读取 HTML 模板成功，检测到变量: {_builder.placeholders}")
+    if _builder.attachments:
+        size = sum(len(part) for part in _builder.attachments)
+        print(f"📎 已编码 {len(_builder.attachments)} 个附件 ({size / 1024:.0f} KB)，每封邮件直接复用")
+    return _builder
+
+def send_email(server, row, msg_body):
+    """发送单封邮件 (正文已由模板批量渲染)；SMTP 异常交给发送引擎处理 (重连 / 重试)"""
+    recipient = get_recipient(row)
+    if not recipient or is_missing(recipient):
+        return False, "无有效邮箱地址"
+    recipient = str(recipient).strip()
+    # 多账号时连接带有所属账号 (发件人名称, 邮箱)
+    sender = getattr(server, 'sender', (config.SENDER_NAME, config.SENDER_EMAIL))
+    try:
+        data = (_builder or load_builder()).build(row, recipient, msg_body, sender)
     except Exception as e:
         return False, str(e)
 
-def update_history_and_source(source_path, processed_records, remaining_df):
-    """关键功能：将处理过的记录移入历史文件，并更新源文件"""
+    server.sendmail(sender[1], recipient, data)
+    return True, "发送成功"
+
+def send_group(server, rows, msg_body):
+    """
+    合并投递正文相同的多行: 一个报文、一次 SMTP 事务、每行一个 RCPT TO (To 头不列出收件人)。
+    返回被拒收的 {地址: (应答码, 信息)}，全部被拒时抛出 SMTPRecipientsRefused，由发送引擎逐行记录
+    """
+    from builder import UNDISCLOSED_RECIPIENTS
+    sender = getattr(server, 'sender', (config.SENDER_NAME, config.SENDER_EMAIL))
+    data = (_builder or load_builder()).build(rows[0], UNDISCLOSED_RECIPIENTS, msg_body, sender)
+    return server.sendmail(sender[1], [str(get_recipient(row)).strip() for row in rows], data)
+
+def group_key(row, msg_body):
+    """合并投递的分组依据: 正文摘要；缺少收件人的行不合并 (由 send_email 记为失败)"""
+    recipient = get_recipient(row)
+    if not recipient or is_missing(recipient):
+        return None
+    return (_builder or load_builder()).body_key(row, msg_body)
+
+def send_spooled(server, row, path):
+    """发送预构建的报文 (spool 模式): 只补上 From 头，不再渲染 / 构造 MIME"""
+    from spool import from_header
+    if path is None:
+        return False, "无有效邮箱地址"
+    sender_name, sender_email = getattr(server, 'sender', (config.SENDER_NAME, config.SENDER_EMAIL))
+    with open(path, "rb") as f:
+        data = f.read()
+    server.sendmail(sender_email, str(get_recipient(row)).strip(), from_header(sender_name, sender_email) + data)
+    return True, "发送成功"
+
+def archive_progress(results, checkpoint):
+    """关键功能：将处理过的记录追加到发送日志，并保存发送进度 (源文件保持不变)"""
     print("\n💾 正在保存数据...")
     
-    # 1. 追加到历史文件 (带重试)
-    history_file = "sent_history.xlsx"
-    new_records_df = pd.DataFrame(processed_records)
-    
-    while True:
-        try:
-            if os.path.exists(history_file):
-                old_history = pd.read_excel(history_file)
-                # 确保列一致
-                combined = pd.concat([old_history, new_records_df], ignore_index=True)
-                combined.to_excel(history_file, index=False)
-            else:
-                new_records_df.to_excel(history_file, index=False)
-            print(f"✅ 已归档 {len(processed_records)} 条记录至 '{history_file}'")
-            break # 成功则跳出循环
-        except PermissionError:
-            print(f"\n⚠️ 无法写入 '{history_file}'。文件可能被打开了。")
-            input("👉 请关闭 Excel 文件，然后按回车键重试...")
-        except Exception as e:
-            print(f"❌ 归档失败 (数据未丢失，仍在内存中): {e}")
-            return # 其他错误直接放弃，不敢动源文件
+    # 发送过程中已分批写入，这里只落盘最后不足一批的记录
+    try:
+        checkpoint.flush()
+        skipped = results.counts["跳过"]
+        if skipped:
+            print(f"⏭️ 跳过 {skipped} 个已发送过 / 退信 / 退订 / 重复的地址")
+        print(f"✅ 已归档 {len(results)} 条记录至 '{checkpoint.journal.path}' (导出报表: python journal.py export)")
+    except Exception as e:
+        print(f"❌ 归档失败 (数据未丢失，仍在内存中): {e}")
 
-    # 2. 更新源文件 (带重试)
+def compact_source(source_path, snapshot, checkpoint, output_path=None):
+    """按需导出剩余名单: 默认覆盖源文件，随后发送进度与快照一并作废"""
+    from export import write_rows
+    output_path = output_path or source_path
+    remaining = (row for _, row in snapshot.iter_records(checkpoint.cursor, skip=checkpoint))
     while True:
         try:
-            # 显式保留表头 header=True
-            remaining_df.to_excel(source_path, index=False, header=True)
-            
-            if remaining_df.empty:
-                print(f"✅ 源文件 '{source_path}' 已清空 (任务完成，仅保留表头)")
-            else:
-                print(f"✅ 源文件 '{source_path}' 已更新，剩余 {len(remaining_df)} 待发 (表头已保留)")
+            count = write_rows(output_path, snapshot.columns, remaining)
             break
         except PermissionError:
-            print(f"\n⚠️ 无法写入源文件 '{source_path}'。文件可能被打开了。")
+            print(f"\n⚠️ 无法写入 '{output_path}'。文件可能被打开了。")
             input("👉 请关闭 Excel 文件，然后按回车键重试...")
-        except Exception as e:
-            print(f"❌ 更新源文件失败: {e}")
-            break
+            remaining = (row for _, row in snapshot.iter_records(checkpoint.cursor, skip=checkpoint))
+    print(f"✅ 剩余 {count} 条已写入 '{output_path}' (表头已保留)")
+    if os.path.abspath(output_path) == os.path.abspath(source_path):
+        checkpoint.clear()
+        snapshot.remove()
+
+def is_sharded(source_path, journal_path):
+    """该名单在发送日志库中是否已有分片记录 (由 --shard / shards.py work 建立)"""
+    if not os.path.exists(journal_path):
+        return False
+    from shards import ShardBoard, list_digest
+    with ShardBoard(journal_path) as board:
+        # 没有任何分片时不必计算名单摘要 (需要读一遍整个文件)
+        return any(board.status()) and any(board.status(list_digest(source_path)))
+
+def release_shard(lease):
+    """停止续约并释放分片与发件账号"""
+    if lease is not None:
+        lease.release()
+        lease.board.close()
 
-def main():
+def main(compact=False, compact_output=None, dry_run=False, source=None, shard=False, schedule=None):
+    from datetime import datetime
+    from accounts import load_accounts, save_paused, sender_emails
+    from checkpoint import Checkpoint, checkpoint_path, file_fingerprint
+    from control import AIMDController
+    from engine import KEEPALIVE, SendEngine
+    from journal import JOURNAL_FILE, open_journal
+    from metrics import METRICS_DIR, Metrics, MetricsWriter
+    from results import ResultTable
+    from retries import RetryQueue, campaign_key
+    from snapshot import Snapshot, SnapshotBuilder
+    from sources import chunked, read_columns
+    from spool import SPOOL_DIR, Spool
+    from suppression import KINDS, SUPPRESSION_DIR, open_suppression
+    from validation import Preflight, row_checker
     print("--- 🚀 Smart Mail Drop (自动归档版) ---")
     
     # 1. 资源准备
-    excel_path = find_excel_file()
+    excel_path = find_excel_file(source)
     if not excel_path: return
+
+    fingerprint = file_fingerprint(excel_path)
+    checkpoint = Checkpoint.load(checkpoint_path(excel_path), fingerprint,
+                                 every=getattr(config, 'CHECKPOINT_EVERY', 20))
+    if not checkpoint and os.path.exists(checkpoint_path(excel_path)):
+        # 有进度却对不上指纹: 源文件在发送中途被改动过，行号已不可信，继续会重复发送
+        print(f"⚠️ '{excel_path}' 在发送过程中被修改，已有的发送进度无法对应。")
+        print(f"👉 请恢复原文件后继续；或确认后删除 '{checkpoint_path(excel_path)}' 重新开始。")
+        return
+    if not checkpoint:
+        checkpoint = Checkpoint(checkpoint_path(excel_path), fingerprint,
+                                every=getattr(config, 'CHECKPOINT_EVERY', 20))
+
+    if not shard and is_sharded(excel_path, getattr(config, 'JOURNAL_FILE', JOURNAL_FILE)):
+        # 分片发送的进度记在分片表中，进度文件不含这些行: 在这里发送或导出会重复已由分片发出的邮件
+        print("⚠️ 该名单已按分片发送 (查看进度: python shards.py status)")
+        print("👉 请用 python main.py --shard 或 python shards.py work 继续；"
+              "确认不再分片发送时先运行 python shards.py reset")
+        return
+
+    # 源文件只读不改: 首次运行建立快照，之后按进度文件中的游标直接定位。
+    # 首次发送一份新名单 (没有快照也没有进度) 时边转换快照边发送本批，第一封不必等整个文件解析完
+    snapshot = Snapshot.load(excel_path, fingerprint)
+    streaming = snapshot is None and not (compact or shard or dry_run or schedule is not None or len(checkpoint)
+                                          or getattr(config, 'SPOOL_WORKERS', 0))
+    try:
+        if streaming:
+            columns = read_columns(excel_path)
+        else:
+            snapshot = snapshot or Snapshot.build(excel_path, excel_path, fingerprint)
+            columns = snapshot.columns
+    except Exception as e:
+        print(f"❌ 读取名单失败: {e}")
+        return
+    if compact:
+        compact_source(excel_path, snapshot, checkpoint, compact_output)
+        return
     
-    template_content, placeholders = load_template()
-    if not template_content: return
+    template = load_template()
+    if not template: return
     
-    try:
-        df = pd.read_excel(excel_path)
-        if df.empty:
-            print("🎉 列表为空，所有任务已完成！")
+    total = None if streaming else len(snapshot)  # 边读边发时行数要等转换完才知道
+    if total == 0:
+        print("🎉 列表为空，所有任务已完成！")
+        return
+        
+    builder = load_builder()
+    if not builder: return
+
+    # 检查列
+    missing_cols = template.missing_columns(columns) + \
+        [p for p in builder.placeholders if p not in columns and p not in template.placeholders]
+    if missing_cols:
+        print(f"❌ 名单缺少模板中对应的列: {missing_cols}")
+        return
+
+    if streaming:
+        # 边读边发: 本批的地址在派发前逐行检查 (名单内重复由屏蔽索引按本次已出现的地址拦截)，整份名单的预检在下次运行时进行
+        preflight = None
+        check_row = row_checker(columns)
+        print("🔍 首次发送这份名单: 边解析边发送，地址在发送前逐行检查")
+    else:
+        # 发送前预检整份名单的地址 (结果随快照缓存)，无效 / 重复的行不会占用发送额度
+        preflight = Preflight.for_snapshot(snapshot)
+        print(f"🔍 地址预检: {preflight.describe()}")
+
+    journal = open_journal(getattr(config, 'JOURNAL_FILE', JOURNAL_FILE), wal=getattr(config, 'JOURNAL_WAL', True))
+    lease = None
+    if shard:
+        # 分片模式: 认领一个行号区间，进度记在分片表中 (多个 worker 共用同一个发送日志库)
+        from shards import SHARD_ACCOUNTS, SHARD_LEASE, SHARD_SIZE, ShardBoard, list_digest
+        board = ShardBoard(journal.path, lease=getattr(config, 'SHARD_LEASE', SHARD_LEASE))
+        campaign = list_digest(excel_path)
+        try:
+            count = board.plan(campaign, total, getattr(config, 'SHARD_SIZE', SHARD_SIZE),
+                               checkpoint.cursor, checkpoint.done)
+            lease = board.claim(campaign, every=getattr(config, 'CHECKPOINT_EVERY', 20))
+        except ValueError as e:
+            print(f"❌ 名单与已有的分片记录不一致: {e} (确认后可用 python shards.py reset 重建)")
+            board.close()
+            journal.close()
             return
-            
-        # 检查列
-        missing_cols = [p for p in placeholders if p not in df.columns]
-        if missing_cols:
-            print(f"❌ Excel 缺少模板中对应的列: {missing_cols}")
+        if lease is None:
+            print(f"🎉 {count} 个分片都已处理完或正由其它 worker 发送 (查看: python shards.py status)")
+            board.close()
+            journal.close()
             return
-            
-    except Exception as e:
-        print(f"❌ 读取Excel失败: {e}")
+        print(f"🧩 认领分片 #{lease.shard}: 行 {lease.start}-{lease.stop - 1}，已处理 {len(lease)}/{lease.size}")
+        checkpoint = lease
+    checkpoint.journal = journal
+    retries = RetryQueue.from_config(journal, config)
+    limit = getattr(config, 'BATCH_LIMIT', 0)
+    # 到期的重试优先发送，并计入本批数量 (分片模式下取出的重试在租约期内对其它 worker 不可见)；
+    # 只取报文相同 (模板 / 主题 / 附件) 且由本配置的发件账号登记的重试
+    message_key = campaign_key(template, builder)
+    senders = sender_emails(config)
+    due = retries.due(limit if limit > 0 else None, lease=lease.board.lease if lease is not None else 0,
+                      campaign=message_key, senders=senders)
+
+    skipped = len(checkpoint)
+    pending = None if streaming else (lease.size if lease is not None else total) - skipped
+    if pending == 0 and not due:
+        waiting = retries.count(message_key, senders)
+        print(f"🎉 名单中 {total} 条已全部处理！(如需清理源文件: python main.py --compact)")
+        if waiting:
+            print(f"🔁 另有 {waiting} 封临时失败的邮件未到重试时间 (查看: python retries.py list)")
+        release_shard(lease)
+        journal.close()
         return
+    if skipped and pending:
+        print(f"♻️ 继续发送: 已处理 {skipped} 行，剩余 {pending} 行")
+    if due:
+        print(f"🔁 本次先重试 {len(due)} 封临时失败的邮件")
 
-    # 2. 分批逻辑
-    limit = getattr(config, 'BATCH_LIMIT', 0)
-    if limit > 0 and len(df) > limit:
-        task_df = df.iloc[:limit].copy()
-        remaining_df = df.iloc[limit:].copy()
-        print(f"📋 分批模式: 本次发送前 {len(task_df)} 封 (剩余 {len(remaining_df)} 封)")
+    # 2. 分批逻辑 (流式读取，只取本批需要的行)
+    room = limit - len(due) if limit > 0 else pending
+    if schedule is not None:
+        # 定时任务: 由任务的时段与目标决定发哪些行、发多少 (不受 BATCH_LIMIT 限制)。
+        # 逐行派发: 行在时段内才生成，发送前引擎再按时段检查一次 (hold)
+        batch_size = pending if schedule.budget is None else min(pending, schedule.budget)
+        print(f"🗓️ {schedule.describe()}")
+        chunks = chunked(schedule.rows(snapshot, checkpoint, preflight), 1)
+    elif streaming:
+        batch_size = room if limit > 0 else None
+        if batch_size is None:
+            print("📋 全量模式: 发送整份名单")
+        else:
+            print(f"📋 分批模式: 本次发送前 {batch_size} 封")
+    elif pending > room:
+        batch_size = room
+        print(f"📋 分批模式: 本次发送前 {batch_size} 封 (剩余 {pending - batch_size} 封)")
     else:
-        task_df = df.copy()
-        remaining_df = pd.DataFrame()
-        print(f"📋 全量模式: 发送所有 {len(task_df)} 封")
+        batch_size = pending
+        if pending:
+            print(f"📋 全量模式: 发送所有 {batch_size} 封")
+    if schedule is None and not streaming:
+        chunks = chunked(snapshot.iter_records(checkpoint.cursor, skip=checkpoint), limit=batch_size)
+
+    # 预构建报文: 配置了构建进程数，或之前 dry run 过同一份名单与模板时启用
+    spool_workers = getattr(config, 'SPOOL_WORKERS', 0)
+    spool = Spool.for_list(getattr(config, 'SPOOL_DIR', SPOOL_DIR), fingerprint, template, builder)
+    if dry_run:
+        start = datetime.now()
+        built, missing = spool.build(chunks, template, builder, spool_workers or None)
+        seconds = (datetime.now() - start).total_seconds()
+        print(f"🧪 试运行: 已构建 {built} 封报文 (新写入 {spool.written / 1024 / 1024:.1f} MB，耗时 {seconds:.1f}s)"
+              f"，未连接服务器、未记录进度")
+        if missing:
+            print(f"⚠️ {missing} 行缺少邮箱地址")
+        print(f"📂 报文目录: '{spool.directory}' (查看: python spool.py show <行号>)")
+        release_shard(lease)
+        journal.close()
+        return
+    use_spool = not streaming and (spool_workers > 0 or spool.exists())
+    group_size = getattr(config, 'GROUP_RECIPIENTS', 0)
+    if schedule is not None:
+        # 定时任务逐行派发: 合并投递与预构建都需要先攒一批行，会越过时段与节奏
+        use_spool = False
+        group_size = 0
+    if group_size > 1:
+        print(f"📦 合并投递: 正文相同的收件人每封最多 {group_size} 人")
+        if use_spool:
+            # 预构建报文是逐个收件人的，合并投递时不使用
+            print("ℹ️ 合并投递时不使用预构建报文")
+            use_spool = False
 
     # 3. 连接服务器
-    print("🔌 连接 Gmail...", end="")
+    suppression = open_suppression(
+        getattr(config, 'SUPPRESSION_DIR', SUPPRESSION_DIR),
+        KINDS if getattr(config, 'SUPPRESS_SENT', True) else ("bounce", "unsubscribe"),
+        journal,
+    )
+    checkpoint.suppression = suppression
+    pool_size = getattr(config, 'POOL_SIZE', 1)
+    accounts = load_accounts(config, journal)
+    if all(account.paused for account in accounts):
+        resume = datetime.fromtimestamp(min(a.paused_until for a in accounts)).strftime("%Y-%m-%d %H:%M")
+        print(f"⏸️ 所有发件账号都处于限流暂停期，最早 {resume} 恢复 (查看: python accounts.py)")
+        release_shard(lease)
+        suppression.close()
+        journal.close()
+        return
+    if lease is not None:
+        # 每个账号同一时刻只由一个 worker 使用，账号额度不会被多个进程重复计算
+        held = lease.board.claim_accounts([a.email for a in accounts if not a.paused],
+                                          getattr(config, 'SHARD_ACCOUNTS', SHARD_ACCOUNTS))
+        accounts = [a for a in accounts if a.email in held]
+        if not accounts:
+            print("⏸️ 可用的发件账号都正由其它 worker 使用，本次不发送")
+            release_shard(lease)
+            suppression.close()
+            journal.close()
+            return
+        print(f"🔑 本 worker 使用发件账号: {', '.join(a.email for a in accounts)}")
+    metrics = Metrics(profile_rate=getattr(config, 'PROFILE_SAMPLE_RATE', 0))
+    metrics_writer = MetricsWriter(metrics, getattr(config, 'METRICS_DIR', METRICS_DIR))
+    pbar = None
+    # 本次结果按行号记入列式数组，不保留每行的 dict
+    results = ResultTable(total or 0)
+
+    def on_result(index, record):
+        with metrics.phase("persist"):
+            if record['发送状态'] == "延迟":
+                retries.push(record, template.render(record), message_key)
+            if record['发送状态'] == "成功":
+                suppression.add("sent", get_recipient(record))
+            checkpoint.record(index, record)
+        results.add(index, record)
+        if schedule is not None:
+            schedule.done(index, record)
+        pbar.update(1)
+        metrics_writer.tick()
+
+    def on_retry(retry_id, record):
+        with metrics.phase("persist"):
+            record = retries.resolve(retry_id, record)
+            if record['发送状态'] == "成功":
+                suppression.add("sent", get_recipient(record))
+            checkpoint.record(None, record)
+        results.add(None, record)
+        pbar.update(1)
+        metrics_writer.tick()
+
+    engine = SendEngine(
+        send=send_email,
+        pool_size=pool_size,
+        accounts=accounts,
+        on_result=on_result,
+        screen=lambda index, row: suppression.check(get_recipient(row)),
+        metrics=metrics,
+        send_group=send_group,
+        group_key=group_key,
+        group_size=group_size,
+        control=AIMDController.from_config(config, metrics),
+        keepalive=getattr(config, 'SMTP_KEEPALIVE', KEEPALIVE),
+    )
+    if lease is not None:
+        # 后台续约；租约被其它 worker 接手时立即停止发送
+        lease.keep_alive([a.email for a in accounts], on_lost=engine.stop)
+    if len(accounts) > 1:
+        print(f"🔌 连接 {len(accounts)} 个发件账号 (共 {max(pool_size, len(accounts))} 个连接)...", end="")
+    else:
+        print(f"🔌 连接 Gmail ({pool_size} 个连接)...", end="")
     try:
-        server = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT)
-        server.starttls()
-        server.login(config.SENDER_EMAIL, config.APP_PASSWORD)
+        engine.open()
         print(" 成功!")
     except Exception as e:
         print(f"\n❌ 登录失败: {e}")
+        release_shard(lease)
+        suppression.close()
+        journal.close()
         return
+    for email, error in engine.login_errors.items():
+        print(f"⚠️ 账号 {email} 登录失败，本次不使用: {error}")
 
     # 4. 执行发送
-    processed_records = []
     print("\n📨 开始投递...")
-    pbar = tqdm(total=len(task_df), unit="封")
+    pbar = progress_bar(None if batch_size is None else len(due) + batch_size)
+    interrupted = False
+    converting = None
     
     try:
-        for index, row in task_df.iterrows():
-            success, msg = send_email(server, row, template_content, placeholders)
-            
-            # 构造归档记录 (复制原行数据 + 状态)
-            record = row.to_dict()
-            record['发送状态'] = "成功" if success else "失败"
-            record['详情'] = msg
-            record['发送时间'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            processed_records.append(record)
-            
-            pbar.update(1)
-            
-            # 模拟人类延时
-            if index < len(task_df) - 1:
-                if (index + 1) % 50 == 0:
-                    time.sleep(30)
-                else:
-                    import random
-                    time.sleep(random.uniform(2, 5))
-                    
+        if due:
+            engine.on_result = on_retry
+            engine.run(due)
+        engine.on_result = on_result
+        if streaming:
+            converting = SnapshotBuilder(excel_path, excel_path, fingerprint)
+            chunks = chunked(converting.rows(), limit=batch_size)
+            engine.screen = lambda index, row: check_row(row) or suppression.check(get_recipient(row))
+        else:
+            engine.screen = lambda index, row: preflight.verdict(index) or suppression.check(get_recipient(row))
+        if schedule is not None:
+            engine.hold = schedule.hold
+        if lease is not None and lease.lost.is_set():
+            pass  # 发送重试期间租约已被接手，不再发送名单
+        elif use_spool:
+            engine.send = send_spooled
+            engine.run(spool.iter_build(metrics.timed(chunks, "read"), template, builder, spool_workers or None, metrics))
+        else:
+            engine.run(template.iter_render_chunks(metrics.timed(chunks, "read"), metrics))
     except KeyboardInterrupt:
+        interrupted = True
         print("\n⚠️ 用户中断! 正在保存已处理的数据...")
-        # 即使中断，也要把已经发了的那些归档
-        remaining_in_task = task_df.iloc[len(processed_records):]
-        if not remaining_in_task.empty:
-             remaining_df = pd.concat([remaining_in_task, remaining_df])
     finally:
         pbar.close()
-        server.quit()
+        engine.close()
+        if converting is not None:
+            # 本批已发完: 转换名单的其余部分，下次运行直接从快照按进度定位
+            print("🗂️ 正在建立名单快照...", end="")
+            try:
+                print(f" 共 {len(converting.finish())} 行")
+            except (Exception, KeyboardInterrupt) as e:
+                converting.abort()
+                print(f"\n⚠️ 名单快照未建立 ({e or '用户中断'})，下次运行时重新读取")
+
+    if engine.exhausted:
+        print("\n⏸️ 已达到每日发送上限，未发送的记录留待下次运行。")
+    if engine.disconnected:
+        print("\n⚠️ 连接中断且多次重连失败，未发送的记录留待下次运行。")
+    if engine.throttled:
+        print("\n⏸️ 发件账号被服务商限流，已暂停使用，未发送的记录留待下次运行。")
+    if lease is not None and lease.lost.is_set():
+        print("\n⚠️ 分片租约已被其它 worker 接手 (本进程续约超时)，已停止发送。")
+    for account in accounts:
+        if account.paused and account.pause_reason:
+            until = datetime.fromtimestamp(account.paused_until).strftime("%H:%M")
+            print(f"⏸️ 账号 {account.email} 暂停至 {until}: {account.pause_reason}")
+    save_paused(journal, accounts)
+
+    if use_spool and lease is None and len(checkpoint) >= total:
+        # 名单已全部处理，预构建的报文不再需要
+        spool.remove()
 
-    # 5. 归档与清理
-    if processed_records:
-        update_history_and_source(excel_path, processed_records, remaining_df)
+    # 5. 归档与清理 (即使中断，也要把已经发了的那些归档，下次运行从进度游标处继续)
+    if results:
+        with metrics.phase("persist"):
+            archive_progress(results, checkpoint)
+        summary_path = metrics_writer.finish()
+        print(f"📊 耗时分布: {metrics_writer.breakdown()}")
+        decisions = metrics.events.get("control", ())
+        if decisions:
+            slowed = sum(1 for d in decisions if d["action"] == "decrease")
+            print(f"🎛️ 自适应控制: 根据服务器反馈降速 {slowed} 次"
+                  + (f"，结束时: {engine.control.describe()}" if engine.control.describe() else "，已恢复到配置上限"))
+        print(f"📊 运行指标已写入 '{summary_path}' 与 '{metrics_writer.prometheus_path}'")
     else:
         print("无数据处理")
+    if lease is not None:
+        if use_spool and lease.board.finished(lease.campaign):
+            spool.remove()
+        release_shard(lease)
+    # 多个 worker 同时运行时不自动合并屏蔽索引 (合并会改写其它进程正在追加的日志)
+    suppression.close(compact=lease is None)
+    journal.close()
+    # shards.py work 据此决定是否继续认领下一个分片
+    return 0 if interrupted else len(results)
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Smart Mail Drop")
+    parser.add_argument("--source", metavar="PATH",
+                        help="名单文件 (.xlsx / .csv / .jsonl / .parquet)，默认取 config.SOURCE_FILE 或 main.xlsx")
+    parser.add_argument("--compact", nargs="?", const="", metavar="PATH",
+                        help="导出剩余名单 (默认覆盖源文件并重置进度)，不发送")
+    parser.add_argument("--shard", action="store_true",
+                        help="分片模式: 认领名单的一个分片发送，可在多个进程 / 机器上同时运行 (见 python shards.py -h)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="只把本批邮件预构建为 .eml 报文 (spool 目录)，不连接服务器")
+    args = parser.parse_args()
+    main(compact=args.compact is not None, compact_output=args.compact or None, dry_run=args.dry_run,
+         source=args.source, shard=args.shard)
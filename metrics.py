@@ -0,0 +1,293 @@
+"""
+运行指标: 发送循环各阶段耗时直方图、SMTP 应答码计数，导出为 Prometheus 文本文件与 JSON 运行摘要
+
+阶段:
+    read       从快照读取名单
+    render     模板渲染
+    throttle   限速等待 (主动 sleep)
+    compose    构造 MIME 报文 (一封的发送耗时减去 SMTP 往返)
+    smtp       server.sendmail 往返
+    reconnect  断线重连
+    persist    写发送日志与进度文件
+
+自适应控制 (control.py) 的每次调整作为事件记入 JSON 摘要的 control 项，各账号当前窗口导出为 gauge。
+Prometheus 文件可交给 node_exporter 的 textfile collector 采集，运行中每隔几秒刷新一次。
+网页端的并发任务各写各的文件 (mailsender_<任务编号>.prom)，每条序列带 job 标签，互不覆盖。
+profile_rate > 0 时按比例抽样用 cProfile 记录单封发送，结束时合并写出 .prof (用 snakeviz / pstats 查看)。
+"""
+import bisect
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PHASES = ("read", "render", "throttle", "compose", "smtp", "reconnect", "persist")
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = "mailsender"
+METRICS_DIR = "metrics"
+
+
+class Histogram:
+    """固定桶直方图 (非线程安全，由 Metrics 加锁)"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """按桶估算分位数 (取所在桶的上界)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class TimedServer:
+    """包装 SMTP 连接: 记录 sendmail 往返耗时与应答码，其余属性透传"""
+
+    def __init__(self, server, metrics):
+        self._server = server
+        self._metrics = metrics
+        self.elapsed = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self._server, name)
+
+    def sendmail(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            refused = self._server.sendmail(*args, **kwargs)
+        except Exception as e:
+            self._metrics.reply(reply_codes(e))
+            raise
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self._metrics.observe("smtp", self.elapsed)
+        self._metrics.reply(["250"] + [str(code) for code, _ in (refused or {}).values()])
+        return refused
+
+
+def reply_codes(exc):
+    """异常对应的应答码 (断线 / 网络错误单独计数)"""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return [str(code) for code, _ in exc.recipients.values()]
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return [str(exc.smtp_code)]
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return ["disconnect"]
+    if isinstance(exc, OSError):
+        return ["network"]
+    return ["error"]
+
+
+class Metrics:
+    """线程安全的运行指标"""
+
+    def __init__(self, profile_rate=0.0, job=None):
+        self.started = time.time()
+        self.job = job
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.replies = Counter()
+        self.statuses = Counter()
+        self.events = {}
+        self.gauges = {}
+        self.profile_rate = float(profile_rate or 0)
+        self._profile = None
+        self._profiled = 0
+        self._profile_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            self.phases[phase].observe(seconds)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, iterable, name):
+        """逐项计时的迭代器包装 (用于流式读取名单)"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.observe(name, time.perf_counter() - start)
+            yield item
+
+    def reply(self, codes):
+        with self._lock:
+            self.replies.update(codes)
+
+    def event(self, kind, **fields):
+        """记录一条运行事件 (如自适应控制的调整)，写入 JSON 摘要"""
+        fields["time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self.events.setdefault(kind, []).append(fields)
+
+    def gauge(self, name, label, value):
+        with self._lock:
+            self.gauges[(name, label)] = value
+
+    def result(self, status):
+        with self._lock:
+            self.statuses[status] += 1
+
+    def send(self, send, server, row, body):
+        """计时执行一次发送: SMTP 往返记入 smtp，其余记入 compose；按比例抽样 cProfile"""
+        timed = TimedServer(server, self)
+        start = time.perf_counter()
+        try:
+            if self.profile_rate and random.random() < self.profile_rate and self._profile_lock.acquire(False):
+                # 同一时刻只剖析一封 (解释器只允许一个活动的 profiler)
+                try:
+                    if self._profile is None:
+                        import cProfile
+                        self._profile = cProfile.Profile()
+                    self._profiled += 1
+                    return self._profile.runcall(send, timed, row, body)
+                finally:
+                    self._profile_lock.release()
+            return send(timed, row, body)
+        finally:
+            self.observe("compose", max(0.0, time.perf_counter() - start - timed.elapsed))
+
+    def summary(self):
+        """JSON 运行摘要"""
+        with self._lock:
+            duration = time.time() - self.started
+            sent = self.statuses.get("成功", 0)
+            return {
+                "started": datetime.fromtimestamp(self.started).strftime("%Y-%m-%d %H:%M:%S"),
+                "duration_s": round(duration, 3),
+                "messages_per_second": round(sent / duration, 2) if duration else 0.0,
+                "statuses": dict(self.statuses),
+                "smtp_replies": dict(self.replies),
+                "phases": {
+                    name: {
+                        "count": h.count,
+                        "total_s": round(h.sum, 3),
+                        "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+                        "p50_ms": round(h.quantile(0.5) * 1000, 3),
+                        "p99_ms": round(h.quantile(0.99) * 1000, 3),
+                        "max_ms": round(h.max * 1000, 3),
+                    }
+                    for name, h in self.phases.items() if h.count
+                },
+                "profiled_sends": self._profiled,
+                **{kind: list(events) for kind, events in self.events.items()},
+            }
+
+    def prometheus(self):
+        """Prometheus 文本格式"""
+        job = f'job="{self.job}",' if self.job else ""
+        lines = [
+            f"# HELP {PREFIX}_phase_seconds 发送循环各阶段耗时",
+            f"# TYPE {PREFIX}_phase_seconds histogram",
+        ]
+        with self._lock:
+            for name, h in self.phases.items():
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'{PREFIX}_phase_seconds_bucket{{{job}phase="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{PREFIX}_phase_seconds_bucket{{{job}phase="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'{PREFIX}_phase_seconds_sum{{{job}phase="{name}"}} {h.sum:.6f}')
+                lines.append(f'{PREFIX}_phase_seconds_count{{{job}phase="{name}"}} {h.count}')
+            lines += [f"# HELP {PREFIX}_smtp_replies_total SMTP 应答码计数",
+                      f"# TYPE {PREFIX}_smtp_replies_total counter"]
+            lines += [f'{PREFIX}_smtp_replies_total{{{job}code="{code}"}} {n}' for code, n in sorted(self.replies.items())]
+            lines += [f"# HELP {PREFIX}_messages_total 按状态统计的处理结果",
+                      f"# TYPE {PREFIX}_messages_total counter"]
+            lines += [f'{PREFIX}_messages_total{{{job}status="{status}"}} {n}' for status, n in sorted(self.statuses.items())]
+            for name in sorted({name for name, _ in self.gauges}):
+                lines.append(f"# TYPE {PREFIX}_{name} gauge")
+                lines += [f'{PREFIX}_{name}{{{job}account="{label}"}} {value:g}'
+                          for (n, label), value in sorted(self.gauges.items()) if n == name]
+        started = f"{{{job.rstrip(',')}}}" if job else ""
+        lines += [f"# TYPE {PREFIX}_run_started_seconds gauge", f"{PREFIX}_run_started_seconds{started} {self.started:.3f}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """原子写出 Prometheus 文本文件"""
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+    def write_summary(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+    def write_profile(self, path):
+        """合并抽样的 cProfile 结果，没有抽样时返回 False"""
+        if self._profile is None:
+            return False
+        import pstats
+        pstats.Stats(self._profile).dump_stats(path)
+        return True
+
+
+class MetricsWriter:
+    """运行中定期刷新 Prometheus 文件，结束时写出 JSON 摘要 (及抽样剖析结果)"""
+
+    def __init__(self, metrics, directory=METRICS_DIR, interval=5.0):
+        self.metrics = metrics
+        self.directory = directory
+        self.interval = interval
+        self.stamp = datetime.fromtimestamp(metrics.started).strftime("%Y%m%d_%H%M%S")
+        # 带任务编号时文件名加上编号 (并发任务不互相覆盖)
+        self.suffix = f"_{metrics.job}" if metrics.job else ""
+        self._last = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def prometheus_path(self):
+        return os.path.join(self.directory, f"{PREFIX}{self.suffix}.prom")
+
+    def tick(self):
+        """在主线程中按间隔调用 (如每出一条结果)，写文件的频率不超过 interval"""
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.metrics.write_prometheus(self.prometheus_path)
+
+    def breakdown(self):
+        """各阶段累计耗时的一行概览"""
+        summary = self.metrics.summary()["phases"]
+        return ", ".join(f"{name} {info['total_s']:.2f}s" for name, info in summary.items())
+
+    def finish(self):
+        """写出最终指标，返回 JSON 摘要路径"""
+        self.metrics.write_prometheus(self.prometheus_path)
+        summary_path = os.path.join(self.directory, f"run_{self.stamp}{self.suffix}.json")
+        self.metrics.write_summary(summary_path)
+        self.metrics.write_profile(os.path.join(self.directory, f"run_{self.stamp}{self.suffix}.prof"))
+        return summary_path
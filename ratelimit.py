@@ -0,0 +1,128 @@
+"""令牌桶发送调度器: 按明确的速率目标分配发送时刻，替代发送后的固定 sleep"""
+import bisect
+import random
+import threading
+import time
+
+HOUR = 3600
+DAY = 86400
+
+
+class RateLimiter:
+    """
+    发送调度器，线程安全，多个连接共享同一实例即统一限速。
+
+    - per_second / per_minute: 令牌桶 (GCRA 预约式实现)，容量为 burst，把额度匀速摊开。
+      acquire() 先在锁内预约一个发送时刻，再在锁外等待:
+      下一次预约只取决于上一次预约，而不是上一封实际发完的时间，
+      因此 SMTP 耗时不会叠加到间隔上，长期速率严格等于目标速率。
+    - per_hour / per_day: 精确的滚动窗口上限，任意 1 小时 / 24 小时内绝不超额。
+      小时额度满了就等待窗口滑过；每日额度满了 acquire() 直接返回 False，
+      剩余任务留给下一次运行。recent_sends 为最近 24 小时内已发送的时间戳 (跨运行累计)。
+    - jitter: 间隔的随机抖动比例 (0~1)，只推迟实际发送，不影响预约节奏。
+    - set_scale(): 自适应控制 (control.py) 在配置速率以内临时降速。
+    """
+
+    def __init__(self, per_second=0, per_minute=0, per_hour=0, per_day=0,
+                 burst=1, jitter=0.0, recent_sends=(), clock=time.time):
+        self.burst = max(1, int(burst))
+        self.jitter = max(0.0, float(jitter))
+        self.per_hour = int(per_hour or 0)
+        self.per_day = int(per_day or 0)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._buckets = []  # [发送间隔, 容差, 理论到达时间, 配置的发送间隔]
+        for limit, window in ((per_second, 1), (per_minute, 60)):
+            if limit and limit > 0:
+                interval = window / float(limit)
+                self._buckets.append([interval, (self.burst - 1) * interval, None, interval])
+        self.interval = max((b[0] for b in self._buckets), default=0.0)
+        self.scale = 1.0
+        now = clock()
+        self._sends = sorted(t for t in recent_sends if t > now - DAY)
+
+    @classmethod
+    def from_config(cls, config, **overrides):
+        """从 config.py 的 RATE_* 设置构造"""
+        options = dict(
+            per_second=getattr(config, 'RATE_PER_SECOND', 0),
+            per_minute=getattr(config, 'RATE_PER_MINUTE', 0),
+            per_hour=getattr(config, 'RATE_PER_HOUR', 0),
+            per_day=getattr(config, 'RATE_PER_DAY', 0),
+            burst=getattr(config, 'RATE_BURST', 1),
+            jitter=getattr(config, 'RATE_JITTER', 0.0),
+        )
+        options.update(overrides)
+        return cls(**options)
+
+    @property
+    def remaining_today(self):
+        """滚动 24 小时内剩余额度 (未设置每日上限时为 None)"""
+        if not self.per_day:
+            return None
+        with self._lock:
+            self._expire(self.clock())
+            return max(0, self.per_day - len(self._sends))
+
+    def set_scale(self, scale):
+        """
+        把每秒 / 每分钟速率降为配置值的 scale 倍 (0~1，自适应控制用)，超过 1 按 1 处理: 速率不会高于配置值。
+        每小时 / 每日上限不受影响。
+        """
+        with self._lock:
+            self.scale = min(1.0, max(float(scale), 1e-3))
+            for bucket in self._buckets:
+                bucket[0] = bucket[3] / self.scale
+                bucket[1] = (self.burst - 1) * bucket[0]
+            self.interval = max((b[0] for b in self._buckets), default=0.0)
+
+    def _expire(self, now):
+        expired = bisect.bisect_right(self._sends, now - DAY)
+        if expired:
+            del self._sends[:expired]
+
+    def reserve(self):
+        """预约下一个发送时刻，每日额度用尽时返回 None"""
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            if self.per_day and len(self._sends) >= self.per_day:
+                return None
+            at = now
+            for interval, tolerance, tat, _ in self._buckets:
+                if tat is not None:
+                    at = max(at, tat - tolerance)
+            if self.per_hour:
+                # 最近一小时内已满: 等到第 per_hour 封之前的那一封滑出窗口
+                start = bisect.bisect_right(self._sends, at - HOUR)
+                if len(self._sends) - start >= self.per_hour:
+                    at = max(at, self._sends[-self.per_hour] + HOUR)
+            for bucket in self._buckets:
+                tat = bucket[2]
+                bucket[2] = (at if tat is None else max(tat, at)) + bucket[0]
+            bisect.insort(self._sends, at)
+            return at
+
+    def acquire(self, stop_event=None):
+        """阻塞到可以发送为止；额度用尽或 stop_event 被置位时返回 False"""
+        reserved = self.reserve()
+        if reserved is None:
+            return False
+        at = reserved
+        if self.jitter and self.interval:
+            at += random.uniform(0, self.jitter * self.interval)
+        delay = at - self.clock()
+        if delay > 0:
+            if stop_event is None:
+                time.sleep(delay)
+            elif stop_event.wait(delay):
+                self._refund(reserved)
+                return False
+        return True
+
+    def _refund(self, at):
+        # 预约后未实际发送，退回额度
+        with self._lock:
+            i = bisect.bisect_left(self._sends, at)
+            if i < len(self._sends) and self._sends[i] == at:
+                del self._sends[i]
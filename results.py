@@ -0,0 +1,127 @@
+"""
+发送结果的列式存储: 按名单行号预分配的紧凑数组，不再为每一行复制一份 dict
+
+    status   uint8   状态编号 (0 表示本次未处理)
+    detail   uint32  详情编号 (相同的详情文字只存一份)
+    sent_at  int64   发送时间 (秒级时间戳)
+    sender   uint16  发件账号编号
+
+每行固定 15 字节，与名单列数和单元格长度无关 (100 万行约 15 MB)。
+报表在导出时才按行号与名单快照拼接；不在名单中的结果 (重试队列的记录) 数量很少，原样保留。
+"""
+import time
+from array import array
+from collections import Counter
+from datetime import datetime
+
+from journal import TIME_FORMAT
+
+STATUSES = ("成功", "失败", "延迟", "跳过")
+
+
+class _Interned:
+    """字符串 <-> 编号 (0 号为 None)"""
+
+    def __init__(self, initial=()):
+        self.values = [None]
+        self.ids = {None: 0}
+        for value in initial:
+            self.id(value)
+
+    def id(self, value):
+        try:
+            return self.ids[value]
+        except KeyError:
+            self.ids[value] = len(self.values)
+            self.values.append(value)
+            return self.ids[value]
+
+
+class ResultTable:
+    """size 为名单行数 (未知时为 0，按行号自动扩展)；add() 在出结果的线程 (发送引擎的调用方) 中调用"""
+
+    def __init__(self, size):
+        self.size = size
+        self.status = bytearray(size)
+        self.detail = array("I", bytes(4 * size))
+        self.sent_at = array("q", bytes(8 * size))
+        self.sender = array("H", bytes(2 * size))
+        self.extra = []
+        self.counts = Counter()
+        self.first = size
+        self.last = -1
+        self._statuses = _Interned(STATUSES)
+        self._details = _Interned()
+        self._senders = _Interned()
+        self._time_text = None
+        self._time_value = 0
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def __bool__(self):
+        return bool(self.counts)
+
+    def _timestamp(self, text):
+        # 同一秒内的结果发送时间相同，只解析一次
+        if text != self._time_text:
+            try:
+                self._time_value = int(time.mktime(datetime.strptime(text, TIME_FORMAT).timetuple()))
+            except (TypeError, ValueError):
+                self._time_value = 0
+            self._time_text = text
+        return self._time_value
+
+    def add(self, index, record):
+        status = record['发送状态']
+        self.counts[status] += 1
+        if index is None or index < 0:
+            self.extra.append(record)
+            return
+        if index >= self.size:
+            self._grow(max(index + 1, 2 * self.size))
+        self.status[index] = self._statuses.id(status)
+        self.detail[index] = self._details.id(None if record.get('详情') is None else str(record['详情']))
+        self.sent_at[index] = self._timestamp(record.get('发送时间'))
+        self.sender[index] = self._senders.id(record.get('发件账号'))
+        self.first = index if self.last < 0 else min(self.first, index)
+        self.last = max(self.last, index)
+
+    def _grow(self, size):
+        n = size - self.size
+        self.status.extend(bytes(n))
+        self.detail.frombytes(bytes(4 * n))
+        self.sent_at.frombytes(bytes(8 * n))
+        self.sender.frombytes(bytes(2 * n))
+        self.size = size
+
+    def get(self, index):
+        """某一行的 (状态, 详情, 发送时间, 发件账号)，未处理时返回 None"""
+        code = self.status[index]
+        if not code:
+            return None
+        ts = self.sent_at[index]
+        return (self._statuses.values[code], self._details.values[self.detail[index]],
+                datetime.fromtimestamp(ts).strftime(TIME_FORMAT) if ts else None,
+                self._senders.values[self.sender[index]])
+
+    def columns(self, columns):
+        """报表的列: 名单原有列 + 状态列 (用到了发件账号时再加一列)"""
+        extra = ['发送状态', '详情', '发送时间'] + (['发件账号'] if len(self._senders.values) > 1 else [])
+        return list(columns) + [c for c in extra if c not in columns]
+
+    def iter_records(self, snapshot):
+        """与名单快照按行号拼接，逐条产出报表记录 (原行数据 + 发送状态/详情/发送时间[/发件账号])"""
+        if self.last >= 0:
+            for index, row in snapshot.iter_records(self.first):
+                if index > self.last:
+                    break
+                result = self.get(index)
+                if result is None:
+                    continue
+                record = dict(row)
+                record['发送状态'], record['详情'], record['发送时间'], sender = result
+                if sender:
+                    record['发件账号'] = sender
+                yield record
+        yield from self.extra
@@ -0,0 +1,193 @@
+"""
+重试队列: 临时失败 (4xx / 连接中断) 的邮件不再记为最终失败，而是存入发送日志库按指数退避重试
+
+与发送日志共用一个 SQLite 文件 (retries 表)，跨运行保留。每次运行先发送已到期的重试，再继续名单。
+存储已渲染的正文，重试时不依赖原名单与模板。
+每条重试记下所属群发 (报文摘要: 正文模板 + 主题 / HTML 模板 / 附件) 与发件账号，只在报文相同、
+发件账号相符的运行中重试，不会用另一次群发的主题、附件或发件人发出。
+
+    python retries.py list     # 查看队列
+    python retries.py clear    # 清空队列
+"""
+import hashlib
+import json
+import time
+from datetime import datetime
+
+from journal import JOURNAL_FILE, STATUS_FIELDS, TIME_FORMAT, Journal, _jsonable, _recipient
+
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 300
+RETRY_MAX_DELAY = 6 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS retries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    next_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    recipient TEXT,
+    body TEXT,
+    data TEXT,
+    campaign TEXT,
+    sender TEXT
+);
+CREATE INDEX IF NOT EXISTS retries_next_at ON retries (next_at);
+"""
+# 旧版队列没有这两列: 补上后旧记录不属于任何群发，不再自动重试 (可用 python retries.py list 查看)
+MIGRATIONS = ("campaign", "sender")
+
+
+def campaign_key(template, builder):
+    """一次群发的报文摘要: 正文模板 + 主题 / HTML 模板 / 附件 (builder.digest)"""
+    return hashlib.blake2b(f"{template.content}\0{builder.digest}".encode("utf-8"), digest_size=8).hexdigest()
+
+
+class RetryQueue:
+    """持久化的重试队列，attempts 为已经失败的次数"""
+
+    def __init__(self, journal, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY,
+                 max_delay=RETRY_MAX_DELAY, clock=time.time):
+        self.conn = journal.conn
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.clock = clock
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(retries)")}
+        for column in MIGRATIONS:
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE retries ADD COLUMN {column} TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS retries_campaign ON retries (campaign, next_at)")
+
+    @classmethod
+    def from_config(cls, journal, config):
+        return cls(
+            journal,
+            max_attempts=getattr(config, 'RETRY_MAX_ATTEMPTS', RETRY_MAX_ATTEMPTS),
+            base_delay=getattr(config, 'RETRY_BASE_DELAY', RETRY_BASE_DELAY),
+            max_delay=getattr(config, 'RETRY_MAX_DELAY', RETRY_MAX_DELAY),
+        )
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM retries").fetchone()[0]
+
+    def count(self, campaign=None, senders=None):
+        """某次群发 / 某些发件账号的待重试数"""
+        where, args = _scope(campaign, senders)
+        return self.conn.execute(f"SELECT COUNT(*) FROM retries WHERE {where}", args).fetchone()[0]
+
+    def _delay(self, attempts):
+        return min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+
+    def _when(self, next_at):
+        return datetime.fromtimestamp(next_at).strftime(TIME_FORMAT)
+
+    def push(self, record, body, campaign=None, sender=None):
+        """
+        登记一条首次临时失败的结果，并在详情中注明下次重试时间。
+        campaign 为 campaign_key() 的摘要，sender 为发件邮箱 (缺省取记录中的发件账号)
+        """
+        next_at = self.clock() + self._delay(1)
+        data = {k: _jsonable(v) for k, v in record.items() if k not in STATUS_FIELDS}
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO retries (next_at, attempts, last_error, recipient, body, data, campaign, sender) "
+                "VALUES (?, 1, ?, ?, ?, ?, ?, ?)",
+                (next_at, _jsonable(record.get('详情')), _recipient(record), body,
+                 json.dumps(data, ensure_ascii=False), campaign, sender or record.get('发件账号')),
+            )
+        record['详情'] = f"{record.get('详情')} (将于 {self._when(next_at)} 重试)"
+        return record
+
+    def due(self, limit=None, lease=0, campaign=None, senders=None):
+        """
+        已到期的重试任务，产出 (重试编号, row, body)，可直接作为发送任务。
+        campaign / senders 不为 None 时只取该群发、这些发件账号登记的任务。
+        lease > 0 时把取出的任务顺延 lease 秒 (多个 worker 同时运行时不会重复取到)，
+        resolve() 会重新排期或移出队列；进程中途退出的任务在顺延期满后再次到期。
+        """
+        now = self.clock()
+        where, args = _scope(campaign, senders)
+        sql = f"SELECT id, body, data FROM retries WHERE next_at <= ? AND {where} ORDER BY next_at"
+        args = (now,) + args
+        if limit is not None:
+            sql += " LIMIT ?"
+            args += (int(limit),)
+        with self.conn:
+            if lease and not self.conn.in_transaction:
+                self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute(sql, args).fetchall()
+            if lease:
+                self.conn.executemany("UPDATE retries SET next_at = ? WHERE id = ?",
+                                      [(now + lease, retry_id) for retry_id, _, _ in rows])
+        return [(retry_id, json.loads(data), body) for retry_id, body, data in rows]
+
+    def resolve(self, retry_id, record):
+        """
+        处理一次重试的结果: 成功或永久失败则移出队列；再次临时失败则按指数退避重新排期，
+        超过最大次数记为最终 "失败"。返回 (可能已改写状态的) record。
+        """
+        row = self.conn.execute("SELECT attempts FROM retries WHERE id = ?", (retry_id,)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        with self.conn:
+            if record['发送状态'] != "延迟":
+                self.conn.execute("DELETE FROM retries WHERE id = ?", (retry_id,))
+            elif attempts >= self.max_attempts:
+                self.conn.execute("DELETE FROM retries WHERE id = ?", (retry_id,))
+                record['发送状态'] = "失败"
+                record['详情'] = f"{record.get('详情')} (已重试 {attempts - 1} 次)"
+            else:
+                next_at = self.clock() + self._delay(attempts)
+                self.conn.execute(
+                    "UPDATE retries SET attempts = ?, next_at = ?, last_error = ? WHERE id = ?",
+                    (attempts, next_at, _jsonable(record.get('详情')), retry_id),
+                )
+                record['详情'] = f"{record.get('详情')} (第 {attempts} 次失败，将于 {self._when(next_at)} 重试)"
+        return record
+
+    def iter_pending(self):
+        """产出 (收件人, 发件账号, 失败次数, 下次重试时间, 最近错误)"""
+        for recipient, sender, attempts, next_at, last_error in self.conn.execute(
+                "SELECT recipient, sender, attempts, next_at, last_error FROM retries ORDER BY next_at"):
+            yield recipient, sender, attempts, self._when(next_at), last_error
+
+    def clear(self):
+        with self.conn:
+            return self.conn.execute("DELETE FROM retries").rowcount
+
+
+def _scope(campaign, senders):
+    """due() / count() 的筛选条件: 参数为 None 时不限"""
+    clauses, args = ["1"], ()
+    if campaign is not None:
+        clauses.append("campaign = ?")
+        args += (campaign,)
+    if senders is not None:
+        senders = list(senders)
+        clauses.append(f"sender IN ({', '.join('?' * len(senders))})" if senders else "0")
+        args += tuple(senders)
+    return " AND ".join(clauses), args
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="重试队列工具")
+    parser.add_argument("--db", default=JOURNAL_FILE, help="日志文件路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="查看待重试的邮件")
+    sub.add_parser("clear", help="清空重试队列")
+    args = parser.parse_args()
+
+    with Journal(args.db) as journal:
+        retries = RetryQueue(journal)
+        if args.command == "list":
+            for recipient, sender, attempts, when, error in retries.iter_pending():
+                print(f"{recipient}  发件 {sender or '-'}  已失败 {attempts} 次  下次 {when}  {error}")
+            print(f"共 {len(retries)} 条待重试")
+        else:
+            print(f"✅ 已清空 {retries.clear()} 条")
+
+
+if __name__ == "__main__":
+    main()
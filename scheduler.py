@@ -0,0 +1,618 @@
+"""
+定时任务 (campaign): 按开始时间、允许发送的时段和每个时段的发送量目标，由常驻进程在时段内匀速发送名单，时段外断开连接空闲等待
+
+任务保存在发送日志库 (SQLite) 中，进程重启后继续:
+    campaigns         任务名 -> 名单文件、开始时间、时段、默认时区 / 时区列、排序列、每个时段的目标封数、状态
+    campaign_windows  任务名 + 时段开始时间 -> 该时段已发送成功的封数 (重启后目标不会重新计算)
+
+- 时段: 星期 (mon-fri、1,3,5 或 *) + 每天的时间区间 [开始, 结束) (如 9-17、09:30-18:00；22-6 表示跨夜)
+- 时区: 名单有时区列 (Asia/Shanghai、+08:00、UTC+8) 时按每个收件人的当地时间判断，
+  空值或无法识别时用任务的默认时区 (未设置时为本机时区)
+- 顺序: 指定排序列时按其升序 (数字在前、空值最后)，否则时段先结束的时区先发；同一优先级按行号
+- 发送量: 每个时段 (任一收件人时区处于时段内的连续区间) 最多发送目标封数，在时段剩余时间内匀速摊开；
+  0 表示不设目标，只受 config.py 的速率上限约束。只有发送成功的行计入目标 (延迟 / 失败 / 跳过的不计)
+- 时段在发送时判断: 时段结束 (或该收件人时区出了时段) 后已派发未发出的行不再发送，留到下一个时段
+- 时段内连接保持登录 (空闲时 NOOP 保活)；时段结束或目标完成后断开，空闲到下一个时段
+- 进度与普通运行共用进度文件 / 发送日志 / 重试队列；速率、每日上限与各账号额度仍按 config.py 严格执行
+
+    python scheduler.py add 通知 --source main.xlsx --start "2026-10-20 09:00" --days mon-fri --hours 9-17 \\
+        --timezone Asia/Shanghai --tz-column 时区 --order-by 优先级 --per-window 500
+    python scheduler.py list              # 查看各任务与时段
+    python scheduler.py pause 通知         # 暂停 / resume 恢复 / remove 删除 (已发送的记录保留)
+    python scheduler.py run               # 常驻进程: 时段内发送，时段外空闲
+"""
+import heapq
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from checkpoint import Checkpoint, checkpoint_path, file_fingerprint
+from journal import JOURNAL_FILE, TIME_FORMAT
+from snapshot import Snapshot
+
+STEP = 15 * 60       # 计算时段边界的粒度 (秒)，覆盖 +05:45 这类非整点时区
+HORIZON = 8 * 86400  # 向后查找下一个时段的范围
+REFRESH = 60         # 时段内每隔多少秒检查一次新进入时段的时区
+WAIT = 0.5           # 达到目标的在途行还没出结果时，隔多久再看一次
+IDLE_RETRY = 900     # 时段内本次没有发出任何邮件 (如额度用尽) 时，多久后再试
+MAX_SLEEP = 300      # 空闲时至少每隔多少秒重新读取任务表 (新增 / 暂停的任务)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    name TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    start_at REAL NOT NULL,
+    days TEXT NOT NULL,
+    start_minute INTEGER NOT NULL,
+    end_minute INTEGER NOT NULL,
+    timezone TEXT,
+    tz_column TEXT,
+    order_by TEXT,
+    per_window INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'active',
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS campaign_windows (
+    name TEXT NOT NULL,
+    opened REAL NOT NULL,
+    sent INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, opened)
+);
+"""
+
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_OFFSET = re.compile(r"^(?:UTC|GMT)?\s*([+-])(\d{1,2})(?::?(\d{2}))?$", re.IGNORECASE)
+_zones = {}
+
+
+def parse_zone(value):
+    """时区名 (Asia/Shanghai) 或 UTC 偏移 (+08:00、UTC+8)，空值或无法识别时返回 None"""
+    if value is None or value != value:
+        return None
+    text = str(value).strip()
+    if text in _zones:
+        return _zones[text]
+    zone = None
+    match = _OFFSET.match(text)
+    if text.upper() in ("UTC", "GMT", "Z"):
+        zone = timezone.utc
+    elif match:
+        sign, hours, minutes = match.groups()
+        offset = timedelta(hours=int(hours), minutes=int(minutes or 0))
+        if offset < timedelta(hours=15):
+            zone = timezone(-offset if sign == "-" else offset)
+    elif text:
+        try:
+            from zoneinfo import ZoneInfo
+            zone = ZoneInfo(text)
+        except (ImportError, ValueError, KeyError):
+            # Windows 上没有系统时区库时需要 pip install tzdata
+            zone = None
+    _zones[text] = zone
+    return zone
+
+
+def parse_days(text):
+    """mon-fri / 1,3,5 (1 为星期一) / * -> "01234" 形式的星期集合 (0 为星期一)"""
+    text = str(text).strip().lower()
+    if text in ("*", "all", ""):
+        return "0123456"
+    days = set()
+    for part in text.split(","):
+        ends = [_day(x) for x in part.split("-", 1)]
+        if len(ends) == 1:
+            days.add(ends[0])
+        else:
+            first, last = ends
+            days.update((first + i) % 7 for i in range((last - first) % 7 + 1))
+    return "".join(str(d) for d in sorted(days))
+
+
+def _day(text):
+    text = text.strip()
+    if text[:3] in DAY_NAMES:
+        return DAY_NAMES.index(text[:3])
+    if text.isdigit() and 1 <= int(text) <= 7:
+        return int(text) - 1
+    raise ValueError(f"无法识别的星期: {text}")
+
+
+def parse_hours(text):
+    """9-17 / 09:30-18:00 / 22-6 -> (开始分钟, 结束分钟)，结束为 24 点时为 1440"""
+    try:
+        start, end = (_minute(x) for x in str(text).split("-"))
+    except ValueError:
+        raise ValueError(f"无法识别的时间区间: {text} (示例: 9-17、09:30-18:00)")
+    if start == end or not (0 <= start < 1440 and 0 < end <= 1440):
+        raise ValueError(f"无法识别的时间区间: {text} (示例: 9-17、09:30-18:00)")
+    return start, end
+
+
+def _minute(text):
+    hour, _, minute = text.strip().partition(":")
+    return int(hour) * 60 + int(minute or 0)
+
+
+class Campaign:
+    """campaigns 表的一行"""
+
+    FIELDS = ("name", "source", "start_at", "days", "start_minute", "end_minute", "timezone",
+              "tz_column", "order_by", "per_window", "state", "created")
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+        self.zone = parse_zone(self.timezone)
+
+    def is_open(self, moment):
+        """moment (带时区的当地时间) 是否在时段内"""
+        minute = moment.hour * 60 + moment.minute
+        if self.start_minute < self.end_minute:
+            return str(moment.weekday()) in self.days and self.start_minute <= minute < self.end_minute
+        # 跨夜时段 (如 22-6): 零点之后的部分属于前一天的时段
+        if minute >= self.start_minute:
+            return str(moment.weekday()) in self.days
+        return minute < self.end_minute and str((moment.weekday() - 1) % 7) in self.days
+
+    def describe_window(self):
+        days = "每天" if self.days == "0123456" else ",".join(DAY_NAMES[int(d)] for d in self.days)
+        hours = "%02d:%02d-%02d:%02d" % (self.start_minute // 60, self.start_minute % 60,
+                                         self.end_minute // 60, self.end_minute % 60)
+        zone = f"{self.tz_column} 列 (默认 {self.timezone or '本机时区'})" if self.tz_column else \
+            (self.timezone or "本机时区")
+        return f"{days} {hours} [{zone}]"
+
+
+class CampaignBoard:
+    """任务表的一个连接"""
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        # 匀速发送时由发送引擎的派发线程累计发送量
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, campaign):
+        """新建任务，同名任务已存在时抛出 ValueError"""
+        try:
+            self.conn.execute(
+                f"INSERT INTO campaigns ({', '.join(Campaign.FIELDS)}) VALUES ({', '.join('?' * len(Campaign.FIELDS))})",
+                [getattr(campaign, f) for f in Campaign.FIELDS])
+        except sqlite3.IntegrityError:
+            raise ValueError(f"任务 '{campaign.name}' 已存在")
+
+    def get(self, name):
+        return next(iter(self.list(name)), None)
+
+    def list(self, name=None):
+        sql = f"SELECT {', '.join(Campaign.FIELDS)} FROM campaigns"
+        rows = self.conn.execute(sql + " WHERE name = ?", (name,)) if name is not None else \
+            self.conn.execute(sql + " ORDER BY start_at, created")
+        return [Campaign(**dict(zip(Campaign.FIELDS, row))) for row in rows]
+
+    def set_state(self, name, state):
+        return self.conn.execute("UPDATE campaigns SET state = ? WHERE name = ?", (state, name)).rowcount
+
+    def remove(self, name):
+        self.conn.execute("DELETE FROM campaign_windows WHERE name = ?", (name,))
+        return self.conn.execute("DELETE FROM campaigns WHERE name = ?", (name,)).rowcount
+
+    def window_sent(self, name, opened):
+        with self._lock:
+            row = self.conn.execute("SELECT sent FROM campaign_windows WHERE name = ? AND opened = ?",
+                                    (name, opened)).fetchone()
+        return row[0] if row else 0
+
+    def add_sent(self, name, opened, count=1):
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO campaign_windows (name, opened, sent) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, opened) DO UPDATE SET sent = sent + excluded.sent",
+                (name, opened, count))
+
+
+class ListPlan:
+    """
+    一个任务的名单在时间维度上的划分: 每行所属时区，以及各时区内的发送顺序 (行号数组)。
+    只读取时区列与排序列，按快照指纹缓存在常驻进程中。
+    """
+
+    def __init__(self, campaign, snapshot, zones, order, keys, row_zones):
+        self.campaign = campaign
+        self.snapshot = snapshot
+        self.zones = zones  # 时区编号 -> tzinfo (None 为本机时区)
+        self.order = order  # 时区编号 -> array("I") 行号 (发送顺序)
+        self.keys = keys    # 行号 -> 排序键，未指定排序列时为 None
+        self.row_zones = row_zones  # 行号 -> 时区编号
+
+    @classmethod
+    def build(cls, campaign, snapshot):
+        count = len(snapshot)
+        zone_ids = array("H", bytes(2 * count))
+        zones = [campaign.zone]
+        if campaign.tz_column and campaign.tz_column in snapshot.columns:
+            ids = {}
+            row = 0
+            for values in snapshot.iter_column(campaign.tz_column):
+                for value in values:
+                    zone = parse_zone(value)
+                    if zone is not None and zone != campaign.zone:
+                        if zone not in ids:
+                            ids[zone] = len(zones)
+                            zones.append(zone)
+                        zone_ids[row] = ids[zone]
+                    row += 1
+        keys = None
+        rows = range(count)
+        if campaign.order_by and campaign.order_by in snapshot.columns:
+            keys = [_priority(v) for values in snapshot.iter_column(campaign.order_by) for v in values]
+            rows = sorted(rows, key=keys.__getitem__)  # 稳定排序: 同一优先级保持行号顺序
+        order = {z: array("I") for z in range(len(zones))}
+        for row in rows:
+            order[zone_ids[row]].append(row)
+        return cls(campaign, snapshot, zones, {z: rows for z, rows in order.items() if rows}, keys, zone_ids)
+
+    def zone_open(self, zone_id, ts):
+        return self.campaign.is_open(datetime.fromtimestamp(ts, self.zones[zone_id]))
+
+    def open_zones(self, ts, zone_ids=None):
+        return [z for z in (self.order if zone_ids is None else zone_ids) if self.zone_open(z, ts)]
+
+    def zone_closes(self, zone_id, ts):
+        """该时区当前时段的结束时刻"""
+        t = _floor(ts) + STEP
+        while self.zone_open(zone_id, t) and t < ts + HORIZON:
+            t += STEP
+        return t
+
+    def period(self, ts, zone_ids=None):
+        """包含 ts 的时段 (任一时区处于时段内的连续区间) 的 (开始, 结束)；ts 不在时段内时返回 None"""
+        zone_ids = list(self.order if zone_ids is None else zone_ids)
+        if not self.open_zones(ts, zone_ids):
+            return None
+        opened = _floor(ts)
+        while self.open_zones(opened - STEP, zone_ids) and opened > ts - HORIZON:
+            opened -= STEP
+        closes = _floor(ts) + STEP
+        while self.open_zones(closes, zone_ids) and closes < ts + HORIZON:
+            closes += STEP
+        return opened, closes
+
+    def next_open(self, ts, zone_ids=None):
+        """ts 之后最近一个时段的开始时刻，在 HORIZON 内没有时返回 None"""
+        zone_ids = list(self.order if zone_ids is None else zone_ids)
+        t = _floor(ts) + STEP
+        while t < ts + HORIZON:
+            if self.open_zones(t, zone_ids):
+                return t
+            t += STEP
+        return None
+
+    def pending_zones(self, checkpoint):
+        """还有未处理行的时区"""
+        return [z for z, rows in self.order.items() if any(row not in checkpoint for row in rows)]
+
+
+def _floor(ts):
+    return math.floor(ts / STEP) * STEP
+
+
+def _priority(value):
+    """排序键: 数字在前 (按数值)，其次文字，空值最后"""
+    if value is None or value != value or str(value).strip() == "":
+        return (2, 0, "")
+    try:
+        return (0, float(value), "")
+    except (TypeError, ValueError):
+        return (1, 0, str(value))
+
+
+class Session:
+    """
+    一个任务在当前时段内的一次发送，作为 main.main(schedule=...) 的参数。
+    rows 按时段与顺序逐行派发；发送引擎在真正发送前调用 hold，时段已结束或该行时区已出时段的行不发送、
+    留到下一个时段；main 每出一条结果调用 done，只有发送成功的行计入本时段目标
+    """
+
+    def __init__(self, board, campaign, plan, period, clock=time.time):
+        self.board = board
+        self.campaign = campaign
+        self.plan = plan
+        self.opened, self.closes = period
+        self.clock = clock
+        self.sent = board.window_sent(campaign.name, self.opened)
+        self.budget = max(0, campaign.per_window - self.sent) if campaign.per_window else None
+        self.delivered = 0      # 本次发送成功的封数
+        self._inflight = set()  # 已派发、尚未出结果的计入目标的行
+        self._lock = threading.Lock()
+        self._closes = {}
+
+    @property
+    def paced(self):
+        """是否按目标匀速发送"""
+        return self.budget is not None
+
+    def describe(self):
+        line = (f"定时任务 '{self.campaign.name}': 本时段 {_format(self.opened)} ~ {_format(self.closes)}")
+        if self.paced:
+            line += f"，目标 {self.campaign.per_window} 封 (已发 {self.sent})"
+        return line
+
+    def hold(self, index, row=None):
+        """发送引擎的 hold 回调: 时段已结束或该行的时区已出时段时返回 True (这一行不发送)"""
+        now = self.clock()
+        held = now >= self.closes or (index is not None and
+                                      not self.plan.zone_open(self.plan.row_zones[index], now))
+        if held:
+            with self._lock:
+                self._inflight.discard(index)
+        return held
+
+    def done(self, index, record):
+        """一行出结果: 发送成功的计入本时段目标，延迟 / 失败 / 跳过的不占目标"""
+        with self._lock:
+            self._inflight.discard(index)
+            if record['发送状态'] != "成功":
+                return
+            self.delivered += 1
+        if self.budget is not None:
+            self.board.add_sent(self.campaign.name, self.opened)
+
+    def rows(self, snapshot, checkpoint, preflight=None):
+        """按时段与顺序逐行产出 (行号, dict)，交给 sources.chunked(..., 1)；时段结束或达到目标时停止"""
+        if snapshot.fingerprint != self.plan.snapshot.fingerprint:
+            return iter(())
+        return snapshot.iter_rows(self._indices(checkpoint, preflight))
+
+    def _indices(self, checkpoint, preflight):
+        plan = self.plan
+        start = self.clock()
+        spacing = (self.closes - start) / self.budget if self.budget else 0.0
+        heap = []
+        positions = {}
+        refreshed = None
+        while True:
+            now = self.clock()
+            if now >= self.closes:
+                return
+            if refreshed is None or now - refreshed >= REFRESH:
+                # 新进入时段的时区加入候选
+                refreshed = now
+                for z in plan.open_zones(now):
+                    if z not in positions:
+                        positions[z] = 0
+                        self._push(heap, z, 0, now)
+            if not heap:
+                later = [z for z in plan.order if z not in positions]
+                nxt = plan.next_open(now, later) if later else None
+                if nxt is None or nxt >= self.closes:
+                    return
+                # 已在时段内的时区都发完: 等待其它时区进入时段
+                time.sleep(min(REFRESH, max(0.0, self.closes - now)))
+                refreshed = None
+                continue
+            _, z, pos = heapq.heappop(heap)
+            if not plan.zone_open(z, now):
+                del positions[z]  # 该时区时段已结束，重新进入时段时从头检查
+                continue
+            row = plan.order[z][pos]
+            if pos + 1 < len(plan.order[z]):
+                positions[z] = pos + 1
+                self._push(heap, z, pos + 1, now)
+            if row in checkpoint:
+                continue
+            if self.budget is not None and (preflight is None or preflight.verdict(row) is None):
+                if not self._reserve(row, start, spacing):
+                    return
+            yield row
+
+    def _reserve(self, row, start, spacing):
+        """
+        等到可以再派发一行计入目标的行: 已成功 + 在途的行数低于目标，且匀速时第 k 封不早于 start + k * spacing。
+        目标已完成或时段结束时返回 False
+        """
+        while True:
+            with self._lock:
+                if self.delivered >= self.budget:
+                    return False
+                used = self.delivered + len(self._inflight)
+                if used < self.budget:
+                    delay = start + used * spacing - self.clock()
+                    if delay <= 0:
+                        self._inflight.add(row)
+                        return True
+                else:
+                    # 在途的行可能延迟 / 失败，等它们出结果再决定是否补发
+                    delay = WAIT
+            remaining = self.closes - self.clock()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+
+    def _push(self, heap, z, pos, now):
+        plan = self.plan
+        row = plan.order[z][pos]
+        # 有排序列按优先级；否则时段先结束的时区先发
+        if plan.keys is not None:
+            key = plan.keys[row]
+        else:
+            key = self._closes.get(z) or self._closes.setdefault(z, plan.zone_closes(z, now))
+        heapq.heappush(heap, ((key, row), z, pos))
+
+
+def _format(ts):
+    return datetime.fromtimestamp(ts).strftime("%m-%d %H:%M")
+
+
+def load_plan(campaign, cache):
+    """打开任务名单的快照并建立 ListPlan (按指纹缓存)，名单不存在时返回 None"""
+    if not os.path.exists(campaign.source):
+        return None
+    fingerprint = file_fingerprint(campaign.source)
+    key = (campaign.name, fingerprint)
+    if key not in cache:
+        snapshot = Snapshot.open(campaign.source, campaign.source, fingerprint)
+        cache[key] = ListPlan.build(campaign, snapshot)
+    return cache[key]
+
+
+def load_progress(campaign, plan):
+    return Checkpoint.load(checkpoint_path(campaign.source), plan.snapshot.fingerprint) or \
+        Checkpoint(checkpoint_path(campaign.source), plan.snapshot.fingerprint)
+
+
+def run(path, once=False):
+    """常驻进程主循环: 时段内调用 main.main 发送，时段外空闲"""
+    import main as cli
+    cache = {}
+    retry_at = {}
+    with CampaignBoard(path) as board:
+        while True:
+            now = time.time()
+            campaigns = [c for c in board.list() if c.state == "active"]
+            if not campaigns:
+                print("📭 没有待发送的定时任务 (添加: python scheduler.py add -h)")
+                return 0
+            wake = now + MAX_SLEEP
+            ran = False
+            for campaign in campaigns:
+                if now < campaign.start_at:
+                    wake = min(wake, campaign.start_at)
+                    continue
+                if now < retry_at.get(campaign.name, 0):
+                    wake = min(wake, retry_at[campaign.name])
+                    continue
+                plan = load_plan(campaign, cache)
+                if plan is None:
+                    print(f"⚠️ 任务 '{campaign.name}' 的名单 '{campaign.source}' 不存在，跳过")
+                    continue
+                checkpoint = load_progress(campaign, plan)
+                if len(checkpoint) >= len(plan.snapshot):
+                    board.set_state(campaign.name, "done")
+                    print(f"🎉 任务 '{campaign.name}' 已全部处理")
+                    continue
+                zones = plan.pending_zones(checkpoint)
+                period = plan.period(now)
+                if period is None or not plan.open_zones(now, zones):
+                    nxt = plan.next_open(now, zones)
+                    if nxt is not None:
+                        wake = min(wake, nxt)
+                    continue
+                session = Session(board, campaign, plan, period)
+                if session.budget == 0:
+                    # 本时段目标已完成
+                    wake = min(wake, session.closes)
+                    continue
+                print(f"\n▶️ {session.describe()}")
+                sent = cli.main(source=campaign.source, schedule=session)
+                if not sent:
+                    # 没有发出任何邮件 (额度用尽 / 账号暂停 / 名单异常)，过一段时间再试
+                    retry_at[campaign.name] = time.time() + IDLE_RETRY
+                ran = True
+                break
+            if ran and not once:
+                continue
+            if not ran:
+                print(f"💤 时段外空闲，{datetime.fromtimestamp(wake).strftime(TIME_FORMAT)} 前不连接服务器")
+            if once:
+                return 0
+            time.sleep(max(1.0, wake - time.time()))
+
+
+def main(argv=None):
+    import argparse
+    import config
+    parser = argparse.ArgumentParser(description="定时任务")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="新建定时任务")
+    add.add_argument("name", help="任务名")
+    add.add_argument("--source", default=getattr(config, 'SOURCE_FILE', "main.xlsx"), help="名单文件")
+    add.add_argument("--start", help="开始时间 (YYYY-MM-DD HH:MM，按 --timezone)，默认立即开始")
+    add.add_argument("--days", default="*", help="允许发送的星期，如 mon-fri、1,3,5 (默认每天)")
+    add.add_argument("--hours", default="0-24", help="每天允许发送的时间区间，如 9-17、09:30-18:00 (默认全天)")
+    add.add_argument("--timezone", help="默认时区，如 Asia/Shanghai、+08:00 (默认本机时区)")
+    add.add_argument("--tz-column", help="名单中收件人时区所在的列 (有值时按收件人当地时间判断时段)")
+    add.add_argument("--order-by", help="排序列 (升序，如 优先级)，默认时段先结束的时区先发")
+    add.add_argument("--per-window", type=int, default=0, help="每个时段最多发送的封数，在时段内匀速发送 (0 为不设目标)")
+    sub.add_parser("list", help="查看定时任务")
+    for command, text in (("pause", "暂停"), ("resume", "恢复"), ("remove", "删除")):
+        sub.add_parser(command, help=f"{text}任务").add_argument("name")
+    run_parser = sub.add_parser("run", help="常驻运行: 时段内发送，时段外空闲")
+    run_parser.add_argument("--once", action="store_true", help="只检查 / 发送一轮后退出 (适合由 cron 调用)")
+    args = parser.parse_args(argv)
+
+    path = getattr(config, 'JOURNAL_FILE', JOURNAL_FILE)
+    if args.command == "run":
+        try:
+            return run(path, once=args.once)
+        except KeyboardInterrupt:
+            print("\n👋 已停止")
+            return 0
+
+    with CampaignBoard(path) as board:
+        if args.command == "add":
+            try:
+                days, (start_minute, end_minute) = parse_days(args.days), parse_hours(args.hours)
+                zone = parse_zone(args.timezone)
+                if args.timezone and zone is None:
+                    raise ValueError(f"无法识别的时区: {args.timezone}")
+                start_at = time.time() if not args.start else \
+                    datetime.strptime(args.start, "%Y-%m-%d %H:%M").replace(tzinfo=zone).timestamp()
+                if not os.path.exists(args.source):
+                    raise ValueError(f"未找到名单文件 '{args.source}'")
+                from sources import read_columns
+                columns = read_columns(args.source)
+                missing = [c for c in (args.tz_column, args.order_by) if c and c not in columns]
+                if missing:
+                    raise ValueError(f"名单中没有这些列: {missing}")
+                campaign = Campaign(
+                    name=args.name, source=args.source, start_at=start_at, days=days,
+                    start_minute=start_minute, end_minute=end_minute, timezone=args.timezone,
+                    tz_column=args.tz_column, order_by=args.order_by, per_window=max(0, args.per_window),
+                    state="active", created=time.time())
+                board.add(campaign)
+            except ValueError as e:
+                print(f"❌ {e}")
+                return 1
+            print(f"✅ 已添加任务 '{campaign.name}': {campaign.describe_window()}，"
+                  f"{datetime.fromtimestamp(start_at).strftime(TIME_FORMAT)} 开始"
+                  + (f"，每个时段 {campaign.per_window} 封" if campaign.per_window else ""))
+            print("👉 启动常驻进程: python scheduler.py run")
+            return 0
+        if args.command == "list":
+            campaigns = board.list()
+            if not campaigns:
+                print("📭 还没有定时任务")
+            for c in campaigns:
+                print(f"[{c.state}] {c.name}: {c.source}，{c.describe_window()}，"
+                      f"{datetime.fromtimestamp(c.start_at).strftime(TIME_FORMAT)} 开始"
+                      + (f"，每个时段 {c.per_window} 封" if c.per_window else "")
+                      + (f"，按 {c.order_by} 排序" if c.order_by else ""))
+            return 0
+        state = {"pause": "paused", "resume": "active"}.get(args.command)
+        changed = board.remove(args.name) if state is None else board.set_state(args.name, state)
+        if not changed:
+            print(f"❌ 没有任务 '{args.name}'")
+            return 1
+        print(f"✅ 任务 '{args.name}' 已{ {'pause': '暂停', 'resume': '恢复', 'remove': '删除'}[args.command] }")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
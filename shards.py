@@ -0,0 +1,338 @@
+"""
+分片发送: 把一份名单切成若干行号区间 (分片)，多个进程 / 多台机器上的 worker 通过租约认领分片，各自运行正常的发送流程
+
+分片与租约保存在发送日志库 (SQLite) 中，所有 worker 的结果写入同一个发送日志:
+    shards          名单内容摘要 + 分片号 -> [start, stop)、分片内进度、持有者与租约到期时间
+    account_leases  发件账号 -> 持有者与租约到期时间
+
+- 认领在 BEGIN IMMEDIATE 事务中进行，同一分片同一时刻只有一个持有者；
+- 持有者在后台线程中定期续约；进程崩溃后租约过期，其它 worker 从该分片已保存的进度继续
+  (与单进程中断一样，最多重复最后不足 CHECKPOINT_EVERY 封)；续约失败 (租约已被接手) 时立即停止发送；
+- 每个发件账号同一时刻只由一个 worker 使用，额度与限速仍由持有它的进程严格执行，
+  所有 worker 合起来也不会超过任何账号的上限。每个 worker 最多使用 SHARD_ACCOUNTS 个账号，
+  能同时发送的 worker 数取决于发件账号数 (多出来的 worker 认领不到账号时直接退出)。
+名单按内容摘要识别，各台机器上的名单文件只要内容相同即为同一批任务。
+多台机器共享发送日志库时，数据库须放在支持文件锁的共享目录中，并在 config.py 中设置 JOURNAL_WAL = False。
+
+    python main.py --shard          # 认领一个分片并发送 (本次数量仍受 BATCH_LIMIT 限制)
+    python shards.py work           # 循环认领分片直到全部发完 (可在多个终端 / 机器上同时运行)
+    python shards.py status         # 查看各分片进度与持有者
+    python shards.py reset          # 删除该名单的分片记录 (已发送的记录保留在发送日志中)
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from checkpoint import Checkpoint
+from journal import JOURNAL_FILE, TIME_FORMAT
+
+SHARD_SIZE = 1000
+SHARD_LEASE = 300  # 租约秒数，持有者每 1/3 租约续约一次
+SHARD_ACCOUNTS = 1  # 每个 worker 最多同时使用的发件账号数 (0 为不限)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    campaign TEXT NOT NULL,
+    shard INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    stop INTEGER NOT NULL,
+    cursor INTEGER NOT NULL,
+    done TEXT NOT NULL DEFAULT '[]',
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (campaign, shard)
+);
+CREATE TABLE IF NOT EXISTS account_leases (
+    email TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    lease_until REAL NOT NULL
+);
+"""
+
+
+def list_digest(path):
+    """名单文件的内容摘要 (不用修改时间: 复制到其它机器的同一份名单仍对应同一批分片)"""
+    h = hashlib.blake2b(digest_size=12)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class ShardBoard:
+    """分片表的一个连接 (sqlite 连接不能跨线程，续约线程另开一个)"""
+
+    def __init__(self, path=JOURNAL_FILE, owner=None, lease=SHARD_LEASE, clock=time.time):
+        self.path = path
+        self.owner = owner or worker_id()
+        self.lease = float(lease)
+        self.clock = clock
+        # 自行管理事务: 认领需要 BEGIN IMMEDIATE 拿到写锁后再查询
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, sql, args=()):
+        return self.conn.execute(sql, args).rowcount
+
+    def plan(self, campaign, total, size=SHARD_SIZE, cursor=0, done=()):
+        """
+        为名单建立分片 (已存在时不变)，返回分片数。cursor / done 为单进程模式留下的进度，
+        这些行不再分配。名单行数与已有分片不一致时抛出 ValueError。
+        """
+        size = max(1, int(size))
+        done = sorted(i for i in done if i >= cursor)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT COUNT(*), MAX(stop) FROM shards WHERE campaign = ?", (campaign,)).fetchone()
+            if row[0]:
+                if row[1] != total:
+                    raise ValueError(f"分片记录中名单为 {row[1]} 行，当前名单为 {total} 行")
+                self.conn.execute("COMMIT")
+                return row[0]
+            starts = range(cursor, total, size)
+            self.conn.executemany(
+                "INSERT INTO shards (campaign, shard, start, stop, cursor, done) VALUES (?, ?, ?, ?, ?, ?)",
+                [(campaign, n, start, min(start + size, total), start,
+                  json.dumps([i for i in done if start <= i < start + size]))
+                 for n, start in enumerate(starts)],
+            )
+            self.conn.execute("COMMIT")
+            return len(starts)
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, campaign, every=20):
+        """认领一个未完成且无人持有 (或租约已过期) 的分片，返回 ShardCheckpoint；没有可认领的返回 None"""
+        now = self.clock()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT shard, start, stop, cursor, done FROM shards "
+                "WHERE campaign = ? AND cursor < stop AND (owner IS NULL OR owner = ? OR lease_until < ?) "
+                "ORDER BY shard LIMIT 1", (campaign, self.owner, now)).fetchone()
+            if row is not None:
+                self._write("UPDATE shards SET owner = ?, lease_until = ? WHERE campaign = ? AND shard = ?",
+                            (self.owner, now + self.lease, campaign, row[0]))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        shard, start, stop, cursor, done = row
+        return ShardCheckpoint(self, campaign, shard, start, stop, cursor, json.loads(done), every=every)
+
+    def claim_accounts(self, emails, limit=SHARD_ACCOUNTS):
+        """
+        按顺序认领最多 limit 个 (0 为不限) 发件账号，返回本 worker 持有的账号集合
+        (被其它 worker 持有且租约未过期的不在其中)。
+        """
+        now = self.clock()
+        held = set()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for email in emails:
+                if limit and len(held) >= limit:
+                    break
+                if self._write(
+                        "INSERT INTO account_leases (email, owner, lease_until) VALUES (?, ?, ?) "
+                        "ON CONFLICT(email) DO UPDATE SET owner = excluded.owner, lease_until = excluded.lease_until "
+                        "WHERE account_leases.owner = excluded.owner OR account_leases.lease_until < ?",
+                        (email, self.owner, now + self.lease, now)):
+                    held.add(email)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return held
+
+    def renew(self, campaign, shard, emails):
+        """续约分片与账号，任何一项已被其它 worker 接手时返回 False"""
+        until = self.clock() + self.lease
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            ok = self._write("UPDATE shards SET lease_until = ? WHERE campaign = ? AND shard = ? AND owner = ?",
+                             (until, campaign, shard, self.owner)) == 1
+            for email in emails:
+                ok &= self._write("UPDATE account_leases SET lease_until = ? WHERE email = ? AND owner = ?",
+                                  (until, email, self.owner)) == 1
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return ok
+
+    def save(self, campaign, shard, cursor, done):
+        """保存分片进度，分片已不属于本 worker 时返回 False"""
+        return self._write(
+            "UPDATE shards SET cursor = ?, done = ? WHERE campaign = ? AND shard = ? AND owner = ?",
+            (cursor, json.dumps(sorted(done)), campaign, shard, self.owner)) == 1
+
+    def release(self, campaign, shard):
+        self._write("UPDATE shards SET owner = NULL, lease_until = 0 WHERE campaign = ? AND shard = ? AND owner = ?",
+                    (campaign, shard, self.owner))
+        self._write("DELETE FROM account_leases WHERE owner = ?", (self.owner,))
+
+    def finished(self, campaign):
+        """该名单的分片是否已全部处理完"""
+        row = self.conn.execute("SELECT COUNT(*), SUM(cursor >= stop) FROM shards WHERE campaign = ?",
+                                (campaign,)).fetchone()
+        return bool(row[0]) and row[0] == row[1]
+
+    def status(self, campaign=None):
+        """产出 (名单摘要, 分片号, start, stop, 已处理行数, 持有者, 租约到期时间戳)"""
+        sql = "SELECT campaign, shard, start, stop, cursor, done, owner, lease_until FROM shards"
+        args = ()
+        if campaign:
+            sql += " WHERE campaign = ?"
+            args = (campaign,)
+        for campaign, shard, start, stop, cursor, done, owner, lease_until in self.conn.execute(
+                sql + " ORDER BY campaign, shard", args):
+            yield campaign, shard, start, stop, cursor - start + len(json.loads(done)), owner, lease_until
+
+    def reset(self, campaign):
+        return self._write("DELETE FROM shards WHERE campaign = ?", (campaign,))
+
+
+class ShardCheckpoint(Checkpoint):
+    """
+    一个已认领的分片: 与 checkpoint.Checkpoint 用法相同 (行号、每 N 条落盘)，进度保存到分片表而不是进度文件。
+    进度保存失败 (租约已被接手) 时 lost 置位，调用方应停止发送。
+    """
+
+    def __init__(self, board, campaign, shard, start, stop, cursor, done, journal=None, every=20):
+        super().__init__(None, campaign, journal=journal, every=every, cursor=cursor, done=done)
+        self.board = board
+        self.campaign = campaign
+        self.shard = shard
+        self.start = start
+        self.stop = stop
+        self.lost = threading.Event()
+        self._heartbeat = None
+
+    def __len__(self):
+        """分片内已处理的行数"""
+        return self.cursor - self.start + len(self.done)
+
+    @property
+    def size(self):
+        return self.stop - self.start
+
+    def save(self):
+        if not self.board.save(self.campaign, self.shard, self.cursor, self.done):
+            self.lost.set()
+
+    def clear(self):
+        pass
+
+    def keep_alive(self, emails, on_lost=None):
+        """启动续约线程 (持有分片与 emails 中的账号)；续约失败时置位 lost 并调用 on_lost"""
+        self._heartbeat = _Heartbeat(self, list(emails), on_lost)
+        self._heartbeat.start()
+
+    def release(self):
+        """停止续约并释放分片与账号 (之前应已 flush 进度)"""
+        if self._heartbeat is not None:
+            self._heartbeat.stop()
+            self._heartbeat = None
+        self.board.release(self.campaign, self.shard)
+
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, lease, emails, on_lost):
+        super().__init__(daemon=True)
+        self.lease = lease
+        self.emails = emails
+        self.on_lost = on_lost
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def run(self):
+        lease = self.lease
+        board = ShardBoard(lease.board.path, lease.board.owner, lease.board.lease, lease.board.clock)
+        try:
+            while not self._stopped.wait(board.lease / 3):
+                try:
+                    ok = board.renew(lease.campaign, lease.shard, self.emails)
+                except sqlite3.Error:
+                    continue  # 数据库暂时被锁: 租约还有余量，下一轮再续
+                if not ok:
+                    lease.lost.set()
+                    if self.on_lost:
+                        self.on_lost()
+                    return
+        finally:
+            board.close()
+
+
+def main(argv=None):
+    import argparse
+    import config
+    parser = argparse.ArgumentParser(description="分片发送")
+    parser.add_argument("--source", metavar="PATH", help="名单文件，默认取 config.SOURCE_FILE 或 main.xlsx")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("work", help="循环认领分片并发送，直到没有可认领的分片")
+    sub.add_parser("status", help="查看各分片进度")
+    sub.add_parser("reset", help="删除该名单的分片记录")
+    args = parser.parse_args(argv)
+
+    if args.command == "work":
+        import main as cli
+        rounds = 0
+        while cli.main(source=args.source, shard=True):
+            rounds += 1
+        print(f"🏁 worker 结束 (共处理 {rounds} 个分片批次)")
+        return 0
+
+    source = args.source or getattr(config, 'SOURCE_FILE', "main.xlsx")
+    if not os.path.exists(source):
+        print(f"❌ 未找到名单文件 '{source}'")
+        return 1
+    campaign = list_digest(source)
+    with ShardBoard(getattr(config, 'JOURNAL_FILE', JOURNAL_FILE)) as board:
+        if args.command == "reset":
+            print(f"🗑️ 已删除 {board.reset(campaign)} 个分片记录")
+            return 0
+        rows = list(board.status(campaign))
+        if not rows:
+            print(f"'{source}' 还没有分片 (运行 python main.py --shard 时自动建立)")
+            return 0
+        now = time.time()
+        for _, shard, start, stop, processed, owner, lease_until in rows:
+            line = f"#{shard:<4} 行 {start}-{stop - 1}: {processed}/{stop - start}"
+            if owner and lease_until > now:
+                line += f"  🔒 {owner} (租约至 {datetime.fromtimestamp(lease_until).strftime(TIME_FORMAT)})"
+            elif processed >= stop - start:
+                line += "  ✅"
+            print(line)
+        total = sum(stop - start for _, _, start, stop, _, _, _ in rows)
+        print(f"📊 共 {len(rows)} 个分片，已处理 {sum(r[4] for r in rows)}/{total} 行")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
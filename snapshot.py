@@ -0,0 +1,218 @@
+"""
+名单快照: 把数据源一次性转为 JSONL + 行偏移索引，之后每批按断点游标直接 seek
+
+    <源文件>.rows.jsonl   第一行为 {"fingerprint", "columns"}，之后每行一个数据行 (值数组，空行已剔除)
+    <源文件>.rows.idx     每个数据行在 jsonl 中的字节偏移 (uint64)
+
+源文件本身不再被改写；快照按源文件指纹校验，源文件变化后自动重建。
+分批发送时启动开销只与本批行数有关，与剩余名单长度无关。
+首次发送一份新名单时用 SnapshotBuilder 边转换边产出行，第一批不必等整个文件解析完。
+"""
+import glob
+import itertools
+import json
+import os
+import threading
+from array import array
+
+from sources import iter_records, read_columns
+
+SNAPSHOT_SUFFIX = ".rows.jsonl"
+INDEX_SUFFIX = ".rows.idx"
+CHECK_SUFFIX = ".rows.check"  # validation.Preflight 的预检结果
+_OFFSET = array("Q").itemsize
+
+
+class Snapshot:
+    def __init__(self, path, fingerprint, columns, count):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.columns = columns
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def load(cls, base_path, fingerprint):
+        """打开与指纹一致的已有快照，不存在或已过期时返回 None"""
+        try:
+            with open(base_path + SNAPSHOT_SUFFIX, "rb") as f:
+                meta = json.loads(f.readline())
+            if meta.get("fingerprint") != fingerprint:
+                return None
+            count = os.path.getsize(base_path + INDEX_SUFFIX) // _OFFSET
+            os.utime(base_path + INDEX_SUFFIX)  # 记录最近使用时间，供 evict 淘汰
+        except (FileNotFoundError, ValueError):
+            return None
+        return cls(base_path, fingerprint, meta["columns"], count)
+
+    @classmethod
+    def open(cls, src, base_path, fingerprint):
+        """打开与指纹一致的快照，不存在或已过期时从 src 重建"""
+        return cls.load(base_path, fingerprint) or cls.build(src, base_path, fingerprint)
+
+    @classmethod
+    def build(cls, src, base_path, fingerprint):
+        """流式转换一遍数据源 (先写临时文件再替换)"""
+        builder = SnapshotBuilder(src, base_path, fingerprint)
+        try:
+            return builder.finish()
+        except BaseException:
+            builder.abort()
+            raise
+
+    def _offset(self, row_no):
+        with open(self.path + INDEX_SUFFIX, "rb") as f:
+            f.seek(row_no * _OFFSET)
+            offset = array("Q")
+            offset.frombytes(f.read(_OFFSET))
+            return offset[0]
+
+    def iter_records(self, start=0, skip=None):
+        """从第 start 行直接 seek 读取，逐行产出 (行号, dict)，跳过 skip 中的行"""
+        if start >= self.count:
+            return
+        columns = self.columns
+        with open(self.path + SNAPSHOT_SUFFIX, "rb") as f:
+            f.seek(self._offset(start))
+            for row_no, line in enumerate(f, start):
+                if skip is not None and row_no in skip:
+                    continue
+                yield row_no, dict(zip(columns, json.loads(line)))
+
+    def iter_rows(self, indices):
+        """按给定行号 (任意顺序，可以是惰性产出的) 逐行读取，产出 (行号, dict)"""
+        offsets = array("Q")
+        with open(self.path + INDEX_SUFFIX, "rb") as f:
+            offsets.frombytes(f.read())
+        columns = self.columns
+        with open(self.path + SNAPSHOT_SUFFIX, "rb") as f:
+            for row_no in indices:
+                f.seek(offsets[row_no])
+                yield row_no, dict(zip(columns, json.loads(f.readline())))
+
+    def iter_column(self, column, chunksize=100000):
+        """逐块产出某一列的取值列表 (每块一次 json 解码，供整列向量化处理)"""
+        pos = self.columns.index(column)
+        with open(self.path + SNAPSHOT_SUFFIX, "rb") as f:
+            f.readline()
+            while True:
+                lines = list(itertools.islice(f, chunksize))
+                if not lines:
+                    return
+                rows = json.loads(b"[" + b",".join(line.rstrip(b"\n") for line in lines) + b"]")
+                yield [row[pos] for row in rows]
+
+    def exists(self):
+        return os.path.exists(self.path + SNAPSHOT_SUFFIX) and os.path.exists(self.path + INDEX_SUFFIX)
+
+    def page(self, start, count):
+        """读取 [start, start + count) 行，返回 [(行号, dict), ...]"""
+        return list(itertools.islice(self.iter_records(start), count))
+
+    def remove(self):
+        for suffix in (SNAPSHOT_SUFFIX, INDEX_SUFFIX, CHECK_SUFFIX):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+class SnapshotBuilder:
+    """
+    边转换边产出行: rows() 按快照行号逐行产出 (行号, dict)，同时写入快照；
+    finish() 转换剩余的行并替换为正式快照，返回 Snapshot。
+    产出的行经过与快照相同的 JSON 编码，与之后从快照读出的完全一致。
+    rows() 可以在发送引擎的派发线程中消费，finish() 在调用方线程中调用: 逐行转换在锁内进行，
+    finish() 之后 rows() 不再产出 (已转换但未取走的行留给下一次运行)。
+    """
+
+    def __init__(self, src, base_path, fingerprint):
+        self.base_path = base_path
+        self.fingerprint = fingerprint
+        self.columns = read_columns(src)
+        self.count = 0
+        # 临时文件名带进程号: 多个分片 worker 同时首次打开同一份名单时互不干扰
+        self._data_tmp = f"{base_path}{SNAPSHOT_SUFFIX}.{os.getpid()}.tmp"
+        self._index_tmp = f"{base_path}{INDEX_SUFFIX}.{os.getpid()}.tmp"
+        self._data = open(self._data_tmp, "wb")
+        self._index = open(self._index_tmp, "wb")
+        self._data.write(json.dumps({"fingerprint": fingerprint, "columns": self.columns},
+                                    ensure_ascii=False).encode("utf-8") + b"\n")
+        self._offsets = array("Q")
+        self._records = iter_records(src)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _next(self, decode=True):
+        """转换下一行，返回 (行号, dict) (decode=False 时 dict 为 None)；已转换完或已结束时返回 None"""
+        with self._lock:
+            if self._closed:
+                return None
+            try:
+                _, row = next(self._records)
+            except StopIteration:
+                return None
+            self._offsets.append(self._data.tell())
+            line = json.dumps([row.get(c) for c in self.columns], ensure_ascii=False, default=str)
+            self._data.write(line.encode("utf-8") + b"\n")
+            if len(self._offsets) >= 65536:
+                self._offsets.tofile(self._index)
+                del self._offsets[:]
+            row_no = self.count
+            self.count += 1
+        return row_no, dict(zip(self.columns, json.loads(line))) if decode else None
+
+    def rows(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            yield item
+
+    def finish(self):
+        while self._next(decode=False) is not None:
+            pass
+        with self._lock:
+            self._closed = True
+            self._offsets.tofile(self._index)
+            self._index.close()
+            self._data.close()
+            self._records.close()
+            os.replace(self._index_tmp, self.base_path + INDEX_SUFFIX)
+            os.replace(self._data_tmp, self.base_path + SNAPSHOT_SUFFIX)
+        return Snapshot(self.base_path, self.fingerprint, self.columns, self.count)
+
+    def abort(self):
+        """放弃转换 (读取出错时)，删除临时文件"""
+        with self._lock:
+            self._closed = True
+            self._index.close()
+            self._data.close()
+            self._records.close()
+            for path in (self._index_tmp, self._data_tmp):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def evict(directory, keep, protect=()):
+    """
+    目录中的快照超过 keep 份时按最近使用时间淘汰最旧的；
+    有进度文件 (<名称>.json，未发完) 或在 protect 中的不淘汰。返回删除的份数。
+    """
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, "*" + INDEX_SUFFIX)):
+        base = path[:-len(INDEX_SUFFIX)]
+        name = os.path.basename(base)
+        if name in protect or os.path.exists(base + ".json"):
+            continue
+        snapshots.append((os.path.getmtime(path), base))
+    snapshots.sort(reverse=True)
+    removed = 0
+    for _, base in snapshots[keep:]:
+        Snapshot(base, None, [], 0).remove()
+        removed += 1
+    return removed
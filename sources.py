@@ -0,0 +1,173 @@
+"""
+收件人数据源: 按块流式读取，不把整个名单载入内存
+
+支持 .xlsx (openpyxl 只读模式)、.csv、.jsonl (每行一个 JSON 对象) 与 .parquet (需要 pyarrow)。
+csv / jsonl 只用标准库读取，小批量的定时任务不必加载 openpyxl / pandas。
+每行产出 (行号, dict)，行号为数据行从 0 开始的位置 (不含表头)，与断点进度对应。
+src 可以是文件路径，也可以是带 name 属性的文件对象 (如网页上传的文件)。
+"""
+import csv
+import io
+import itertools
+import json
+import os
+
+DEFAULT_CHUNKSIZE = 5000
+
+
+def source_format(src):
+    name = src if isinstance(src, str) else getattr(src, "name", "")
+    ext = os.path.splitext(name)[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        return "xlsx"
+    if ext in (".csv", ".txt"):
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    raise ValueError(f"不支持的文件格式: {name}")
+
+
+def _rewind(src):
+    if hasattr(src, "seek"):
+        src.seek(0)
+    return src
+
+
+def _header(values):
+    # 与 pandas 一致: 空表头记为 Unnamed: n
+    return [str(v).strip() if v is not None else f"Unnamed: {i}" for i, v in enumerate(values)]
+
+
+def _iter_xlsx(src):
+    from openpyxl import load_workbook
+    wb = load_workbook(_rewind(src), read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _header(header)
+        yield columns
+        width = len(columns)
+        for values in rows:
+            if all(v is None for v in values):
+                yield None
+                continue
+            yield dict(zip(columns, itertools.chain(values[:width], itertools.repeat(None))))
+    finally:
+        wb.close()
+
+
+def _open_text(src):
+    if isinstance(src, str):
+        return open(src, "r", encoding="utf-8-sig", newline="")
+    data = _rewind(src)
+    if isinstance(data, io.TextIOBase):
+        return data
+    return io.TextIOWrapper(data, encoding="utf-8-sig", newline="")
+
+
+def _iter_csv(src):
+    f = _open_text(src)
+    try:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = _header(header)
+        yield columns
+        for values in reader:
+            if not any(values):
+                yield None
+                continue
+            yield {col: (val if val != "" else None) for col, val in zip(columns, values)}
+    finally:
+        if isinstance(src, str):
+            f.close()
+        elif isinstance(f, io.TextIOWrapper) and f is not src:
+            f.detach()
+
+
+def _iter_jsonl(src):
+    # 列取第一条记录的键 (后面的记录多出的键仍保留在行中，可被模板引用)
+    f = _open_text(src)
+    try:
+        columns = None
+        pending = 0  # 第一条记录之前的空行
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                if columns is None:
+                    pending += 1
+                else:
+                    yield None
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"第 {line_no} 行不是有效的 JSON: {e}")
+            if not isinstance(row, dict):
+                raise ValueError(f"第 {line_no} 行不是 JSON 对象")
+            if columns is None:
+                columns = [str(k).strip() for k in row]
+                yield columns
+                yield from itertools.repeat(None, pending)
+            yield {str(k).strip(): (None if v == "" else v) for k, v in row.items()}
+    finally:
+        if isinstance(src, str):
+            f.close()
+        elif isinstance(f, io.TextIOWrapper) and f is not src:
+            f.detach()
+
+
+def _iter_parquet(src):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("读取 Parquet 需要安装 pyarrow: pip install pyarrow")
+    pf = pq.ParquetFile(_rewind(src))
+    yield list(pf.schema_arrow.names)
+    for batch in pf.iter_batches(batch_size=DEFAULT_CHUNKSIZE):
+        yield from batch.to_pylist()
+
+
+_READERS = {"xlsx": _iter_xlsx, "csv": _iter_csv, "jsonl": _iter_jsonl, "parquet": _iter_parquet}
+
+
+def _iter_raw(src):
+    return _READERS[source_format(src)](src)
+
+
+def read_columns(src):
+    """只读取表头"""
+    raw = _iter_raw(src)
+    try:
+        return next(raw, [])
+    finally:
+        raw.close()
+
+
+def iter_records(src, skip=None):
+    """逐行产出 (行号, dict)；skip 为需要跳过的行号集合 (支持 in 判断，如断点进度)"""
+    raw = _iter_raw(src)
+    try:
+        next(raw, None)  # 表头
+        for index, row in enumerate(raw):
+            if row is None or (skip is not None and index in skip):
+                continue
+            yield index, row
+    finally:
+        raw.close()
+
+
+def chunked(records, chunksize=DEFAULT_CHUNKSIZE, limit=None):
+    """把 (行号, dict) 流切成块"""
+    if limit is not None:
+        records = itertools.islice(records, limit)
+    while True:
+        chunk = list(itertools.islice(records, chunksize))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,172 @@
+"""
+报文预构建 (spool): 用进程池把邮件渲染并序列化成 .eml 文件，发送线程只负责把现成的字节流交给 SMTP 连接
+
+两段流水线:
+    构建  worker 进程按块渲染模板、用 builder.MessageBuilder 拼出报文，写入 spool/<名单指纹>-<模板摘要>/<行号>.eml
+    发送  发送引擎读取 .eml，补上 From 头 (多账号时按连接所属账号) 后直接 sendmail
+构建在进程池中提前若干块进行，与发送同时运行；已构建过的行 (dry run 或上一次运行留下的) 直接复用。
+模板、主题或附件改动后摘要随之变化，旧的报文不会被误用。
+
+    python main.py --dry-run        # 只构建本批报文，不连接服务器，可在 spool 目录中逐封检查
+    python spool.py show 12         # 打印第 12 行的预构建报文
+    python spool.py clear           # 删除全部预构建报文
+"""
+import hashlib
+import os
+import shutil
+import sys
+import time
+from collections import deque
+from email.utils import formataddr
+
+from templating import Template, get_recipient, is_missing
+
+SPOOL_DIR = "spool"
+BUILD_CHUNK = 500  # 每个进程任务的行数: 越小首封发出越早，越大进程间通信越省
+PREFETCH = 4       # 每个进程最多提前排队的块数
+
+_worker = {}
+
+
+def compose(row, body, builder):
+    """构造不含 From 头的报文字节 (From 在发送时按账号补上)；缺少收件人时返回 None"""
+    recipient = get_recipient(row)
+    if not recipient or is_missing(recipient):
+        return None
+    return builder.build(row, str(recipient).strip(), body)
+
+
+def from_header(name, email):
+    return f"From: {formataddr((name, email))}\r\n".encode("ascii")
+
+
+def _init_worker(content, builder, directory):
+    # 附件等公共部分随 builder 传入，每个进程只接收一次
+    _worker.update(template=Template(content), builder=builder, directory=directory)
+
+
+def _build_chunk(chunk):
+    """worker 进程: 渲染并写出一块报文 (已存在的跳过)，返回 (各行文件名或 None, 新写入字节数)"""
+    directory = _worker["directory"]
+    names = [f"{index}.eml" for index, _ in chunk]
+    todo = [i for i, name in enumerate(names) if not os.path.exists(os.path.join(directory, name))]
+    written = 0
+    if todo:
+        rows = [chunk[i][1] for i in todo]
+        for i, row, body in zip(todo, rows, _worker["template"].render_records(rows)):
+            data = compose(row, body, _worker["builder"])
+            if data is None:
+                names[i] = None
+                continue
+            path = os.path.join(directory, names[i])
+            # 先写临时文件再改名: 进程被中断时不会留下半个报文供下次复用
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            written += len(data)
+    return names, written
+
+
+class Spool:
+    """一份名单 + 一套模板 / 主题 / 附件对应的预构建报文目录"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.written = 0
+
+    @classmethod
+    def for_list(cls, base_dir, fingerprint, template, builder):
+        key = hashlib.blake2b(f"{template.content}\0{builder.digest}".encode("utf-8"), digest_size=6).hexdigest()
+        return cls(os.path.join(base_dir, f"{fingerprint}-{key}"))
+
+    def exists(self):
+        return os.path.isdir(self.directory)
+
+    def path(self, index):
+        return os.path.join(self.directory, f"{index}.eml")
+
+    def iter_build(self, chunks, template, builder, workers=None, metrics=None):
+        """
+        在进程池中构建 chunks (sources.chunked 的输出) 的报文，按输入顺序逐行产出 (index, row, 报文路径)，
+        可直接作为发送任务；缺少收件人的行路径为 None。metrics 记录发送端等待构建的时间 (render 阶段)。
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        os.makedirs(self.directory, exist_ok=True)
+        workers = max(1, int(workers or os.cpu_count() or 1))
+        pieces = (chunk[i:i + BUILD_CHUNK] for chunk in chunks for i in range(0, len(chunk), BUILD_CHUNK))
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                   initargs=(template.content, builder, self.directory))
+        pending = deque()
+        try:
+            for piece in pieces:
+                pending.append((piece, pool.submit(_build_chunk, piece)))
+                if len(pending) >= workers * PREFETCH:
+                    yield from self._collect(*pending.popleft(), metrics)
+            while pending:
+                yield from self._collect(*pending.popleft(), metrics)
+        finally:
+            # 发送提前结束 (额度用尽 / 中断) 时丢弃尚未开始的构建
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _collect(self, piece, future, metrics):
+        start = time.perf_counter()
+        names, written = future.result()
+        if metrics:
+            metrics.observe("render", time.perf_counter() - start)
+        self.written += written
+        for (index, row), name in zip(piece, names):
+            yield index, row, name and os.path.join(self.directory, name)
+
+    def build(self, chunks, template, builder, workers=None):
+        """只构建不发送 (dry run)，返回 (报文数, 缺少收件人的行数)"""
+        built = missing = 0
+        for _, _, path in self.iter_build(chunks, template, builder, workers):
+            if path is None:
+                missing += 1
+            else:
+                built += 1
+        return built, missing
+
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def main(argv=None):
+    import argparse
+    import email
+    import email.policy
+    import config
+    parser = argparse.ArgumentParser(description="预构建报文管理")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="打印某一行的预构建报文")
+    show.add_argument("index", type=int, help="名单行号 (从 0 开始)")
+    sub.add_parser("clear", help="删除全部预构建报文")
+    args = parser.parse_args(argv)
+
+    base_dir = getattr(config, 'SPOOL_DIR', SPOOL_DIR)
+    if args.command == "clear":
+        shutil.rmtree(base_dir, ignore_errors=True)
+        print(f"🗑️ 已清空 '{base_dir}'")
+        return 0
+    paths = [os.path.join(base_dir, d, f"{args.index}.eml")
+             for d in (os.listdir(base_dir) if os.path.isdir(base_dir) else ())]
+    paths = sorted((p for p in paths if os.path.exists(p)), key=os.path.getmtime)
+    if not paths:
+        print(f"❌ 第 {args.index} 行没有预构建报文 (先运行 python main.py --dry-run)")
+        return 1
+    with open(paths[-1], "rb") as f:
+        msg = email.message_from_bytes(from_header(config.SENDER_NAME, config.SENDER_EMAIL) + f.read(),
+                                       policy=email.policy.default)
+    print(f"📄 {paths[-1]}")
+    for key, value in msg.items():
+        print(f"{key}: {value}")
+    print()
+    for part in msg.walk():
+        if not part.is_multipart():
+            print(part.get_content())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+收件人去重 / 屏蔽索引: 已发送、退信、退订的地址，发送前查询，发送后更新
+
+每类地址存为一组 64 位哈希 (地址先规范化为去空格小写):
+    <目录>/<类别>.idx   已排序的 uint64 数组，mmap 打开后二分查找，启动开销与总量无关
+    <目录>/<类别>.log   新增哈希的追加日志，启动时读入内存，超过阈值自动合并进 .idx
+
+64 位哈希在千万级地址下的碰撞概率约为 1e-6 量级，可视为精确判断。
+
+    python suppression.py add unsubscribe a@example.com b@example.com
+    python suppression.py import bounce bounces.csv
+    python suppression.py check a@example.com
+    python suppression.py compact
+"""
+import bisect
+import hashlib
+import heapq
+import mmap
+import os
+from array import array
+
+from templating import is_missing
+
+SUPPRESSION_DIR = "suppression"
+KINDS = ("sent", "bounce", "unsubscribe")
+REASONS = {"sent": "已发送过", "bounce": "曾退信", "unsubscribe": "已退订", "duplicate": "名单内重复"}
+COMPACT_THRESHOLD = 100000
+
+
+def normalize_address(addr):
+    """规范化邮箱地址 (去空格、小写)，无效值返回 None"""
+    if is_missing(addr):
+        return None
+    addr = str(addr).strip().lower()
+    return addr or None
+
+
+def address_key(addr):
+    """规范化地址的 64 位哈希"""
+    return int.from_bytes(hashlib.blake2b(addr.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashSet:
+    """单个类别的磁盘哈希集合 (排序数组 + 追加日志)"""
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self._file = self._map = self._view = None
+        self._sorted = memoryview(b"").cast("Q")
+        self._open_sorted()
+        self.recent = set()
+        try:
+            with open(base_path + ".log", "rb") as f:
+                logged = array("Q")
+                logged.frombytes(f.read())
+                self.recent.update(logged)
+        except FileNotFoundError:
+            pass
+        self._log = open(base_path + ".log", "ab")
+        self._dirty = False
+
+    def _open_sorted(self):
+        path = self.base_path + ".idx"
+        if os.path.exists(path) and os.path.getsize(path):
+            self._file = open(path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+            self._sorted = self._view.cast("Q")
+
+    def _close_sorted(self):
+        self._sorted.release()
+        self._sorted = memoryview(b"").cast("Q")
+        if self._map is not None:
+            self._view.release()
+            self._map.close()
+            self._file.close()
+            self._file = self._map = self._view = None
+
+    def __len__(self):
+        return len(self._sorted) + len(self.recent)
+
+    def __contains__(self, key):
+        if key in self.recent:
+            return True
+        i = bisect.bisect_left(self._sorted, key)
+        return i < len(self._sorted) and self._sorted[i] == key
+
+    def add(self, key):
+        if key in self:
+            return
+        self.recent.add(key)
+        self._log.write(array("Q", [key]).tobytes())
+        self._dirty = True
+
+    def flush(self):
+        """追加日志落盘 (没有新增时不做 fsync)"""
+        if not self._dirty:
+            return
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._dirty = False
+
+    def compact(self):
+        """把追加日志合并进排序数组 (写临时文件后替换)"""
+        self.flush()
+        if not self.recent:
+            return
+        tmp = self.base_path + ".idx.tmp"
+        with open(tmp, "wb") as f:
+            # 两个有序序列归并，逐块写出，不在内存中展开整个索引
+            block = array("Q")
+            last = None
+            for key in heapq.merge(self._sorted, sorted(self.recent)):
+                if key != last:
+                    block.append(key)
+                    last = key
+                    if len(block) >= 65536:
+                        block.tofile(f)
+                        del block[:]
+            block.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        self._close_sorted()
+        os.replace(tmp, self.base_path + ".idx")
+        self._log.close()
+        self._log = open(self.base_path + ".log", "wb")
+        self.recent = set()
+        self._open_sorted()
+
+    def close(self, compact=True):
+        self.flush()
+        if compact and len(self.recent) >= COMPACT_THRESHOLD:
+            self.compact()
+        self._log.close()
+        self._close_sorted()
+
+
+class Suppression:
+    """
+    发送前筛查: check() 返回跳过原因 (None 表示可以发送)，同时拦截名单内的重复地址。
+    kinds 为参与筛查的类别，去掉 "sent" 即允许给以前发过的地址再发一轮新通知。
+    """
+
+    def __init__(self, directory=SUPPRESSION_DIR, kinds=KINDS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.sets = {kind: HashSet(os.path.join(directory, kind)) for kind in KINDS}
+        self.kinds = tuple(kinds)
+        self._seen = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, addr):
+        """地址所属的类别 (不含名单内去重)"""
+        addr = normalize_address(addr)
+        if not addr:
+            return None
+        key = address_key(addr)
+        for kind in KINDS:
+            if key in self.sets[kind]:
+                return kind
+        return None
+
+    def check(self, addr):
+        addr = normalize_address(addr)
+        if not addr:
+            return None  # 无效地址交给后续环节报错
+        key = address_key(addr)
+        for kind in self.kinds:
+            if key in self.sets[kind]:
+                return REASONS[kind]
+        if key in self._seen:
+            return REASONS["duplicate"]
+        self._seen.add(key)
+        return None
+
+    def add(self, kind, addr):
+        addr = normalize_address(addr)
+        if addr:
+            self.sets[kind].add(address_key(addr))
+
+    def flush(self):
+        """各类别的追加日志落盘；随发送进度一起调用 (见 checkpoint.Checkpoint.suppression)"""
+        for hash_set in self.sets.values():
+            hash_set.flush()
+
+    def compact(self):
+        for hash_set in self.sets.values():
+            hash_set.compact()
+
+    def close(self, compact=True):
+        """compact: 追加日志超过阈值时合并进索引 (有其它进程同时写入时应为 False)"""
+        for hash_set in self.sets.values():
+            hash_set.close(compact)
+
+
+def open_suppression(directory=SUPPRESSION_DIR, kinds=KINDS, journal=None):
+    """打开索引；首次创建时用发送日志中的成功记录初始化 "已发送" 类别"""
+    fresh = not os.path.exists(os.path.join(directory, "sent.log"))
+    suppression = Suppression(directory, kinds)
+    if fresh and journal is not None:
+        for (recipient,) in journal.conn.execute("SELECT recipient FROM sends WHERE status = '成功'"):
+            suppression.add("sent", recipient)
+        suppression.sets["sent"].compact()
+    return suppression
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="收件人去重 / 屏蔽索引")
+    parser.add_argument("--dir", default=SUPPRESSION_DIR, help="索引目录")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_add = sub.add_parser("add", help="添加地址")
+    p_add.add_argument("kind", choices=KINDS)
+    p_add.add_argument("addresses", nargs="+")
+    p_import = sub.add_parser("import", help="从名单文件 (.xlsx/.csv) 的邮箱列批量导入")
+    p_import.add_argument("kind", choices=KINDS)
+    p_import.add_argument("path")
+    p_check = sub.add_parser("check", help="查询地址")
+    p_check.add_argument("addresses", nargs="+")
+    sub.add_parser("compact", help="合并追加日志")
+    args = parser.parse_args()
+
+    with Suppression(args.dir) as suppression:
+        if args.command == "add":
+            for addr in args.addresses:
+                suppression.add(args.kind, addr)
+            print(f"✅ 已添加 {len(args.addresses)} 个地址至 '{args.kind}'")
+        elif args.command == "import":
+            from templating import get_recipient
+            from sources import iter_records
+            count = 0
+            for _, row in iter_records(args.path):
+                suppression.add(args.kind, get_recipient(row))
+                count += 1
+            print(f"✅ 已导入 {count} 个地址至 '{args.kind}'")
+        elif args.command == "check":
+            for addr in args.addresses:
+                print(f"{addr}: {suppression.lookup(addr) or '无记录'}")
+        else:
+            suppression.compact()
+            print("✅ 已合并: " + ", ".join(f"{k} {len(s)}" for k, s in suppression.sets.items()))
+
+
+if __name__ == "__main__":
+    main()
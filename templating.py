@@ -0,0 +1,85 @@
+"""
+邮件模板引擎: 模板只解析一次，按列批量渲染
+
+模板文本按 {列名} 切分为 "文字段 / 变量段"，渲染时不再逐个占位符 str.replace。
+名单从快照中逐块读出 dict 行，render_records 按列批量转换取值，再用一个格式串按行拼接。
+"""
+import re
+
+PLACEHOLDER = re.compile(r'\{(.*?)\}')
+
+
+def is_missing(val):
+    """等价于 pd.isna 的标量判断 (None / NaN / NaT / NA)，不依赖 pandas"""
+    if val is None:
+        return True
+    try:
+        return bool(val != val)
+    except TypeError:
+        return True
+
+
+def get_recipient(row):
+    """收件人地址列 (邮箱 / Email / email)"""
+    return row.get('邮箱') or row.get('Email') or row.get('email')
+
+
+def smart_str(val):
+    """智能转换字符串，处理 123.0 这种情况"""
+    if is_missing(val):
+        return ""
+    if isinstance(val, float):
+        # 如果是整数浮点数 (如 123.0)，转为整数
+        if val.is_integer():
+            return str(int(val))
+    return str(val).strip()
+
+
+class Template:
+    """预编译模板"""
+
+    def __init__(self, content, escape=None):
+        """escape: 可选的取值转义函数 (如 HTML 模板用 html.escape)"""
+        self.content = content
+        self.escape = escape
+        parts = PLACEHOLDER.split(content)
+        self.literals = parts[0::2]
+        self.fields = parts[1::2]
+        self.placeholders = set(self.fields)
+        # 批量拼接用的格式串: 文字段中的 % 需要转义
+        self._format = "%s".join(lit.replace("%", "%%") for lit in self.literals)
+
+    def missing_columns(self, columns):
+        columns = set(columns)
+        return [p for p in self.placeholders if p not in columns]
+
+    def _escaped(self, values):
+        return [self.escape(v) for v in values] if self.escape else values
+
+    def render(self, row):
+        """渲染单行 (row 为 dict / Series)"""
+        if not self.fields:
+            return self.content
+        values = (smart_str(row.get(key)) for key in self.fields)
+        if self.escape:
+            values = map(self.escape, values)
+        return self._format % tuple(values)
+
+    def render_records(self, rows):
+        """按列渲染一组 dict 行 (流式读取时使用，不构造 DataFrame)"""
+        if not self.fields:
+            return [self.content] * len(rows)
+        converted = {key: self._escaped([smart_str(row.get(key)) for row in rows]) for key in self.placeholders}
+        fmt = self._format
+        return [fmt % values for values in zip(*(converted[key] for key in self.fields))]
+
+    def iter_render_chunks(self, chunks, metrics=None):
+        """逐块渲染 sources.chunked 的输出，逐行产出 (index, row, body)；metrics 记录渲染耗时"""
+        for chunk in chunks:
+            if metrics:
+                with metrics.phase("render"):
+                    bodies = self.render_records([row for _, row in chunk])
+            else:
+                bodies = self.render_records([row for _, row in chunk])
+            for (index, row), body in zip(chunk, bodies):
+                yield index, row, body
@@ -0,0 +1,41 @@
+import email
+import email.policy
+import re
+
+from builder import MessageBuilder, UNDISCLOSED_RECIPIENTS
+from spool import compose, from_header
+
+BARE_LF = re.compile(rb"(?<!\r)\n")
+BARE_CR = re.compile(rb"\r(?!\n)")
+
+
+def make_builder(tmp_path, html=True):
+    text = tmp_path / "说明.txt"
+    text.write_text("第一行\n第二行\n" * 20, encoding="utf-8")
+    blob = tmp_path / "data.bin"
+    blob.write_bytes(bytes(range(256)) * 40)
+    return MessageBuilder("中文主题" * 20, "<p>{姓名}</p>" if html else None, [str(text), str(blob)])
+
+
+def assert_crlf(data):
+    assert BARE_LF.search(data) is None
+    assert BARE_CR.search(data) is None
+
+
+def test_build_uses_crlf(tmp_path):
+    builder = make_builder(tmp_path)
+    data = builder.build({"姓名": "张三"}, "张三 <a@example.com>", "你好\n" * 200, ("发件人", "s@example.com"))
+    assert_crlf(data)
+    msg = email.message_from_bytes(data, policy=email.policy.default)
+    assert msg["Subject"] == "中文主题" * 20
+    assert msg.get_body(("html",)).get_content() == "<p>张三</p>"
+    assert msg.get_body(("plain",)).get_content().replace("\r\n", "\n") == "你好\n" * 200
+    names = [part.get_filename() for part in msg.iter_attachments()]
+    assert names == ["说明.txt", "data.bin"]
+
+
+def test_plain_group_and_spool_messages_use_crlf(tmp_path):
+    builder = make_builder(tmp_path, html=False)
+    assert_crlf(builder.build({}, UNDISCLOSED_RECIPIENTS, "正文", ("发件人", "s@example.com")))
+    data = compose({"邮箱": "a@example.com"}, "正文", builder)
+    assert_crlf(from_header("发件人", "s@example.com") + data)
@@ -0,0 +1,50 @@
+import json
+
+from checkpoint import Checkpoint, checkpoint_path, file_fingerprint
+
+
+class FakeJournal:
+    def __init__(self):
+        self.batches = []
+
+    def append(self, records):
+        self.batches.append(list(records))
+
+
+def test_cursor_advances_over_out_of_order_rows(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "list.progress.json"), "fp")
+    for index in (2, 0, 4):
+        checkpoint.mark(index)
+    assert (checkpoint.cursor, checkpoint.done) == (1, {2, 4})
+    assert [i for i in range(6) if i in checkpoint] == [0, 2, 4]
+    checkpoint.mark(1)
+    assert (checkpoint.cursor, checkpoint.done) == (3, {4})
+    assert len(checkpoint) == 4
+
+
+def test_flush_writes_journal_before_progress_every_n_records(tmp_path):
+    path = str(tmp_path / "list.progress.json")
+    journal = FakeJournal()
+    checkpoint = Checkpoint(path, "fp", journal=journal, every=2)
+    checkpoint.record(1, {"邮箱": "b@example.com"})
+    assert journal.batches == [] and not (tmp_path / "list.progress.json").exists()
+    checkpoint.record(None, {"邮箱": "retry@example.com"})  # 重试记录: 只写日志，不占行号
+    assert [len(batch) for batch in journal.batches] == [2]
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"fingerprint": "fp", "cursor": 0, "done": [1]}
+
+    resumed = Checkpoint.load(path, "fp")
+    assert 1 in resumed and 0 not in resumed
+
+
+def test_progress_for_a_changed_source_is_refused(tmp_path):
+    source = tmp_path / "list.csv"
+    source.write_text("邮箱\na@example.com\n", encoding="utf-8")
+    path = checkpoint_path(str(source))
+    Checkpoint(path, file_fingerprint(str(source)), cursor=1).save()
+    assert Checkpoint.load(path, file_fingerprint(str(source))).cursor == 1
+
+    source.write_text("邮箱\nb@example.com\nc@example.com\n", encoding="utf-8")
+    # 行号已不可信: 指纹不一致时不返回旧进度
+    assert Checkpoint.load(path, file_fingerprint(str(source))) is None
+    assert Checkpoint.load(str(tmp_path / "missing.json"), "fp") is None
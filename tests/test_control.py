@@ -0,0 +1,51 @@
+import smtplib
+
+from control import AIMDController
+from engine import SendEngine
+from metrics import Metrics
+from ratelimit import RateLimiter
+
+
+class FakeServer:
+    def quit(self):
+        pass
+
+
+def run(send, rows=20):
+    metrics = Metrics()
+    control = AIMDController(metrics)
+    limiter = RateLimiter(per_second=1000)
+    engine = SendEngine(connect=FakeServer, send=send, pool_size=2, limiter=limiter, metrics=metrics,
+                        control=control, keepalive=0)
+    engine.run((i, {"邮箱": f"u{i}@example.com"}, "") for i in range(rows))
+    engine.close()
+    return metrics.events.get("control", []), limiter
+
+
+def test_recipient_greylisting_is_not_congestion():
+    def send(server, row, body):
+        if row["邮箱"].startswith("u1"):
+            raise smtplib.SMTPRecipientsRefused({row["邮箱"]: (450, b"4.2.0 Greylisted, please try again later")})
+        return True, "OK"
+
+    events, limiter = run(send)
+    assert events == []
+    assert limiter.scale == 1.0
+
+
+def test_sender_throttling_halves_the_window():
+    def send(server, row, body):
+        raise smtplib.SMTPResponseException(451, "4.7.1 Rate limit exceeded, slow down")
+
+    events, limiter = run(send)
+    assert [e["action"] for e in events] == ["decrease"]
+    assert limiter.scale == 0.5
+
+
+def test_transaction_level_4xx_is_congestion():
+    def send(server, row, body):
+        raise smtplib.SMTPDataError(451, b"4.3.2 server busy")
+
+    events, limiter = run(send)
+    assert events and events[0]["action"] == "decrease"
+    assert limiter.scale < 1.0
@@ -0,0 +1,32 @@
+import smtplib
+
+import pytest
+
+from engine import QUOTA_COOLDOWN, THROTTLE_COOLDOWN, throttle_cooldown
+
+
+@pytest.mark.parametrize("code, text, expected", [
+    (421, "4.7.0 Try again later, closing connection.", THROTTLE_COOLDOWN),
+    (451, "4.7.1 Rate limit exceeded, slow down", THROTTLE_COOLDOWN),
+    (450, "Requested action aborted: frequency limited", THROTTLE_COOLDOWN),
+    (550, "5.4.5 Daily user sending quota exceeded.", QUOTA_COOLDOWN),
+    (554, "5.2.0 STOREDRV.Submission.Exception:SubmissionQuotaExceededException", QUOTA_COOLDOWN),
+    # 报文 / 收件人的问题: 不暂停发件账号
+    (552, "5.3.4 Message size exceeds fixed limit", None),
+    (552, "5.2.3 Your message exceeded Google's message size limits.", None),
+    (550, "5.2.2 The email account that you tried to reach is over quota.", None),
+    (452, "4.2.2 The email account that you tried to reach is over quota.", None),
+    (450, "4.2.1 The user you are trying to contact is receiving mail at a rate that prevents additional messages", None),
+    (450, "4.7.1 Greylisted, please try again later", None),
+    (550, "5.1.1 User unknown", None),
+])
+def test_throttle_cooldown(code, text, expected):
+    assert throttle_cooldown(smtplib.SMTPResponseException(code, text)) == expected
+
+
+def test_refused_recipients_over_quota_do_not_pause_sender():
+    exc = smtplib.SMTPRecipientsRefused({
+        "a@example.com": (552, b"5.2.2 mailbox full, over quota"),
+        "b@example.com": (550, b"5.1.1 user unknown"),
+    })
+    assert throttle_cooldown(exc) is None
@@ -0,0 +1,89 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import jobs
+import suppression
+from jobs import JobManager, SendJob
+from journal import Journal
+from ratelimit import RateLimiter
+from suppression import Suppression
+
+
+def submit_args(digest, limiter):
+    return dict(name="list.csv", snapshot=None, progress_path="list.progress.json", digest=digest, template=None,
+                subject="通知", sender=("发件人", "s@example.com", "secret"),
+                settings=dict(batch_limit=0, pool_size=1, suppress_sent=True), limiter=limiter)
+
+
+def test_concurrent_submits_of_one_list_start_one_job(monkeypatch):
+    monkeypatch.setattr(SendJob, "start", lambda self: self)
+    manager = JobManager()
+    limiter = RateLimiter()
+    barrier = threading.Barrier(8)
+    started = []
+
+    def submit():
+        barrier.wait()
+        started.append(manager.submit(**submit_args("digest", limiter)))
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len([job for job in started if job is not None]) == 1
+
+
+def test_jobs_of_one_sender_share_the_adaptive_window(monkeypatch, tmp_path):
+    monkeypatch.setattr(SendJob, "start", lambda self: self)
+    monkeypatch.setattr(jobs.config, "JOURNAL_FILE", str(tmp_path / "journal.db"), raising=False)
+    monkeypatch.setattr(jobs.config, "ADAPTIVE_CONTROL", True, raising=False)
+    manager = JobManager()
+    limiter = manager.limiter_for("s@example.com", dict(per_minute=60))
+    first = manager.submit(**submit_args("a", limiter))
+    second = manager.submit(**submit_args("b", manager.limiter_for("s@example.com", dict(per_minute=60))))
+    assert second.limiter is first.limiter
+    assert second.control is first.control is manager.control
+
+
+def sent(directory):
+    check = Suppression(directory)
+    try:
+        return [addr for addr in ("a@example.com", "b@example.com") if check.lookup(addr) == "sent"]
+    finally:
+        check.close(compact=False)
+
+
+def test_sent_log_is_compacted_only_after_the_last_job(monkeypatch, tmp_path):
+    directory = str(tmp_path / "suppression")
+    monkeypatch.setattr(jobs.config, "SUPPRESSION_DIR", directory, raising=False)
+    monkeypatch.setattr(suppression, "COMPACT_THRESHOLD", 1)
+    manager = JobManager()
+    first, second = SimpleNamespace(active=False), SimpleNamespace(active=True)
+    manager.jobs = {"first": first, "second": second}
+    # 两个任务各自打开索引并追加已发送地址
+    mine, theirs = Suppression(directory), Suppression(directory)
+    mine.add("sent", "a@example.com")
+    theirs.add("sent", "b@example.com")
+    mine.close(compact=False)
+    manager._finished(first)
+    theirs.flush()
+    assert sent(directory) == ["a@example.com", "b@example.com"]
+    assert not os.path.exists(os.path.join(directory, "sent.idx"))
+
+    theirs.close(compact=False)
+    second.active = False
+    manager._finished(second)
+    assert os.path.getsize(os.path.join(directory, "sent.log")) == 0
+    assert sent(directory) == ["a@example.com", "b@example.com"]
+
+
+def test_limiter_is_seeded_with_its_own_sender_history(monkeypatch, tmp_path):
+    path = str(tmp_path / "journal.db")
+    monkeypatch.setattr(jobs.config, "JOURNAL_FILE", path, raising=False)
+    with Journal(path) as journal:
+        journal.append([{"邮箱": f"u{i}@example.com", "发送状态": "成功", "发件账号": "other@example.com"}
+                        for i in range(3)] + [{"邮箱": "me@example.com", "发送状态": "成功", "发件账号": "s@example.com"}])
+    limiter = JobManager().limiter_for("s@example.com", dict(per_day=5))
+    assert limiter.remaining_today == 4
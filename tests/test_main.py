@@ -0,0 +1,85 @@
+import json
+import os
+
+import main
+from shards import ShardBoard, list_digest
+
+
+def write_list(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("邮箱,姓名\n")
+        for i in range(count):
+            f.write(f"u{i}@example.com,用户{i}\n")
+
+
+def test_plain_run_refuses_a_sharded_list(monkeypatch, tmp_path, capsys):
+    source = str(tmp_path / "list.csv")
+    journal = str(tmp_path / "journal.db")
+    write_list(source, 5)
+    monkeypatch.setattr(main.config, "JOURNAL_FILE", journal, raising=False)
+    assert not main.is_sharded(source, journal)
+    with ShardBoard(journal) as board:
+        board.plan(list_digest(source), 5, size=2)
+    assert main.is_sharded(source, journal)
+
+    sent = []
+    monkeypatch.setattr(main, "send_email", lambda *args: sent.append(args))
+    for options in ({}, {"compact": True}):
+        assert main.main(source=source, **options) is None
+        assert "已按分片发送" in capsys.readouterr().out
+    assert sent == []
+    assert not os.path.exists(source + ".progress.json")
+
+
+def test_run_stops_when_the_progress_belongs_to_an_older_source(monkeypatch, tmp_path, capsys):
+    source = str(tmp_path / "list.csv")
+    write_list(source, 3)
+    monkeypatch.setattr(main.config, "JOURNAL_FILE", str(tmp_path / "journal.db"), raising=False)
+    progress = source + ".progress.json"
+    with open(progress, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": "older", "cursor": 2, "done": []}, f)
+    assert main.main(source=source) is None
+    assert "在发送过程中被修改" in capsys.readouterr().out
+    with open(progress, encoding="utf-8") as f:
+        assert json.load(f)["fingerprint"] == "older"  # 旧进度保留，等待人工确认
+
+
+class Server:
+    def __init__(self, sent):
+        self.sent = sent
+
+    def sendmail(self, sender, recipient, data):
+        # 记录发送时名单快照是否已经建立
+        self.sent.append((recipient, os.path.exists("list.csv.rows.jsonl")))
+        return {}
+
+    def noop(self):
+        return 250, b"ok"
+
+    def quit(self):
+        pass
+
+
+def test_first_send_of_a_new_list_does_not_wait_for_the_snapshot(monkeypatch, tmp_path):
+    import accounts
+    monkeypatch.chdir(tmp_path)
+    for name, value in dict(BATCH_LIMIT=4, POOL_SIZE=1, RATE_PER_MINUTE=0, RATE_JITTER=0).items():
+        monkeypatch.setattr(main.config, name, value)
+    sent = []
+    monkeypatch.setattr(accounts, "open_smtp", lambda *args, **kwargs: Server(sent))
+    with open("template.txt", "w", encoding="utf-8") as f:
+        f.write("您好 {姓名}")
+    with open("list.csv", "w", encoding="utf-8") as f:
+        f.write("邮箱,姓名\nu0@example.com,甲\nbad-address,乙\n U0@Example.com ,丙\n"
+                "u3@example.com,丁\nu4@example.com,戊\nu5@example.com,己\n")
+
+    main.main(source="list.csv")
+    # 本批 4 行: 无效地址与名单内重复在派发前拦下，发送时快照还未建立
+    assert sent == [("u0@example.com", False), ("u3@example.com", False)]
+    with open("list.csv.progress.json", encoding="utf-8") as f:
+        assert json.load(f)["cursor"] == 4
+    assert os.path.getsize("list.csv.rows.idx") == 6 * 8
+
+    del sent[:]
+    main.main(source="list.csv")
+    assert sent == [("u4@example.com", True), ("u5@example.com", True)]
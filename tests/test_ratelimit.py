@@ -0,0 +1,60 @@
+import threading
+
+from ratelimit import DAY, HOUR, RateLimiter
+
+
+class Clock:
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_steady_rate():
+    clock = Clock()
+    limiter = RateLimiter(per_second=2, burst=3, clock=clock)
+    # 容量内的前 3 封立即发送，之后按 0.5 秒匀速排开
+    assert [limiter.reserve() - clock.now for _ in range(5)] == [0, 0, 0, 0.5, 1.0]
+
+
+def test_hourly_cap_is_a_rolling_window():
+    clock = Clock()
+    limiter = RateLimiter(per_hour=3, clock=clock)
+    first = [limiter.reserve() for _ in range(3)]
+    clock.now += 600
+    # 第 4 封要等第 1 封滑出一小时窗口
+    assert limiter.reserve() == first[0] + HOUR
+
+
+def test_daily_cap_counts_recent_sends_from_earlier_runs():
+    clock = Clock()
+    recent = [clock.now - DAY - 1, clock.now - 60, clock.now - 30]  # 第一条已超过 24 小时
+    limiter = RateLimiter(per_day=3, recent_sends=recent, clock=clock)
+    assert limiter.remaining_today == 1
+    assert limiter.reserve() is not None
+    assert limiter.reserve() is None
+    assert limiter.acquire() is False
+    clock.now += DAY - 59  # 60 秒前的那封滑出 24 小时窗口
+    assert limiter.remaining_today == 1
+
+
+def test_set_scale_slows_rates_but_never_exceeds_config():
+    clock = Clock()
+    limiter = RateLimiter(per_second=2, clock=clock)
+    limiter.set_scale(0.5)
+    assert limiter.interval == 1.0
+    assert [limiter.reserve() - clock.now for _ in range(3)] == [0, 1.0, 2.0]
+    limiter.set_scale(4)
+    assert limiter.scale == 1.0 and limiter.interval == 0.5
+
+
+def test_stopped_wait_refunds_the_reservation():
+    clock = Clock()
+    limiter = RateLimiter(per_minute=1, per_day=2, clock=clock)
+    assert limiter.acquire()
+    stop = threading.Event()
+    stop.set()
+    # 下一个时刻在 60 秒后，等待被停止: 不发送，也不占用每日额度
+    assert limiter.acquire(stop) is False
+    assert limiter.remaining_today == 1
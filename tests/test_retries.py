@@ -0,0 +1,52 @@
+import sqlite3
+
+from builder import MessageBuilder
+from journal import Journal
+from retries import RetryQueue, campaign_key
+from templating import Template
+
+
+def record(email, sender=None):
+    values = {"邮箱": email, "发送状态": "延迟", "详情": "451 4.3.0 try later"}
+    if sender:
+        values["发件账号"] = sender
+    return values
+
+
+def test_due_is_scoped_to_campaign_and_sender(tmp_path):
+    now = [1000.0]
+    with Journal(str(tmp_path / "journal.db")) as journal:
+        retries = RetryQueue(journal, clock=lambda: now[0])
+        retries.push(record("a@example.com", "x@sender.com"), "body a", "c1")
+        retries.push(record("b@example.com", "x@sender.com"), "body b", "c2")
+        retries.push(record("c@example.com"), "body c", "c1", sender="y@sender.com")
+        now[0] += 3600
+        due = retries.due(campaign="c1", senders=["x@sender.com"])
+        assert [(row["邮箱"], body) for _, row, body in due] == [("a@example.com", "body a")]
+        assert retries.count("c1", ["x@sender.com", "y@sender.com"]) == 2
+        assert retries.due(campaign="c3", senders=["x@sender.com"]) == []
+        assert retries.due(campaign="c1", senders=[]) == []
+        assert len(retries.due()) == 3
+
+
+def test_legacy_rows_are_not_sent_by_a_scoped_run(tmp_path):
+    path = str(tmp_path / "journal.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE retries (id INTEGER PRIMARY KEY AUTOINCREMENT, next_at REAL NOT NULL, "
+                 "attempts INTEGER NOT NULL, last_error TEXT, recipient TEXT, body TEXT, data TEXT)")
+    conn.execute("INSERT INTO retries (next_at, attempts, recipient, body, data) "
+                 "VALUES (0, 1, 'old@example.com', 'old', '{}')")
+    conn.commit()
+    conn.close()
+    with Journal(path) as journal:
+        retries = RetryQueue(journal)
+        assert retries.due(campaign="c1", senders=["x@sender.com"]) == []
+        assert len(retries) == 1
+
+
+def test_campaign_key_changes_with_subject_and_template():
+    template = Template("您好 {姓名}")
+    key = campaign_key(template, MessageBuilder("通知"))
+    assert key == campaign_key(Template("您好 {姓名}"), MessageBuilder("通知"))
+    assert key != campaign_key(template, MessageBuilder("另一个通知"))
+    assert key != campaign_key(Template("再见 {姓名}"), MessageBuilder("通知"))
@@ -0,0 +1,107 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+import scheduler
+from checkpoint import file_fingerprint
+from engine import SendEngine
+from export import write_rows
+from scheduler import Campaign, CampaignBoard, ListPlan, Session
+from snapshot import Snapshot
+
+T0 = datetime(2026, 10, 19, 9, 0, tzinfo=timezone.utc).timestamp()  # 星期一 09:00 UTC
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            return self.now
+
+    def advance(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+
+class FakeServer:
+    def quit(self):
+        pass
+
+
+def make_session(tmp_path, rows, period, clock, **fields):
+    path = tmp_path / "list.csv"
+    write_rows(str(path), list(rows[0]), rows)
+    values = dict(name="c", source=str(path), start_at=0, days="0123456", start_minute=9 * 60,
+                  end_minute=17 * 60, timezone="UTC", tz_column=None, order_by=None, per_window=0,
+                  state="active", created=0)
+    values.update(fields)
+    campaign = Campaign(**values)
+    snapshot = Snapshot.open(str(path), str(path), file_fingerprint(str(path)))
+    board = CampaignBoard(str(tmp_path / "journal.db"))
+    plan = ListPlan.build(campaign, snapshot)
+    return Session(board, campaign, plan, period, clock=clock), snapshot
+
+
+@pytest.fixture
+def fake_sleep(monkeypatch):
+    clocks = []
+    monkeypatch.setattr(scheduler.time, "sleep", lambda seconds: [c.advance(seconds) for c in clocks])
+    return clocks
+
+
+def test_rows_queued_before_the_window_closes_are_not_sent_after_it(tmp_path):
+    clock = FakeClock(T0)
+    rows = [{"邮箱": f"u{i}@example.com"} for i in range(50)]
+    session, snapshot = make_session(tmp_path, rows, (T0, T0 + 330), clock)
+    sent = []
+
+    def send(server, row, body):
+        # 每封 60 秒 (慢速发送)
+        assert clock() < session.closes
+        sent.append(row["邮箱"])
+        clock.advance(60)
+        return True, "发送成功"
+
+    results = []
+    engine = SendEngine(connect=FakeServer, send=send, pool_size=2, keepalive=0, hold=session.hold,
+                        on_result=lambda index, record: (results.append(index), session.done(index, record)))
+    engine.run((index, row, "") for index, row in session.rows(snapshot, set()))
+    engine.close()
+    assert 5 <= len(sent) <= 7
+    assert len(results) == len(sent)
+
+
+def test_hold_checks_each_recipient_zone(tmp_path):
+    # 16:30 UTC: UTC 的 9-17 仍在时段内，+10:00 已是次日 02:30
+    now = T0 + 7.5 * 3600
+    clock = FakeClock(now)
+    rows = [{"邮箱": "a@example.com", "时区": "UTC"}, {"邮箱": "b@example.com", "时区": "+10:00"}]
+    session, _ = make_session(tmp_path, rows, (T0, T0 + 8 * 3600), clock, tz_column="时区")
+    assert not session.hold(0)
+    assert session.hold(1)
+    clock.advance(3600)
+    assert session.hold(0)
+
+
+def test_only_successful_sends_use_the_window_budget(tmp_path, fake_sleep):
+    clock = FakeClock(T0)
+    fake_sleep.append(clock)
+    rows = [{"邮箱": f"u{i}@example.com"} for i in range(10)]
+    session, snapshot = make_session(tmp_path, rows, (T0, T0 + 3600), clock, per_window=2)
+    assert session.budget == 2
+    indices = session._indices(set(), None)
+    first, second = next(indices), next(indices)
+    session.done(first, {"发送状态": "延迟"})
+    third = next(indices)
+    session.done(second, {"发送状态": "成功"})
+    session.done(third, {"发送状态": "失败"})
+    fourth = next(indices)
+    session.done(fourth, {"发送状态": "成功"})
+    assert [first, second, third, fourth] == [0, 1, 2, 3]
+    assert next(indices, None) is None
+    assert session.board.window_sent("c", T0) == 2
+    assert clock() < session.closes
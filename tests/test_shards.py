@@ -0,0 +1,93 @@
+import pytest
+
+from shards import ShardBoard
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def boards(tmp_path):
+    clock = Clock()
+    path = str(tmp_path / "journal.db")
+    opened = []
+
+    def board(owner):
+        opened.append(ShardBoard(path, owner=owner, lease=60, clock=clock))
+        return opened[-1]
+
+    yield board, clock
+    for b in opened:
+        b.close()
+
+
+def test_plan_skips_rows_already_sent_and_is_stable(boards):
+    board, _ = boards
+    a = board("a")
+    assert a.plan("list", 10, size=4, cursor=2, done={5}) == 2
+    assert [(shard, start, stop, processed) for _, shard, start, stop, processed, _, _ in a.status("list")] == \
+        [(0, 2, 6, 1), (1, 6, 10, 0)]
+    assert a.plan("list", 10, size=3) == 2  # 已有分片不变
+    with pytest.raises(ValueError):
+        a.plan("list", 11)
+
+
+def test_each_shard_has_one_owner_until_its_lease_expires(boards):
+    board, clock = boards
+    a, b = board("a"), board("b")
+    a.plan("list", 4, size=2)
+    first = a.claim("list")
+    second = b.claim("list")
+    assert (first.shard, second.shard) == (0, 1)
+    assert board("c").claim("list") is None
+
+    first.mark(0)
+    first.save()
+    assert not first.lost.is_set()
+    clock.now += 61  # a 崩溃，租约过期
+    taken = board("c").claim("list")
+    assert taken.shard == 0 and 0 in taken and 1 not in taken  # 从已保存的进度继续
+
+    # 被接手后，原持有者的保存与续约都被拒绝
+    first.mark(1)
+    first.save()
+    assert first.lost.is_set()
+    assert not a.renew("list", 0, [])
+    assert not a.finished("list")
+
+
+def test_release_returns_the_shard_and_the_accounts(boards):
+    board, _ = boards
+    a, b = board("a"), board("b")
+    a.plan("list", 2, size=2)
+    lease = a.claim("list")
+    assert a.claim_accounts(["x@example.com", "y@example.com"], limit=1) == {"x@example.com"}
+    assert b.claim_accounts(["x@example.com", "y@example.com"], limit=0) == {"y@example.com"}
+    lease.release()
+    assert b.claim_accounts(["x@example.com"]) == {"x@example.com"}
+    again = b.claim("list")
+    assert again.shard == 0
+    again.mark(0)
+    again.mark(1)
+    again.save()
+    assert b.finished("list")
+    assert b.claim("list") is None
+
+
+def test_account_lease_expires_with_its_owner(boards):
+    board, clock = boards
+    a, b = board("a"), board("b")
+    assert a.claim_accounts(["x@example.com"]) == {"x@example.com"}
+    assert b.claim_accounts(["x@example.com"]) == set()
+    clock.now += 30
+    assert a.renew("list", 0, ["x@example.com"]) is False  # 没有持有分片 0，但账号续约成功
+    clock.now += 45
+    assert b.claim_accounts(["x@example.com"]) == set()  # 续约后仍在租约内
+    clock.now += 20
+    assert b.claim_accounts(["x@example.com"]) == {"x@example.com"}
+    assert not a.renew("list", 0, ["x@example.com"])
@@ -0,0 +1,69 @@
+import os
+
+from checkpoint import file_fingerprint
+from snapshot import INDEX_SUFFIX, SNAPSHOT_SUFFIX, Snapshot, SnapshotBuilder
+
+
+def write_list(path, emails):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("邮箱,序号\n")
+        for i, email in enumerate(emails):
+            f.write(f"{email},{i}\n")
+
+
+def open_snapshot(source):
+    return Snapshot.open(source, source, file_fingerprint(source))
+
+
+def test_offsets_seek_straight_to_a_row(tmp_path):
+    source = str(tmp_path / "list.csv")
+    write_list(source, [f"u{i}@example.com" for i in range(10)])
+    snapshot = open_snapshot(source)
+    assert len(snapshot) == 10 and snapshot.columns == ["邮箱", "序号"]
+    assert os.path.getsize(source + INDEX_SUFFIX) == 10 * 8
+
+    assert [(i, row["邮箱"]) for i, row in snapshot.page(7, 5)] == \
+        [(7, "u7@example.com"), (8, "u8@example.com"), (9, "u9@example.com")]
+    assert [i for i, _ in snapshot.iter_records(2, skip={3, 5})][:4] == [2, 4, 6, 7]
+    assert list(snapshot.iter_records(10)) == []
+    assert [(i, row["邮箱"]) for i, row in snapshot.iter_rows(iter([9, 0, 4]))] == \
+        [(9, "u9@example.com"), (0, "u0@example.com"), (4, "u4@example.com")]
+    assert [email for block in snapshot.iter_column("邮箱", chunksize=4) for email in block] == \
+        [f"u{i}@example.com" for i in range(10)]
+
+
+def test_snapshot_is_reused_until_the_source_changes(tmp_path):
+    source = str(tmp_path / "list.csv")
+    write_list(source, ["a@example.com", "b@example.com"])
+    open_snapshot(source)
+    built = os.stat(source + SNAPSHOT_SUFFIX).st_mtime_ns
+
+    again = open_snapshot(source)
+    assert os.stat(source + SNAPSHOT_SUFFIX).st_mtime_ns == built
+    assert len(again) == 2
+
+    write_list(source, ["c@example.com", "d@example.com", "e@example.com"])
+    rebuilt = open_snapshot(source)
+    assert len(rebuilt) == 3
+    assert [row["邮箱"] for _, row in rebuilt.iter_records()] == ["c@example.com", "d@example.com", "e@example.com"]
+
+    rebuilt.remove()
+    assert not rebuilt.exists()
+
+
+def test_builder_yields_rows_as_the_snapshot_will_read_them(tmp_path):
+    source = str(tmp_path / "list.csv")
+    with open(source, "w", encoding="utf-8") as f:
+        f.write("邮箱,序号\na@example.com,1\n,\nb@example.com,2\nc@example.com,3\nd@example.com,4\n")
+    builder = SnapshotBuilder(source, source, file_fingerprint(source))
+    rows = builder.rows()
+    head = [next(rows), next(rows)]
+    assert not os.path.exists(source + SNAPSHOT_SUFFIX)  # 第一批行在快照建立之前产出
+
+    snapshot = builder.finish()
+    assert list(rows) == []  # finish 之后不再产出
+    assert len(snapshot) == 4
+    # 行号与快照一致 (空行不占行号)
+    assert head == snapshot.page(0, 2)
+    assert [i for i, _ in snapshot.iter_records()] == [0, 1, 2, 3]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,21 @@
+import os
+
+from checkpoint import Checkpoint
+from suppression import Suppression
+
+
+def test_sent_log_reaches_disk_with_the_checkpoint(tmp_path):
+    directory = str(tmp_path / "suppression")
+    checkpoint = Checkpoint(str(tmp_path / "list.progress.json"), "fp", every=2)
+    with Suppression(directory) as suppression:
+        checkpoint.suppression = suppression
+        log = os.path.join(directory, "sent.log")
+        suppression.add("sent", "a@example.com")
+        checkpoint.record(0, {"邮箱": "a@example.com"})
+        assert os.path.getsize(log) == 0  # 未到 every 条: 进度与日志都还在缓冲中
+        suppression.add("sent", "b@example.com")
+        checkpoint.record(1, {"邮箱": "b@example.com"})
+        # 进度落盘时，已发送地址必须已经写入日志 (崩溃后不会漏掉屏蔽)
+        assert os.path.getsize(log) == 16
+        with Suppression(directory) as reopened:
+            assert reopened.check("B@example.com") == "已发送过"
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import validation
+from checkpoint import file_fingerprint
+from snapshot import CHECK_SUFFIX, Snapshot
+from validation import DUPLICATE, INVALID, MISSING, OK, Preflight, check_small, check_values
+
+ADDRESSES = [
+    ("user@example.com", OK),
+    (" User@Example.COM ", DUPLICATE),
+    ("user@example.xn--p1ai", OK),
+    ("info@shop.xn--fiqs8s", OK),
+    ("a.b+tag@mail.example.co.uk", OK),
+    ("user@example.c", INVALID),
+    ("user@example.123", INVALID),
+    ("user@example.xn--", INVALID),
+    ("user@localhost", INVALID),
+    ("no-at-sign.example.com", INVALID),
+    ("", MISSING),
+    (None, MISSING),
+]
+
+
+def test_both_paths_give_identical_verdicts():
+    values = [value for value, _ in ADDRESSES]
+    expected = [code for _, code in ADDRESSES]
+    small, small_domains = check_small(values)
+    assert list(small) == expected
+
+    codes, hashes, domains = check_values(values)
+    # 向量化版本的重复由 Preflight.run 在整份名单上判断
+    assert list(codes) == [OK if code == DUPLICATE else code for code in expected]
+    assert hashes[0] == hashes[1]
+    assert domains == small_domains
+    assert domains["example.xn--p1ai"] == 1
+
+
+@pytest.mark.parametrize("small_list", [10 ** 6, 0])
+def test_preflight_accepts_punycode_top_level_domains(tmp_path, monkeypatch, small_list):
+    monkeypatch.setattr(validation, "SMALL_LIST", small_list)
+    source = str(tmp_path / "list.csv")
+    with open(source, "w", encoding="utf-8") as f:
+        f.write("邮箱\nuser@example.xn--p1ai\nuser@example.c\nUSER@example.xn--p1ai\n")
+    snapshot = Snapshot.open(source, source, file_fingerprint(source))
+    preflight = Preflight.for_snapshot(snapshot)
+    assert [preflight.verdict(i) for i in range(3)] == [None, ("失败", "邮箱地址格式无效"), ("跳过", "名单内重复")]
+
+
+def test_results_checked_under_an_older_pattern_are_not_reused(tmp_path):
+    source = str(tmp_path / "list.csv")
+    with open(source, "w", encoding="utf-8") as f:
+        f.write("邮箱\nuser@example.xn--p1ai\n")
+    snapshot = Snapshot.open(source, source, file_fingerprint(source))
+    Preflight.for_snapshot(snapshot)
+    assert Preflight.load(snapshot) is not None
+
+    with open(source + CHECK_SUFFIX, "rb") as f:
+        meta = json.loads(f.readline())
+    meta["pattern"] = "older"
+    with open(source + CHECK_SUFFIX, "wb") as f:
+        f.write(json.dumps(meta).encode("utf-8") + b"\n" + bytes([INVALID]))
+    assert Preflight.load(snapshot) is None
+    assert Preflight.for_snapshot(snapshot).verdict(0) is None
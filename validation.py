@@ -0,0 +1,218 @@
+"""
+发送前预检: 在整份名单上用 pandas 向量化字符串运算一次性检查收件人地址
+
+    解析地址列   邮箱 / Email / email，整份名单只判断一次
+    规范化       去首尾空格、转小写 (与 suppression 的去重口径一致)
+    语法检查     整列正则匹配
+    名单内去重   按规范化地址的 64 位哈希，保留第一次出现的行
+    按域名分组   统计各收件域名的行数
+
+名单不超过 SMALL_LIST 行时改用标准库逐个检查 (判定完全相同)，省去加载 pandas 的时间，适合频繁的小批量定时任务。
+结果随快照保存为 <快照>.rows.check (首行 JSON 摘要，之后每行一个字节的判定码)，同一份名单只检查一次。
+发送时无效 / 重复的行由发送引擎直接记入报告 (失败 / 跳过)，不连接服务器、不占用发送额度。
+
+    python validation.py [PATH]     # 预检名单 (默认 main.xlsx) 并打印摘要
+"""
+import json
+import os
+import re
+import sys
+from collections import Counter
+
+from snapshot import CHECK_SUFFIX
+
+ADDRESS_COLUMNS = ('邮箱', 'Email', 'email')
+OK, MISSING, INVALID, DUPLICATE = 0, 1, 2, 3
+VERDICTS = {
+    MISSING: ("失败", "无有效邮箱地址"),
+    INVALID: ("失败", "邮箱地址格式无效"),
+    DUPLICATE: ("跳过", "名单内重复"),
+}
+# 规范化 (小写) 之后的地址语法: 本地部分 @ 至少两级的域名，顶级域为字母或国际化域名的 punycode (xn--)
+ADDRESS_PATTERN = (r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+                   r"@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+(?:[a-z]{2,63}|xn--[a-z0-9-]{1,59})")
+CHUNKSIZE = 100000
+SMALL_LIST = 20000
+TOP_DOMAINS = 20
+
+
+def resolve_column(columns):
+    """地址所在列 (与 templating.get_recipient 的优先顺序一致)，没有时返回 None"""
+    return next((c for c in ADDRESS_COLUMNS if c in columns), None)
+
+
+def check_values(values):
+    """
+    向量化检查一组地址，返回 (判定码 uint8 数组, 规范化地址的 64 位哈希数组, 有效地址的域名计数 Counter)。
+    重复由调用方在整份名单上统一判断。
+    """
+    import numpy as np
+    import pandas as pd
+
+    addr = pd.Series(values, dtype=object).astype("string").str.strip().str.lower()
+    missing = (addr.isna() | (addr == "")).to_numpy()
+    valid = addr.str.fullmatch(ADDRESS_PATTERN).fillna(False).to_numpy(dtype=bool)
+    codes = np.where(missing, MISSING, np.where(valid, OK, INVALID)).astype(np.uint8)
+    hashes = pd.util.hash_pandas_object(addr.fillna(""), index=False).to_numpy()
+    domains = addr[valid].str.replace(r"^.*@", "", regex=True).value_counts()
+    return codes, hashes, Counter(domains.to_dict())
+
+
+def check_small(values):
+    """check_values 的标准库版本 (小名单用)，重复直接在这里判断，返回 (判定码 bytes, 域名计数 Counter)"""
+    pattern = re.compile(ADDRESS_PATTERN)
+    codes = bytearray(len(values))
+    seen = set()
+    domains = Counter()
+    for i, value in enumerate(values):
+        addr = "" if value is None or value != value else str(value).strip().lower()
+        if not addr:
+            codes[i] = MISSING
+        elif not pattern.fullmatch(addr):
+            codes[i] = INVALID
+        else:
+            # 与向量化版本一致: 域名计数包含重复的行
+            domains[addr.rsplit("@", 1)[1]] += 1
+            if addr in seen:
+                codes[i] = DUPLICATE
+            seen.add(addr)
+    return bytes(codes), domains
+
+
+def row_checker(columns):
+    """
+    逐行检查地址的 check(row)，返回与 Preflight.verdict 相同的判定。边读边发 (首次发送新名单) 时代替整份名单的预检；
+    名单内重复由 suppression.Suppression.check 按本次已出现的地址拦截。
+    """
+    column = resolve_column(columns)
+    pattern = re.compile(ADDRESS_PATTERN)
+
+    def check(row):
+        value = row.get(column) if column else None
+        addr = "" if value is None or value != value else str(value).strip().lower()
+        if not addr:
+            return VERDICTS[MISSING]
+        if not pattern.fullmatch(addr):
+            return VERDICTS[INVALID]
+        return None
+    return check
+
+
+class Preflight:
+    """一份名单的预检结果: codes[行号] 为判定码 (bytes)，summary 为统计摘要"""
+
+    def __init__(self, codes, summary):
+        self.codes = codes
+        self.summary = summary
+
+    def __len__(self):
+        return len(self.codes)
+
+    def verdict(self, index):
+        """该行的 (状态, 详情)，可以发送时返回 None"""
+        return VERDICTS.get(self.codes[index])
+
+    @classmethod
+    def run(cls, snapshot, chunksize=CHUNKSIZE):
+        """在快照上分块向量化检查整份名单"""
+        column = resolve_column(snapshot.columns)
+        if column is None:
+            codes = bytes([MISSING]) * len(snapshot)
+            return cls(codes, _summary(codes, None, Counter()))
+        if len(snapshot) <= SMALL_LIST:
+            values = [v for chunk in snapshot.iter_column(column, chunksize) for v in chunk]
+            codes, domains = check_small(values)
+            return cls(codes, _summary(codes, column, domains))
+
+        import numpy as np
+        import pandas as pd
+
+        parts, hashes, domains = [], [], Counter()
+        for values in snapshot.iter_column(column, chunksize):
+            c, h, d = check_values(values)
+            parts.append(c)
+            hashes.append(h)
+            domains.update(d)
+        codes = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint8)
+        if parts:
+            duplicated = pd.Series(np.concatenate(hashes)).duplicated(keep="first").to_numpy()
+            codes[duplicated & (codes == OK)] = DUPLICATE
+        codes = codes.tobytes()
+        return cls(codes, _summary(codes, column, domains))
+
+    @classmethod
+    def load(cls, snapshot):
+        """读取已保存的预检结果，不存在或与快照不一致时返回 None"""
+        try:
+            with open(snapshot.path + CHECK_SUFFIX, "rb") as f:
+                meta = json.loads(f.readline())
+                codes = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        if meta.get("fingerprint") != snapshot.fingerprint or len(codes) != len(snapshot):
+            return None
+        if meta.get("pattern") != ADDRESS_PATTERN:
+            return None  # 地址规则改过: 按新规则重新检查
+        return cls(codes, meta["summary"])
+
+    @classmethod
+    def for_snapshot(cls, snapshot):
+        """读取或执行并保存预检"""
+        preflight = cls.load(snapshot)
+        if preflight is None:
+            preflight = cls.run(snapshot)
+            preflight.save(snapshot)
+        return preflight
+
+    def save(self, snapshot):
+        path = snapshot.path + CHECK_SUFFIX
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            meta = {"fingerprint": snapshot.fingerprint, "pattern": ADDRESS_PATTERN, "summary": self.summary}
+            f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8") + b"\n")
+            f.write(self.codes)
+        os.replace(tmp, path)
+
+    def describe(self):
+        """一行中文摘要"""
+        s = self.summary
+        parts = [f"有效 {s['valid']}"]
+        for key, label in (("invalid", "格式无效"), ("missing", "缺少地址"), ("duplicate", "名单内重复")):
+            if s[key]:
+                parts.append(f"{label} {s[key]}")
+        line = "，".join(parts)
+        if s["domains"]:
+            line += "；主要域名: " + ", ".join(f"{d} ({n})" for d, n in list(s["domains"].items())[:5])
+        return line
+
+
+def _summary(codes, column, domains):
+    return {
+        "column": column,
+        "total": len(codes),
+        "valid": codes.count(OK),
+        "missing": codes.count(MISSING),
+        "invalid": codes.count(INVALID),
+        "duplicate": codes.count(DUPLICATE),
+        "domains": dict(domains.most_common(TOP_DOMAINS)),
+    }
+
+
+def main(argv=None):
+    from checkpoint import file_fingerprint
+    from snapshot import Snapshot
+
+    path = (argv if argv is not None else sys.argv[1:] or ["main.xlsx"])[0]
+    if not os.path.exists(path):
+        print(f"❌ 未找到名单文件 '{path}'")
+        return 1
+    snapshot = Snapshot.open(path, path, file_fingerprint(path))
+    preflight = Preflight.for_snapshot(snapshot)
+    summary = preflight.summary
+    print(f"📋 共 {summary['total']} 行，地址列: {summary['column'] or '未找到'}")
+    print(f"✅ {preflight.describe()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())